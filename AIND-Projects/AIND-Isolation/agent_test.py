@@ -3,12 +3,34 @@ tests to run and debug your minimax and alphabeta agents locally.  The test
 cases used by the project assistant are not public.
 """
 
+import gc
+import os
+import pickle
+import queue
+import random
+import tempfile
+import time
+import timeit
 import unittest
+import weakref
 
+import batch_eval
+import competition_agent
+import endgame
 import isolation
 import game_agent
+import lazy_smp
+import opening_book
+import ponder
+import sample_players
+import sprt
+import tablebase
+import tournament
+import tuning
 
 from importlib import reload
+from isolation.array_board import ArrayBoard, stack_boards
+from isolation.records import RecordWriter, read_records
 
 
 class IsolationTest(unittest.TestCase):
@@ -21,5 +43,915 @@ class IsolationTest(unittest.TestCase):
         self.game = isolation.Board(self.player1, self.player2)
 
 
+class BitBoardTest(unittest.TestCase):
+    """Check that isolation.BitBoard, ArrayBoard and CompactBoard behave
+    exactly like isolation.Board"""
+
+    def setUp(self):
+        self.player1 = "Player1"
+        self.player2 = "Player2"
+
+    def assertSameState(self, board, bitboard):
+        self.assertEqual(board.to_string(), bitboard.to_string())
+        self.assertEqual(board.move_count, bitboard.move_count)
+        self.assertEqual(board.active_player, bitboard.active_player)
+        self.assertEqual(sorted(board.get_blank_spaces()),
+                         sorted(bitboard.get_blank_spaces()))
+        for player in (self.player1, self.player2):
+            self.assertEqual(board.get_player_location(player),
+                             bitboard.get_player_location(player))
+            self.assertEqual(sorted(board.get_legal_moves(player)),
+                             sorted(bitboard.get_legal_moves(player)))
+            self.assertEqual(board.utility(player), bitboard.utility(player))
+            self.assertEqual(board.is_winner(player), bitboard.is_winner(player))
+            self.assertEqual(board.is_loser(player), bitboard.is_loser(player))
+
+    def test_random_games(self):
+        rng = random.Random(0)
+        for width, height in [(7, 7), (5, 4), (3, 6)]:
+            for board_cls in (isolation.BitBoard, ArrayBoard,
+                              isolation.CompactBoard):
+                for _ in range(20):
+                    board = isolation.Board(self.player1, self.player2, width, height)
+                    bitboard = board_cls(self.player1, self.player2, width, height)
+                    self.assertSameState(board, bitboard)
+                    while True:
+                        moves = sorted(board.get_legal_moves())
+                        if not moves:
+                            break
+                        move = rng.choice(moves)
+                        self.assertTrue(bitboard.move_is_legal(move))
+                        forecast = bitboard.forecast_move(move)
+                        board.apply_move(move)
+                        bitboard.apply_move(move)
+                        self.assertSameState(board, bitboard)
+                        self.assertSameState(board, forecast)
+                        self.assertEqual(board.hash(), bitboard.hash())
+                        self.assertEqual(board.canonical(), bitboard.canonical())
+
+    def test_agents_play_unchanged(self):
+        player1 = game_agent.AlphaBetaPlayer()
+        player2 = game_agent.MinimaxPlayer()
+        for board_cls in (isolation.BitBoard, isolation.CompactBoard):
+            game = board_cls(player1, player2)
+            winner, history, _ = game.play()
+            self.assertIn(winner, (player1, player2))
+            self.assertEqual(len(history), game.move_count)
+
+
+class ArrayBoardTest(unittest.TestCase):
+    """Unit tests for the array snapshots of isolation.array_board"""
+
+    def test_array_round_trip(self):
+        rng = random.Random(3)
+        games = [random_position(ArrayBoard, "Player1", "Player2", n, rng)
+                 for n in range(8)]
+        states = stack_boards(games)
+        self.assertEqual(states.shape, (8, 52))
+        for game, state in zip(games, states):
+            board = ArrayBoard.from_array("Player1", "Player2", state)
+            for other in (board, pickle.loads(pickle.dumps(game))):
+                self.assertEqual(other.to_string(), game.to_string())
+                self.assertEqual(other.hash(), game.hash())
+                self.assertEqual(other.move_count, game.move_count)
+                self.assertEqual(other.active_player, game.active_player)
+        # snapshots and copies do not share the board array
+        copy = games[-1].copy()
+        copy.apply_move(copy.get_legal_moves()[0])
+        self.assertEqual(games[-1].to_array().tolist(), states[-1].tolist())
+        self.assertFalse(games[-1].blocked_cells().flags.writeable)
+
+    def test_batch_encoding(self):
+        boards, games = [], []
+        for n in range(2, 10):
+            boards.append(random_position(isolation.Board, "Player1",
+                                          "Player2", n, random.Random(n)))
+            games.append(random_position(ArrayBoard, "Player1", "Player2", n,
+                                         random.Random(n)))
+        for player in ("Player1", "Player2"):
+            expected = batch_eval.encode_all(boards, player)
+            batch = batch_eval.encode_all(games, player)
+            self.assertEqual(batch.dtype, expected.dtype)
+            self.assertEqual(batch.tolist(), expected.tolist())
+            self.assertEqual(batch_eval.encode(games[0], player).tolist(),
+                             expected[0].tolist())
+
+    def test_record_positions(self):
+        record = isolation.records.GameRecord(
+            5, 5, ("a", "b"), [(0, 0), (4, 4), (1, 2)], "illegal move",
+            [None] * 3)
+        states = record.position_arrays()
+        self.assertEqual(states.shape, (4, 28))
+        self.assertEqual(states[0].tolist(), [0] * 25 + [0, 255, 255])
+        board = ArrayBoard.from_array("a", "b", states[-1])
+        self.assertEqual((board.width, board.height), (5, 5))
+        self.assertEqual(board.to_string(), record.position().to_string())
+        state = ArrayBoard("a", "b", 5, 4).to_array()
+        self.assertRaises(ValueError, ArrayBoard.from_array, "a", "b", state)
+        self.assertRaises(ValueError, ArrayBoard.from_array, "a", "b", state,
+                          4, 4)
+        self.assertEqual(ArrayBoard.from_array("a", "b", state, 5, 4).height, 4)
+
+
+class StrictPlayer(object):
+    """Player object that fails any equality comparison. """
+
+    def __eq__(self, other):
+        raise AssertionError("player objects compared with ==")
+
+    __hash__ = object.__hash__
+
+
+class CompactBoardTest(unittest.TestCase):
+    """Unit tests for the player references of isolation.CompactBoard"""
+
+    def test_players_compared_by_identity(self):
+        player1, player2 = StrictPlayer(), StrictPlayer()
+        game = isolation.CompactBoard(player1, player2, 5, 5)
+        self.assertRaises(AssertionError,
+                          isolation.Board(player1, player2).get_player_location,
+                          player2)
+        while game.get_legal_moves():
+            game.apply_move(sorted(game.get_legal_moves())[0])
+            for player in (player1, player2):
+                self.assertEqual(game.get_player_location(player),
+                                 game.copy().get_player_location(player))
+                self.assertIsNot(game.get_opponent(player), player)
+                game.mobility(player)
+        self.assertTrue(game.is_loser(game.active_player))
+        self.assertTrue(game.is_winner(game.inactive_player))
+        self.assertEqual(game.utility(player1), -game.utility(player2))
+        # Equal player objects that are not the registered ones still match
+        game = isolation.CompactBoard("Player1", "Player2")
+        game.apply_move((3, 3))
+        self.assertEqual(game.get_player_location("".join(["Player", "1"])),
+                         (3, 3))
+        self.assertRaises(RuntimeError, game.get_opponent, "Player3")
+
+    def test_slots_pickle_and_players(self):
+        game = random_position(isolation.CompactBoard, "Player1", "Player2",
+                               9, random.Random(3))
+        self.assertFalse(hasattr(game, "__dict__"))
+        loaded = pickle.loads(pickle.dumps(game))
+        self.assertEqual(loaded.to_string(), game.to_string())
+        self.assertEqual(loaded.hash(), game.hash())
+        self.assertEqual(loaded.active_player, "Player2")
+        board = lazy_smp.with_players(game, "a", "b")
+        self.assertEqual((board.active_player, board.inactive_player),
+                         ("b", "a"))
+        self.assertEqual(board.get_legal_moves("b", shuffle=False),
+                         game.get_legal_moves("Player2", shuffle=False))
+        self.assertEqual(game.active_player, "Player2")
+
+
+class PushPopTest(unittest.TestCase):
+    """Unit tests for in-place make/unmake moves and in-place search"""
+
+    def setUp(self):
+        self.player1 = "Player1"
+        self.player2 = "Player2"
+
+    def test_pop_restores_state(self):
+        rng = random.Random(1)
+        for board_cls in (isolation.Board, isolation.BitBoard, ArrayBoard,
+                          isolation.CompactBoard):
+            game = board_cls(self.player1, self.player2)
+            snapshots = []
+
+            def snapshot():
+                # legal moves and mobility come from the per-position cache
+                return (game.to_string(), game.hash(), game.move_count,
+                        game.active_player,
+                        sorted(game.get_legal_moves(self.player1)),
+                        game.mobility(self.player2))
+
+            while game.get_legal_moves():
+                snapshots.append(snapshot())
+                game.push(rng.choice(sorted(game.get_legal_moves())))
+            while snapshots:
+                game.pop()
+                self.assertEqual(snapshots.pop(), snapshot())
+            self.assertRaises(RuntimeError, game.pop)
+
+    def test_legal_move_cache(self):
+        for board_cls in (isolation.Board, isolation.BitBoard, ArrayBoard,
+                          isolation.CompactBoard):
+            game = board_cls(self.player1, self.player2)
+            game.apply_move((3, 3))
+            self.assertEqual(game.mobility(), 48)
+            game.apply_move((0, 0))
+            moves = game.get_legal_moves()
+            self.assertEqual(game.mobility(), len(moves))
+            moves.clear()
+            self.assertEqual(len(game.get_legal_moves(shuffle=False)), 8)
+            self.assertEqual(game.mobility(self.player2), 2)
+            game.apply_move((1, 5))
+            self.assertEqual(game.mobility(), 2)
+            self.assertEqual(game.mobility(self.player1), 4)
+            self.assertRaises(RuntimeError, game.mobility, "Player3")
+
+    def test_in_place_search_matches_copy_search(self):
+        for player_cls, search in ((game_agent.MinimaxPlayer, "minimax"),
+                                   (game_agent.AlphaBetaPlayer, "alphabeta")):
+            for board_cls in (isolation.Board, isolation.BitBoard,
+                              isolation.CompactBoard):
+                moves = []
+                for in_place in (False, True):
+                    player = player_cls(in_place=in_place)
+                    player.time_left = lambda: float("inf")
+                    game = board_cls(player, self.player2)
+                    game.apply_move((3, 3))
+                    game.apply_move((2, 4))
+                    before = game.to_string()
+                    random.seed(2)
+                    moves.append(getattr(player, search)(game, 3))
+                    self.assertEqual(before, game.to_string())
+                self.assertEqual(moves[0], moves[1])
+
+
+def minimax_value(game, player, depth, score_fn):
+    """Reference minimax value of `game` for `player`, used to check the
+    search enhancements of AlphaBetaPlayer."""
+    moves = game.get_legal_moves()
+    if depth == 0 or not moves:
+        return score_fn(game, player)
+    values = [minimax_value(game.forecast_move(m), player, depth - 1, score_fn)
+              for m in moves]
+    return max(values) if game.active_player == player else min(values)
+
+
+def random_position(board_cls, player1, player2, num_moves, rng):
+    """Return a board after `num_moves` random moves from a seeded rng. """
+    game = board_cls(player1, player2)
+    for _ in range(num_moves):
+        moves = sorted(game.get_legal_moves())
+        if not moves:
+            break
+        game.apply_move(rng.choice(moves))
+    return game
+
+
+class TranspositionTableTest(unittest.TestCase):
+    """Unit tests for Zobrist hashing and the alpha-beta transposition table"""
+
+    def test_zobrist_hash_of_transpositions(self):
+        for board_cls in (isolation.Board, isolation.BitBoard,
+                          isolation.CompactBoard):
+            game = board_cls("Player1", "Player2")
+            self.assertEqual(game.hash(), 0)
+            for move in [(0, 0), (6, 6), (1, 2), (4, 5), (3, 3)]:
+                game.apply_move(move)
+            other = board_cls("Player1", "Player2")
+            for move in [(3, 3), (4, 5), (1, 2), (6, 6), (0, 0)]:
+                other.apply_move(move)
+            self.assertNotEqual(game.hash(), other.hash())
+            # same cells blocked, same locations and initiative
+            other = board_cls("Player1", "Player2")
+            for move in [(1, 2), (6, 6), (0, 0), (4, 5), (3, 3)]:
+                other.apply_move(move)
+            self.assertEqual(game.hash(), other.hash())
+            self.assertEqual(game.hash(), game.copy().hash())
+        self.assertEqual(isolation.Board(1, 2).forecast_move((2, 2)).hash(),
+                         isolation.BitBoard(1, 2).forecast_move((2, 2)).hash())
+
+    def test_alphabeta_with_table_finds_best_move(self):
+        self.check_alphabeta_finds_best_move(tt_size=4096)
+        self.check_alphabeta_finds_best_move(move_ordering=True)
+        self.check_alphabeta_finds_best_move(tt_size=4096, move_ordering=True)
+
+    def test_principal_variation_search(self):
+        self.check_alphabeta_finds_best_move(pvs=True)
+        self.check_alphabeta_finds_best_move(pvs=True, tt_size=4096,
+                                             move_ordering=True)
+
+    def test_aspiration_search(self):
+        rng = random.Random(5)
+        score_fn = game_agent.custom_score
+        player = game_agent.AlphaBetaPlayer(score_fn=score_fn, pvs=True,
+                                            aspiration_window=0.5)
+        player.time_left = lambda: float("inf")
+        game = random_position(isolation.Board, player, "Player2", 10, rng)
+        if game.active_player != player:
+            game.apply_move(sorted(game.get_legal_moves())[0])
+        value = minimax_value(game, player, 3, score_fn)
+        # inside the window, and failing low and high outside it
+        for guess in (value + 0.25, value + 2., value - 2.):
+            move = player.aspiration_search(game, 3, guess)
+            self.assertEqual(player._root_value, value)
+            self.assertEqual(minimax_value(game.forecast_move(move), player, 2,
+                                           score_fn), value)
+        player.alphabeta(game, 3, value + 1., value + 2.)
+        self.assertLessEqual(player._root_value, value + 1.)
+
+    def test_batch_leaf_evaluation(self):
+        # Batch every node above the horizon, whatever its number of children
+        min_leaves = game_agent.BATCH_MIN_LEAVES
+        game_agent.BATCH_MIN_LEAVES = 0
+        try:
+            self.check_alphabeta_finds_best_move(batch_leaves=True)
+            self.check_alphabeta_finds_best_move(batch_leaves=True, pvs=True,
+                                                 tt_size=4096,
+                                                 move_ordering=True)
+        finally:
+            game_agent.BATCH_MIN_LEAVES = min_leaves
+        self.assertRaises(ValueError, game_agent.AlphaBetaPlayer,
+                          score_fn=lambda game, player: 0., batch_leaves=True)
+
+    def test_batch_scores_match_heuristics(self):
+        rng = random.Random(7)
+        for num_moves in (2, 9, 17, 25, 33):
+            game = random_position(isolation.Board, "Player1", "Player2",
+                                   num_moves, rng)
+            moves = game.get_legal_moves()
+            children = [game.forecast_move(move) for move in moves]
+            for player in ("Player1", "Player2"):
+                row = batch_eval.encode(game, player)
+                batch = batch_eval.children(row, moves, game.height)
+                self.assertEqual(batch.tolist(),
+                                 batch_eval.encode_all(children, player).tolist())
+                for score_fn in (sample_players.open_move_score,
+                                 sample_players.improved_score,
+                                 sample_players.center_score,
+                                 game_agent.custom_score,
+                                 game_agent.custom_score_2,
+                                 game_agent.custom_score_3):
+                    batch_fn = batch_eval.batch_version(score_fn)
+                    self.assertEqual(
+                        batch_fn(batch, game.width, game.height).tolist(),
+                        [score_fn(child, player) for child in children])
+        # The table still matches the heuristics of a reloaded module
+        self.assertIs(batch_eval.batch_version(reload(game_agent).custom_score),
+                      batch_eval.batch_custom_score)
+
+    def test_canonical_hash_of_symmetric_positions(self):
+        for board_cls in (isolation.Board, isolation.BitBoard,
+                          isolation.CompactBoard):
+            game = board_cls("Player1", "Player2")
+            for move in [(0, 1), (6, 6), (2, 2), (4, 5)]:
+                game.apply_move(move)
+            # the same moves reflected about the anti-diagonal
+            other = board_cls("Player1", "Player2")
+            for move in [(5, 6), (0, 0), (4, 4), (1, 2)]:
+                other.apply_move(move)
+            self.assertNotEqual(game.hash(), other.hash())
+            key, perm = game.canonical()
+            self.assertEqual(key, other.canonical()[0])
+            self.assertLessEqual(key, min(game.hash(), other.hash()))
+            self.assertEqual(sorted(perm), list(range(49)))
+        self.assertEqual(isolation.Board(1, 2).forecast_move((2, 2)).canonical(),
+                         isolation.BitBoard(1, 2).forecast_move((2, 2)).canonical())
+        # Canonical keys are only used in the opening
+        self.check_alphabeta_finds_best_move(
+            score_fn=sample_players.improved_score, num_moves_played=(2, 6),
+            tt_size=4096, move_ordering=True, canonical_tt=True)
+
+    def check_alphabeta_finds_best_move(self, score_fn=game_agent.custom_score,
+                                        num_moves_played=(6, 10, 14, 20),
+                                        **options):
+        rng = random.Random(3)
+        for num_moves in num_moves_played:
+            player = game_agent.AlphaBetaPlayer(score_fn=score_fn, **options)
+            player.time_left = lambda: float("inf")
+            game = random_position(isolation.Board, player, "Player2",
+                                   num_moves, rng)
+            if not game.get_legal_moves() or game.active_player != player:
+                game.apply_move(sorted(game.get_legal_moves())[0])
+            for depth in range(1, 5):
+                move = player.alphabeta(game, depth)
+                best = max(minimax_value(game.forecast_move(m), player,
+                                         depth - 1, score_fn)
+                           for m in game.get_legal_moves())
+                self.assertEqual(best, minimax_value(game.forecast_move(move),
+                                                     player, depth - 1, score_fn))
+
+
+class LazySMPTest(unittest.TestCase):
+    """Unit tests for the shared transposition table and Lazy SMP agent"""
+
+    def test_shared_table(self):
+        table = lazy_smp.SharedTranspositionTable(64)
+        other = lazy_smp.SharedTranspositionTable(64, table.name)
+        try:
+            table.store(5, 3, 1.5, 0., 10., (2, 3))
+            self.assertEqual(other.probe(5, 3, 0., 10.), (1.5, (2, 3)))
+            self.assertEqual(other.probe(5, 4, 0., 10.), (None, (2, 3)))
+            # 69 maps to the same slot, replacing the entry of 5
+            other.store(69, 1, 2.5, 0., 10., (0, 0))
+            self.assertIsNotNone(table.lookup(5))
+            other.store(69, 3, float("-inf"), 0., 10., None)
+            self.assertIsNone(table.lookup(5))
+            self.assertEqual(table.probe(69, 3, 0., 10.), (float("-inf"), None))
+            # a torn entry (value from another write) fails the key test
+            table._buf[5 * 24 + 8] ^= 1
+            self.assertIsNone(table.lookup(69))
+        finally:
+            other.close()
+            table.close()
+
+    def test_lazy_smp_player(self):
+        player = lazy_smp.LazySMPPlayer(workers=2, move_ordering=True)
+        try:
+            game = isolation.Board(player, "Player2")
+            game.apply_move((3, 3))
+            game.apply_move((2, 2))
+            for _ in range(2):
+                end = timeit.default_timer() + 0.1
+                move = player.get_move(
+                    game, lambda: 1000. * (end - timeit.default_timer()))
+                self.assertGreater(end, timeit.default_timer())
+                self.assertIn(move, game.get_legal_moves())
+                game.apply_move(move)
+                game.apply_move(game.get_legal_moves()[0])
+        finally:
+            player.close()
+
+
+    def test_helpers_search_different_trees(self):
+        def node_budget(nodes):
+            # A deterministic clock that runs out after a number of reads
+            reads = iter(range(nodes))
+            return lambda: float("inf") if next(reads, None) is not None else -1.
+
+        def searched_keys(player):
+            game = random_position(isolation.Board, player, "Player2", 6,
+                                   random.Random(4))
+            player.get_move(game, node_budget(20000))
+            self.assertGreater(player._completed_depth, 5)
+            return {entry[0] for entry in player.tt._entries if entry}
+
+        options = dict(move_ordering=True, tt_size=2**16)
+        main = searched_keys(game_agent.AlphaBetaPlayer(**options))
+        for index in (1, 2):
+            helper = searched_keys(lazy_smp.helper_player(index, options))
+            self.assertLess(len(main & helper) / len(main | helper), 0.5)
+
+
+class SearchStatsTest(unittest.TestCase):
+    """Unit tests for the opt-in search statistics collector"""
+
+    def test_stats_recorded_per_move_and_game(self):
+        player = game_agent.AlphaBetaPlayer(collect_stats=True)
+        opponent = game_agent.MinimaxPlayer(collect_stats=True)
+        for _ in range(2):
+            game = isolation.Board(player, opponent)
+            game.play()
+        self.assertIsNone(game_agent.AlphaBetaPlayer().stats)
+        self.assertEqual(len(player.stats.games), 2)
+        summary = player.stats.summary()
+        self.assertEqual(summary["moves"], len(player.stats.moves))
+        self.assertGreaterEqual(summary["min_depth"], 1)
+        self.assertGreater(summary["nodes"], 0)
+        # Deepening stops once the tree is solved, at most one ply per blank
+        for move in player.stats.moves:
+            self.assertLessEqual(move["depth"], 49 - move["move_count"])
+        self.assertFalse(player.stats.moves[-1]["timed_out"])
+        self.assertEqual(opponent.stats.summary()["max_depth"],
+                         opponent.search_depth)
+
+
+class AmortisedTimerTest(unittest.TestCase):
+    """Unit tests for the amortised time control"""
+
+    def test_fewer_clock_reads_within_deadline(self):
+        for player_cls in (game_agent.MinimaxPlayer, game_agent.AlphaBetaPlayer):
+            player = player_cls(search_depth=4, amortised_timer=True,
+                                collect_stats=True)
+            game = isolation.Board(player, "Player2")
+            game.apply_move((3, 3))
+            game.apply_move((2, 4))
+            game.apply_move((1, 2))
+            game.apply_move((0, 2))
+            reads = []
+            deadline = 1000 * timeit.default_timer() + 60
+
+            def time_left():
+                reads.append(1)
+                return deadline - 1000 * timeit.default_timer()
+
+            move = player.get_move(game, time_left)
+            self.assertIn(move, game.get_legal_moves())
+            self.assertGreater(time_left(), 0)
+            self.assertLess(len(reads), player.stats.moves[-1]["nodes"] / 4)
+
+
+def game_outcome(game, memo):
+    """Exhaustively decide whether the active player wins a position. """
+    key = game.hash()
+    if key not in memo:
+        memo[key] = any(not game_outcome(game.forecast_move(m), memo)
+                        for m in game.get_legal_moves())
+    return memo[key]
+
+
+class TimeManagerTest(unittest.TestCase):
+    """Unit tests for the iterative deepening time manager"""
+
+    def test_predicts_next_iteration(self):
+        clock = [100.]
+        manager = game_agent.TimeManager(lambda: clock[0], 10., 6)
+        clock[0] = 99.
+        self.assertTrue(manager.next_iteration(10, 1.))
+        clock[0] = 92.
+        # 8 ms for 90 nodes; the next 640 nodes would take 57 ms of 82 left
+        self.assertTrue(manager.next_iteration(80, 1.5))
+        clock[0] = 36.
+        # 56 ms for 640 nodes; the next 5120 nodes would not finish
+        self.assertFalse(manager.next_iteration(640, 1.))
+        self.assertFalse(manager.critical)
+        self.assertFalse(game_agent.TimeManager(lambda: 90., 10., 6)
+                         .next_iteration(10, float("inf")))
+        # an infinite clock (a search stopped from outside) keeps deepening
+        manager = game_agent.TimeManager(lambda: float("inf"), 10., 6)
+        for nodes in [10, 80, 640, 5120]:
+            self.assertTrue(manager.next_iteration(nodes, 1.))
+
+    def test_stretches_critical_positions(self):
+        # the next iteration is expected to take 81 ms of the 68 left, or
+        # 54 ms after a swing of the value since depth d - 2
+        for last_value, critical in [(1., False), (3., True)]:
+            clock = [100.]
+            manager = game_agent.TimeManager(lambda: clock[0], 10., 6)
+            for nodes, value, left in [(10, 1., 99.), (80, 1., 98.),
+                                       (640, 1., 92.), (2000, last_value, 78.)]:
+                clock[0] = left
+                result = manager.next_iteration(nodes, value)
+            self.assertEqual(result, critical)
+            self.assertEqual(manager.critical, critical)
+        self.assertTrue(game_agent.TimeManager(lambda: 100., 10., 2).critical)
+
+    def test_stops_early(self):
+        player = game_agent.AlphaBetaPlayer(time_manager=True,
+                                            collect_stats=True)
+        game = isolation.Board(player, "Player2")
+        game.apply_move((3, 3))
+        game.apply_move((2, 2))
+        for _ in range(4):
+            end = timeit.default_timer() + 0.15
+            move = player.get_move(
+                game, lambda: 1000. * (end - timeit.default_timer()))
+            self.assertGreater(end, timeit.default_timer())
+            self.assertIn(move, game.get_legal_moves())
+            game.apply_move(move)
+            game.apply_move(game.get_legal_moves()[0])
+        # without the manager, every search ends with a SearchTimeout
+        self.assertLess(player.stats.summary()["timed_out"], 4)
+
+
+class EndgameTest(unittest.TestCase):
+    """Unit tests for the partitioned endgame solver"""
+
+    def test_solver_matches_exhaustive_search(self):
+        rng = random.Random(0)
+        solved = 0
+        while solved < 10:
+            game = isolation.BitBoard("Player1", "Player2")
+            while game.get_legal_moves():
+                game.apply_move(rng.choice(sorted(game.get_legal_moves())))
+                if len(game.get_blank_spaces()) > 16 or not game.get_legal_moves():
+                    continue
+                result = endgame.solve(game)
+                if result is not None:
+                    self.assertEqual(result.win, game_outcome(game, {}))
+                    self.assertIn(result.move, game.get_legal_moves())
+                    solved += 1
+                    break
+
+    def test_connected_position_is_not_solved(self):
+        game = isolation.Board("Player1", "Player2")
+        self.assertIsNone(endgame.solve(game))
+        game.apply_move((3, 3))
+        game.apply_move((2, 4))
+        self.assertIsNone(endgame.solve(game))
+
+
+class SPRTTest(unittest.TestCase):
+    """Unit tests for the tournament statistics"""
+
+    def test_elo_interval(self):
+        self.assertAlmostEqual(sprt.elo_diff(0.5), 0.)
+        self.assertAlmostEqual(sprt.elo_diff(sprt.expected_score(120.)), 120.)
+        elo, low, high = sprt.elo_interval(60, 40)
+        self.assertTrue(low < elo < high)
+
+    def test_sprt_decisions(self):
+        test = sprt.SPRT(0., 50.)
+        self.assertIsNone(test.status())
+        test.update(60, 40)
+        self.assertIsNone(test.status())
+        test.update(90, 30)
+        self.assertEqual(test.status(), sprt.SPRT.H1)
+        test = sprt.SPRT(0., 50.)
+        test.update(200, 200)
+        self.assertEqual(test.status(), sprt.SPRT.H0)
+        self.assertRaises(ValueError, sprt.SPRT, 50., 0.)
+
+
+class OpeningBookTest(unittest.TestCase):
+    """Unit tests for the opening book"""
+
+    def setUp(self):
+        self.book = opening_book.build_book(max_ply=2, depth=2, width=5,
+                                            height=5)
+
+    def test_symmetric_positions_share_entries(self):
+        self.assertLess(len(self.book), 25 * 24 // 4)
+        for first in [(0, 0), (1, 2), (2, 2)]:
+            for second in [(4, 4), (3, 1), (0, 2)]:
+                game = opening_book.replay([first, second], 5, 5)
+                mirror = opening_book.replay(
+                    [(4 - first[0], first[1]), (4 - second[0], second[1])], 5, 5)
+                move = self.book.lookup(game)
+                self.assertIn(move, game.get_legal_moves())
+                # Equal up to the symmetries of the position itself
+                mirror_move = self.book.lookup(mirror)
+                self.assertEqual(
+                    mirror.forecast_move(mirror_move).canonical()[0],
+                    game.forecast_move(move).canonical()[0])
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "book.bin")
+            self.book.save(path)
+            book = opening_book.OpeningBook.load(path)
+        self.assertEqual(book.moves, self.book.moves)
+        player = game_agent.AlphaBetaPlayer(opening_book=book)
+        game = isolation.Board(player, "Player2", 5, 5)
+        game.apply_move((1, 2))
+        game.apply_move((3, 1))
+        start = timeit.default_timer()
+        move = player.get_move(game, lambda: 150.)
+        self.assertEqual(move, book.lookup(game))
+        self.assertLess(timeit.default_timer() - start, 0.01)
+        game.apply_move(move)
+        self.assertIsNone(book.lookup(game))
+
+
+class MCTSTest(unittest.TestCase):
+    """Unit tests for the MCTS competition agent"""
+
+    @staticmethod
+    def iterations(count):
+        """Return a time_left function that runs out after `count` MCTS
+        iterations."""
+        calls = iter(range(count + 1))
+        return lambda: 1000. if next(calls, count) < count else 0.
+
+    def test_mcts_reuses_tree(self):
+        player = competition_agent.CustomPlayer(timeout=1.)
+        game = isolation.Board(player, "Player2", 5, 5)
+        game.apply_move((2, 2))
+        game.apply_move((0, 0))
+        move = player.get_move(game, self.iterations(500))
+        self.assertIn(move, game.get_legal_moves())
+        node = player._tree[0]
+        reply = max(node.children, key=lambda n: n.visits).move
+        game.apply_move(move)
+        game.apply_move(reply)
+        # without time to search, the agent plays from the reused subtree
+        expected = max(node.child(reply).children, key=lambda n: n.visits)
+        self.assertEqual(player.get_move(game, self.iterations(0)),
+                         expected.move)
+
+    def test_discarded_tree_freed_without_gc(self):
+        player = competition_agent.CustomPlayer(timeout=1.)
+        game = isolation.Board(player, "Player2", 5, 5)
+        game.apply_move((2, 2))
+        game.apply_move((0, 0))
+        gc.disable()
+        try:
+            move = player.get_move(game, self.iterations(500))
+            node = player._tree[0]
+            old_node = weakref.ref(node)
+            reply = max(node.children, key=lambda n: n.visits).move
+            del node
+            game.apply_move(move)
+            game.apply_move(reply)
+            player.get_move(game, self.iterations(100))
+            # the tree has no cycles: the old root is freed on re-rooting
+            self.assertIsNone(old_node())
+        finally:
+            gc.enable()
+
+    def test_mcts_leaves_board_unchanged(self):
+        player = competition_agent.CustomPlayer(timeout=1.)
+        game = isolation.Board(player, "Player2", 5, 5)
+        for move in [(0, 0), (4, 4), (1, 2), (2, 3)]:
+            game.apply_move(move)
+        board = game.copy()
+        move = player.get_move(game, self.iterations(2000))
+        self.assertIn(move, game.get_legal_moves())
+        self.assertEqual(game.to_string(), board.to_string())
+
+
+class TablebaseTest(unittest.TestCase):
+    """Unit tests for the retrograde tablebase"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmp.name, "tablebase.bin")
+        self.assertEqual(tablebase.build(3, 4, path), 5285)
+        self.tablebase = tablebase.Tablebase(path)
+
+    def tearDown(self):
+        del self.tablebase
+        self.tmp.cleanup()
+
+    def test_tablebase_matches_exhaustive_search(self):
+        rng = random.Random(0)
+        memo = {}
+        for _ in range(100):
+            game = isolation.Board("Player1", "Player2", 3, 4)
+            for _ in range(rng.randrange(8)):
+                moves = sorted(game.get_legal_moves())
+                if not moves:
+                    break
+                game.apply_move(rng.choice(moves))
+            distance = self.tablebase.lookup(game)
+            self.assertEqual(distance % 2 == 1, game_outcome(game, memo))
+            self.assertEqual(distance == 0, not game.get_legal_moves())
+        self.assertIsNone(self.tablebase.lookup(isolation.Board("a", "b")))
+
+    def test_player_wins_won_positions(self):
+        rng = random.Random(1)
+        player = tablebase.TablebasePlayer(self.tablebase)
+        wins = 0
+        while wins < 10:
+            opponent = sample_players.RandomPlayer()
+            game = isolation.Board(player, opponent, 3, 4)
+            game.apply_move(rng.choice(game.get_legal_moves()))
+            game.apply_move(rng.choice(game.get_legal_moves()))
+            if self.tablebase.lookup(game) % 2 == 1:
+                winner, _, _ = game.play()
+                self.assertIs(winner, player)
+                wins += 1
+
+
+class GameRecordTest(unittest.TestCase):
+    """Unit tests for the binary game record format"""
+
+    def test_records_round_trip(self):
+        random.seed(0)
+        results = []
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "games.bin")
+            for i in range(6):
+                names = ("Greedy", "Random {}".format(i))
+                game = isolation.Board(sample_players.GreedyPlayer(),
+                                       sample_players.RandomPlayer())
+                opening = tournament.random_opening()
+                winner, history, termination, record = tournament.play_game(
+                    game, names, opening)
+                results.append((game, winner is game._player_2, record))
+                # streamed by a new writer every time
+                with RecordWriter(path) as writer:
+                    writer.write(record)
+            records = list(read_records(path))
+            tail = list(read_records(path, start=4))
+        self.assertEqual(tail, records[4:])
+        for (game, second_won, record), loaded in zip(results, records):
+            self.assertEqual(loaded.players, record.players)
+            self.assertEqual(loaded.moves, record.moves)
+            self.assertEqual(loaded.termination, record.termination)
+            self.assertEqual(loaded.winner, int(second_won))
+            self.assertEqual(loaded.times[:2], [None, None])
+            for time, original in zip(loaded.times[2:], record.times[2:]):
+                self.assertAlmostEqual(time, original, delta=0.05)
+            self.assertEqual(loaded.position().to_string(), game.to_string())
+            self.assertEqual(loaded.position(3).move_count, 3)
+
+
+class TuningTest(unittest.TestCase):
+    """Unit tests for the heuristic weight tuning"""
+
+    def setUp(self):
+        self.params = {k: dict(v) for k, v in game_agent.PARAMS.items()}
+
+    def tearDown(self):
+        game_agent.PARAMS.update(self.params)
+
+    def test_params_file(self):
+        game = random_position(isolation.Board, "Player1", "Player2", 10,
+                               random.Random(0))
+        weights = {"own_weight": 1.5, "enemy_weight": 2., "center_weight": 0.}
+        expected = game_agent.custom_score_3(game, "Player1", weights)
+        self.assertNotEqual(expected, game_agent.custom_score_3(game, "Player1"))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "params.json")
+            tuning.save_params({"custom_score_3": weights}, path)
+            tuning.save_params({"custom_score_2": {"center_divisor": 3.}},
+                               path)
+            tuning.load_params(path)
+        self.assertEqual(game_agent.custom_score_3(game, "Player1"), expected)
+        self.assertEqual(game_agent.PARAMS["custom_score_2"]["center_divisor"], 3.)
+
+    def test_spsa_and_texel(self):
+        random.seed(0)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "games.bin")
+            with RecordWriter(path) as writer:
+                weights = tuning.spsa("custom_score_3", iterations=2, pairs=2,
+                                      depth=1, processes=1, writer=writer)
+            self.assertEqual(sorted(weights), sorted(self.params["custom_score_3"]))
+            positions = tuning.load_positions([path])
+            records = list(read_records(path))
+        self.assertEqual(len(records), 8)
+        # Self-play games are played out until a player has no legal moves
+        self.assertEqual({r.termination for r in records}, {"illegal move"})
+        self.assertEqual(len(positions), sum(len(r.moves) - 2 for r in records))
+        scale = tuning.fit_scale(positions, game_agent.custom_score_3,
+                                 self.params["custom_score_3"])
+        before = tuning.texel_error(positions, game_agent.custom_score_3,
+                                    self.params["custom_score_3"], scale)
+        weights, error = tuning.texel("custom_score_3", positions, scale)
+        self.assertLessEqual(error, before)
+        self.assertAlmostEqual(error, tuning.texel_error(
+            positions, game_agent.custom_score_3, weights, scale))
+        # Weights starting at 0 are tuned with an additive step
+        game_agent.PARAMS["custom_score_3"]["center_weight"] = 0.
+        weights, _ = tuning.texel("custom_score_3", positions, scale,
+                                  min_step=0.1)
+        self.assertLessEqual(abs(weights["center_weight"]), tuning.MAX_RATIO)
+
+
+class PonderTest(unittest.TestCase):
+    """Unit tests for pondering on the opponent's time"""
+
+    @staticmethod
+    def countdown(ms):
+        end = timeit.default_timer() + ms / 1000.
+        return lambda: 1000. * (end - timeit.default_timer())
+
+    def test_ponder_hit_searches_deeper(self):
+        player = ponder.PonderingPlayer(move_ordering=True)
+        try:
+            game = isolation.Board(player, "Player2")
+            game.apply_move((3, 3))
+            game.apply_move((2, 2))
+            move = player.get_move(game, self.countdown(50))
+            reply = player.expected_reply(game, move)
+            self.assertIn(reply, game.forecast_move(move).get_legal_moves())
+            game.apply_move(move)
+            game.apply_move(reply)
+            # the opponent thinks for a while
+            time.sleep(0.5)
+            move = player.get_move(game, self.countdown(30))
+            self.assertIn(move, game.get_legal_moves())
+            self.assertEqual((player.ponder_hits, player.ponder_misses), (1, 0))
+            fresh = game_agent.AlphaBetaPlayer(tt_size=2**16, move_ordering=True)
+            fresh.get_move(lazy_smp.with_players(game, fresh, "Player2"),
+                           self.countdown(30))
+            self.assertGreater(player._completed_depth, fresh._completed_depth)
+
+            reply = player.expected_reply(game, move)
+            game.apply_move(move)
+            other = [m for m in game.get_legal_moves() if m != reply][0]
+            game.apply_move(other)
+            player.get_move(game, self.countdown(30))
+            self.assertEqual((player.ponder_hits, player.ponder_misses), (1, 1))
+        finally:
+            player.close()
+
+    def test_ponder_with_time_manager(self):
+        player = ponder.PonderingPlayer(time_manager=True, move_ordering=True)
+        try:
+            game = isolation.Board(player, "Player2")
+            game.apply_move((3, 3))
+            game.apply_move((2, 2))
+            move = player.get_move(game, self.countdown(100))
+            game.apply_move(move)
+            game.apply_move(player.expected_reply(game, move) or
+                            game.get_legal_moves()[0])
+            time.sleep(0.5)
+            player.get_move(game, self.countdown(30))
+            # the pondering search deepens until it is stopped
+            self.assertGreater(player.ponder_depth, 4)
+        finally:
+            player.close()
+
+    def test_unfinished_search_is_not_resumed(self):
+        player = ponder.PonderingPlayer()
+        try:
+            game = isolation.Board(player, "Player2")
+            game.apply_move((3, 3))
+            game.apply_move((2, 2))
+            game.apply_move(player.get_move(game, self.countdown(100)))
+            game.apply_move(game.get_legal_moves()[0])
+            self.assertEqual(player._job_id, 1)
+            # the pondering search does not report in time: it must stay
+            # stopped rather than run on as the search of the next position
+            player._done = queue.Queue()
+            game.apply_move(player.get_move(game, self.countdown(30)))
+            game.apply_move(game.get_legal_moves()[0])
+            self.assertTrue(player._stop.is_set())
+            self.assertEqual(player._job_id, 1)
+            # once it has reported, pondering resumes with a new job
+            player._done.put((1, 3))
+            player.get_move(game, self.countdown(30))
+            self.assertFalse(player._stop.is_set())
+            self.assertEqual(player._job_id, 2)
+        finally:
+            player.close()
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,207 @@
+"""Vectorised evaluation of batches of Isolation positions with NumPy.
+
+A position is encoded from the point of view of one player as a row of
+integers: one blocked flag per cell (in `Board` cell index order, row +
+column * height), a sentinel cell that is always blocked, and then the cell
+index of the player, the cell index of its opponent (the sentinel index if
+not moved yet), whether the player is to move, and the move count. A batch is
+a 2D array of such rows, e.g., all children of a node built at once with
+`children`, or a whole search frontier stacked with `encode_all`.
+
+Mobility, distances to the centre and terminal status are then computed for
+the whole batch with a few array operations over a precomputed table of
+knight moves, and the `batch_*` score functions return exactly the values of
+the heuristics of the same name in `game_agent` and `sample_players`.
+"""
+import numpy as np
+
+from isolation.array_board import ArrayBoard
+from isolation.isolation import knight_moves
+import game_agent
+
+# Columns of an encoding following the cell flags and the sentinel
+OWN, OPP, TO_MOVE, MOVE_COUNT = range(-4, 0)
+
+_MOVE_TABLES = {}
+
+
+def move_table(width, height):
+    """Return the knight move table of a board as an array of shape (cells
+    + 1, 8): row `idx` holds the cells reachable from cell `idx`, padded with
+    the sentinel index `cells` (the sentinel row has no moves)."""
+    key = (width, height)
+    table = _MOVE_TABLES.get(key)
+    if table is None:
+        cells = width * height
+        table = np.full((cells + 1, 8), cells, dtype=np.intp)
+        for idx, moves in enumerate(knight_moves(width, height)):
+            for i, (move_idx, _) in enumerate(moves):
+                table[idx, i] = move_idx
+        table = _MOVE_TABLES[key] = table
+    return table
+
+
+def _encode_list(game, player):
+    """Return the encoding of a position as a list. """
+    h = game.height
+    cells = game.width * h
+    row = [1] * (cells + 5)
+    for r, c in game.get_blank_spaces():
+        row[r + c * h] = 0
+    for column, who in ((OWN, player), (OPP, game.get_opponent(player))):
+        loc = game.get_player_location(who)
+        row[column] = cells if loc is None else loc[0] + loc[1] * h
+    row[TO_MOVE] = int(game.active_player == player)
+    row[MOVE_COUNT] = game.move_count
+    return row
+
+
+def _encode_array(game, player):
+    """Return the encoding of a position of an `ArrayBoard`, copying its
+    cell array instead of listing the blank cells."""
+    cells = game.width * game.height
+    row = np.ones(cells + 5, dtype=np.int16)
+    row[:cells] = game.blocked_cells()
+    for column, who in ((OWN, player), (OPP, game.get_opponent(player))):
+        loc = game.get_player_location(who)
+        row[column] = cells if loc is None else loc[0] + loc[1] * game.height
+    row[TO_MOVE] = game.active_player == player
+    row[MOVE_COUNT] = game.move_count
+    return row
+
+
+def encode(game, player):
+    """Return the encoding of a position from the point of view of `player`.
+    """
+    if isinstance(game, ArrayBoard):
+        return _encode_array(game, player)
+    return np.array(_encode_list(game, player), dtype=np.int16)
+
+
+def encode_all(games, player):
+    """Return the batch of encodings of several positions (e.g., a search
+    frontier) from the point of view of `player`."""
+    if games and isinstance(games[0], ArrayBoard):
+        return np.stack([_encode_array(game, player) for game in games])
+    return np.array([_encode_list(game, player) for game in games],
+                    dtype=np.int16)
+
+
+def children(row, moves, height):
+    """Return the batch of encodings of the positions reached by each of
+    `moves` (a list of (row, column) pairs) from the position `row`."""
+    idx = np.array([r + c * height for r, c in moves], dtype=np.intp)
+    batch = np.repeat(row[None, :], len(idx), axis=0)
+    batch[np.arange(len(idx)), idx] = 1
+    batch[:, OWN if row[TO_MOVE] else OPP] = idx
+    batch[:, TO_MOVE] ^= 1
+    batch[:, MOVE_COUNT] += 1
+    return batch
+
+
+def mobility(batch, width, height):
+    """Return (own_moves, opp_moves, loser, winner) arrays for a batch: the
+    number of legal moves of the player and its opponent, and whether the
+    player has lost or won."""
+    cells = width * height
+    # Destinations of both players: shape (batch, 2, 8)
+    locs = batch[:, OWN:TO_MOVE]
+    dest = move_table(width, height)[locs]
+    rows = np.arange(len(batch))[:, None, None]
+    moves = 8 - batch[rows, dest].sum(axis=2)
+    if (locs == cells).any():
+        # A player that has not moved yet can move to any blank cell
+        blank = cells - batch[:, :cells].sum(axis=1)
+        moves = np.where(locs == cells, blank[:, None], moves)
+    own_moves, opp_moves = moves[:, 0], moves[:, 1]
+    to_move = batch[:, TO_MOVE] == 1
+    return (own_moves, opp_moves, to_move & (own_moves == 0),
+            ~to_move & (opp_moves == 0))
+
+
+def _coords(locs, height):
+    """Return the (row, column) arrays of an array of cell indices. """
+    return locs % height, locs // height
+
+
+def _with_terminal(values, loser, winner):
+    return np.where(loser, -np.inf, np.where(winner, np.inf, values))
+
+
+def batch_open_move_score(batch, width, height):
+    own_moves, _, loser, winner = mobility(batch, width, height)
+    return _with_terminal(own_moves, loser, winner)
+
+
+def batch_improved_score(batch, width, height):
+    own_moves, opp_moves, loser, winner = mobility(batch, width, height)
+    return _with_terminal(own_moves - opp_moves, loser, winner)
+
+
+def batch_center_score(batch, width, height):
+    _, _, loser, winner = mobility(batch, width, height)
+    y, x = _coords(batch[:, OWN], height)
+    return _with_terminal((height / 2. - y)**2 + (width / 2. - x)**2,
+                          loser, winner)
+
+
+def batch_custom_score(batch, width, height):
+    own_moves, opp_moves, loser, winner = mobility(batch, width, height)
+    cx, cy = width / 2., height / 2.
+    my, mx = _coords(batch[:, OWN], height)
+    ey, ex = _coords(batch[:, OPP], height)
+    my_dist = abs(mx - cx) + abs(my - cy)
+    enemy_dist = abs(ex - cx) + abs(ey - cy)
+    values = np.where(own_moves != opp_moves, own_moves - opp_moves,
+                      enemy_dist - my_dist)
+    return _with_terminal(values, loser, winner)
+
+
+def batch_custom_score_2(batch, width, height):
+    own_moves, opp_moves, loser, winner = mobility(batch, width, height)
+    cx, cy = width / 2., height / 2.
+    my, mx = _coords(batch[:, OWN], height)
+    ey, ex = _coords(batch[:, OPP], height)
+    my_dist = (cy - my)**2 + (cx - mx)**2
+    enemy_dist = (cy - ey)**2 + (cx - ex)**2
+    divisor = game_agent.PARAMS["custom_score_2"]["center_divisor"]
+    values = ((own_moves - opp_moves) +
+              (enemy_dist - my_dist) / (divisor * batch[:, MOVE_COUNT]))
+    return _with_terminal(values, loser, winner)
+
+
+def batch_custom_score_3(batch, width, height):
+    own_moves, opp_moves, loser, winner = mobility(batch, width, height)
+    my, mx = _coords(batch[:, OWN], height)
+    jumps = np.minimum(abs(mx - width / 2.), abs(my - height / 2.))
+    weights = game_agent.PARAMS["custom_score_3"]
+    return _with_terminal(weights["own_weight"] * own_moves -
+                          weights["enemy_weight"] * opp_moves -
+                          weights["center_weight"] * jumps, loser, winner)
+
+
+# Batch version of each supported heuristic, keyed by the module and name of
+# the heuristic rather than the function object, so that the table still
+# matches after the module is reloaded (e.g., by agent_test.py)
+BATCH_SCORES = {
+    ("sample_players", "open_move_score"): batch_open_move_score,
+    ("sample_players", "improved_score"): batch_improved_score,
+    ("sample_players", "center_score"): batch_center_score,
+    ("game_agent", "custom_score"): batch_custom_score,
+    ("game_agent", "custom_score_2"): batch_custom_score_2,
+    ("game_agent", "custom_score_3"): batch_custom_score_3,
+}
+
+
+def batch_version(score_fn):
+    """Return the batch version of a heuristic (see `BATCH_SCORES`), or None
+    if it has none."""
+    return BATCH_SCORES.get((getattr(score_fn, "__module__", None),
+                             getattr(score_fn, "__name__", None)))
+
+
+def evaluate(games, player, score_fn):
+    """Return the values of `score_fn` for a list of positions from the point
+    of view of `player`, computed in a single batch."""
+    batch = encode_all(games, player)
+    return batch_version(score_fn)(batch, games[0].width, games[0].height)
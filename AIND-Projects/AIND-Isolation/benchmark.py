@@ -0,0 +1,241 @@
+"""Micro-benchmarks for the isolation board, the heuristic functions and the
+search agents.
+
+Every benchmark runs over the same corpus of reproducible positions, built by
+playing random moves from a seeded random number generator, so results from
+two runs (e.g., before and after a change, or with different board backends)
+can be saved and compared:
+
+    python benchmark.py --output before.json
+    python benchmark.py --board BitBoard --compare before.json
+
+Board operations and heuristics are reported as the mean time per call in
+microseconds (the best of several repeats), clearing the legal move cache of
+the boards that have one before every call so that each call is timed as on
+a new position (as in a search); fixed-depth searches are reported
+in nodes per second, and the alpha-beta search variants by the number of
+nodes of an iterative deepening search to a fixed depth.
+"""
+import argparse
+import json
+import random
+import timeit
+
+import isolation
+from isolation.array_board import ArrayBoard
+from sample_players import improved_score, center_score
+from game_agent import (MinimaxPlayer, AlphaBetaPlayer, custom_score,
+                        custom_score_2, custom_score_3)
+
+BOARDS = {"Board": isolation.Board, "BitBoard": isolation.BitBoard,
+          "ArrayBoard": ArrayBoard, "CompactBoard": isolation.CompactBoard}
+
+SCORE_FNS = [custom_score, custom_score_2, custom_score_3,
+             improved_score, center_score]
+
+NUM_POSITIONS = 50  # number of positions in the corpus
+NUMBER = 50  # number of passes over the corpus in each timing
+REPEAT = 5  # number of repeats of each timing (the best is kept)
+SEARCH_DEPTH = 4  # depth of the fixed-depth search benchmarks
+NODES_DEPTH = 6  # depth of the iterative deepening node count benchmarks
+
+# Alpha-beta search options compared by the node count benchmarks
+SEARCH_VARIANTS = [
+    ("plain", {}),
+    ("ordered", {"tt_size": 2**16, "move_ordering": True}),
+    ("pvs", {"tt_size": 2**16, "move_ordering": True, "pvs": True}),
+    ("pvs_aspiration", {"tt_size": 2**16, "move_ordering": True, "pvs": True,
+                        "aspiration_window": 1.}),
+]
+
+
+def make_positions(num_positions, seed, width=7, height=7):
+    """Return a corpus of `num_positions` non-terminal positions as lists of
+    moves, each played from an empty board by a seeded random player.
+
+    Positions are spread from the opening to the late middle game, and both
+    players have at least one legal move in every position.
+    """
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < num_positions:
+        game = isolation.Board("Player1", "Player2", width, height)
+        target = rng.randint(2, width * height // 2)
+        moves = []
+        while len(moves) < target:
+            legal_moves = sorted(game.get_legal_moves())
+            if not legal_moves:
+                break
+            move = rng.choice(legal_moves)
+            game.apply_move(move)
+            moves.append(move)
+        if (len(moves) == target and game.get_legal_moves(game.active_player) and
+                game.get_legal_moves(game.inactive_player)):
+            positions.append(moves)
+    return positions
+
+
+def build(board_cls, moves, player_1="Player1", player_2="Player2"):
+    """Replay a list of moves on a new board. """
+    game = board_cls(player_1, player_2)
+    for move in moves:
+        game.apply_move(move)
+    return game
+
+
+def time_per_call(fn, args_list, number=NUMBER, repeat=REPEAT):
+    """Return the mean time (in microseconds) of calling `fn(*args)` for the
+    args tuples in `args_list`, over `number` passes of the list and keeping
+    the best of `repeat` runs."""
+    def run():
+        for args in args_list:
+            fn(*args)
+    best = min(timeit.repeat(run, number=number, repeat=repeat))
+    return 1e6 * best / (number * len(args_list))
+
+
+def uncached(fn):
+    """Wrap a function taking a board as first argument so that the board's
+    legal move cache (if any) is cleared before every call; otherwise every
+    pass over the corpus after the first would only time cache lookups."""
+    def wrapper(game, *args):
+        cache = getattr(game, "_moves_cache", None)
+        if cache is not None:
+            cache.clear()
+        return fn(game, *args)
+    return wrapper
+
+
+def bench_board(board_cls, positions):
+    """Time the core Board operations over the positions. """
+    games = [build(board_cls, moves) for moves in positions]
+    with_moves = [(game, game.get_legal_moves()[0]) for game in games]
+    return {
+        "get_legal_moves": time_per_call(
+            uncached(lambda g: g.get_legal_moves()), [(g,) for g in games]),
+        "forecast_move": time_per_call(
+            lambda g, m: g.forecast_move(m), with_moves),
+        "copy": time_per_call(lambda g: g.copy(), [(g,) for g in games]),
+        "utility": time_per_call(
+            uncached(lambda g: g.utility("Player1")), [(g,) for g in games]),
+    }
+
+
+def bench_scores(board_cls, positions):
+    """Time each heuristic function over the positions. """
+    games = [(build(board_cls, moves), "Player1") for moves in positions]
+    return {fn.__name__: time_per_call(uncached(fn), games)
+            for fn in SCORE_FNS}
+
+
+def bench_search(board_cls, positions, depth=SEARCH_DEPTH):
+    """Measure the nodes per second of fixed-depth minimax and alphabeta
+    searches from every position (with the searching agent to move)."""
+    results = {}
+    for name, player_cls, search in [("minimax", MinimaxPlayer, "minimax"),
+                                     ("alphabeta", AlphaBetaPlayer, "alphabeta")]:
+        player = player_cls(search_depth=depth, score_fn=improved_score)
+        player.time_left = lambda: float("inf")
+        random.seed(0)
+        nodes = elapsed = 0
+        for moves in positions:
+            if len(moves) % 2:
+                game = build(board_cls, moves, "Player1", player)
+            else:
+                game = build(board_cls, moves, player, "Player2")
+            player._nodes = 0
+            start = timeit.default_timer()
+            getattr(player, search)(game, depth)
+            elapsed += timeit.default_timer() - start
+            nodes += player._nodes
+        results[name] = nodes / elapsed
+    return results
+
+
+def bench_nodes(board_cls, positions, depth=NODES_DEPTH):
+    """Count the nodes of an iterative deepening alpha-beta search to `depth`
+    plies from every position for each of the search variants."""
+    results = {}
+    for name, options in SEARCH_VARIANTS:
+        nodes = 0
+        for moves in positions:
+            player = AlphaBetaPlayer(score_fn=improved_score, **options)
+            player.time_left = lambda: float("inf")
+            if len(moves) % 2:
+                game = build(board_cls, moves, "Player1", player)
+            else:
+                game = build(board_cls, moves, player, "Player2")
+            random.seed(0)
+            value = None
+            for d in range(1, depth + 1):
+                player.aspiration_search(game, d, value)
+                value = player._root_value
+            nodes += player._nodes
+        results[name] = nodes
+    return results
+
+
+def run(board_name, num_positions, seed):
+    board_cls = BOARDS[board_name]
+    positions = make_positions(num_positions, seed)
+    return {
+        "board": board_name,
+        "positions": num_positions,
+        "seed": seed,
+        "board_us": bench_board(board_cls, positions),
+        "score_us": bench_scores(board_cls, positions),
+        "search_nodes_per_second": bench_search(board_cls, positions),
+        "search_nodes": bench_nodes(board_cls, positions),
+    }
+
+
+def print_results(results, baseline=None):
+    """Print the results, with the speedup over a baseline run if given. """
+    print("\nBoard: {}, {} positions, seed {}".format(
+        results["board"], results["positions"], results["seed"]))
+    if baseline is not None:
+        print("Baseline: {}, {} positions, seed {}".format(
+            baseline["board"], baseline["positions"], baseline["seed"]))
+    for section, unit, higher_is_better in [
+            ("board_us", "us/call", False),
+            ("score_us", "us/call", False),
+            ("search_nodes_per_second", "nodes/s", True),
+            ("search_nodes", "nodes", False)]:
+        print("\n{:<24}{:>14}".format(section, unit) +
+              ("{:>14}{:>10}".format("baseline", "speedup") if baseline else ""))
+        for name, value in results[section].items():
+            line = "{:<24}{:>14.2f}".format(name, value)
+            if baseline is not None and name in baseline.get(section, {}):
+                old = baseline[section][name]
+                speedup = value / old if higher_is_better else old / value
+                line += "{:>14.2f}{:>9.2f}x".format(old, speedup)
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--board", choices=sorted(BOARDS), default="Board",
+                        help="board implementation to benchmark")
+    parser.add_argument("--positions", type=int, default=NUM_POSITIONS,
+                        help="number of positions in the corpus")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="random seed used to generate the corpus")
+    parser.add_argument("--output", metavar="PATH",
+                        help="save the results to a JSON file")
+    parser.add_argument("--compare", metavar="PATH",
+                        help="compare with the results saved in a JSON file")
+    args = parser.parse_args()
+
+    results = run(args.board, args.positions, args.seed)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,19 @@ you choose.  This agent will compete against other students (and past
 champions) in a tournament.
 
          COMPLETING AND SUBMITTING A COMPETITION AGENT IS OPTIONAL
+
+`CustomPlayer` searches with Monte Carlo Tree Search (UCT): every iteration
+walks down the tree choosing children by their upper confidence bound, adds
+one new node, finishes the game with random moves, and backs the result up
+the path. Iterations push and pop moves on a single copy of the board instead
+of creating a board per node, and the subtree of the position reached after
+the agent's move and the opponent's reply is kept for the next move.
 """
+import math
 import random
 
+from game_agent import SearchStats
+
 
 class SearchTimeout(Exception):
     """Subclass base exception for code clarity. """
@@ -36,6 +46,37 @@ def custom_score(game, player):
     raise NotImplementedError
 
 
+class _Node:
+    """Node of the MCTS tree for the position reached by `move`.
+
+    `wins` counts the playouts won by the player who made `move`, so the
+    children of a node are compared from the point of view of the player to
+    move at that node. Nodes hold no reference to their parent, so the tree
+    has no reference cycles and the subtrees discarded between moves are
+    freed as soon as they are released, without cyclic garbage collection.
+    """
+
+    def __init__(self, move=None, moves=()):
+        self.move = move
+        self.children = []
+        self.untried = list(moves)
+        self.wins = 0.
+        self.visits = 0
+
+    def select_child(self, exploration):
+        """Return the child with the highest upper confidence bound. """
+        log_visits = math.log(self.visits)
+        return max(self.children, key=lambda n: n.wins / n.visits +
+                   exploration * math.sqrt(log_visits / n.visits))
+
+    def child(self, move):
+        """Return the child reached by `move`, or None if not expanded. """
+        for node in self.children:
+            if node.move == move:
+                return node
+        return None
+
+
 class CustomPlayer:
     """Game-playing agent to use in the optional player vs player Isolation
     competition.
@@ -59,12 +100,32 @@ class CustomPlayer:
         the PvP competition uses more accurate timers that are not cross-
         platform compatible, so a limit of 1ms (vs 10ms for the other classes)
         is generally sufficient.
+
+    exploration : float (optional)
+        Exploration constant of the UCT selection rule.
+
+    reuse_tree : bool (optional)
+        Keep the subtree of the expected position between consecutive moves
+        of the same game instead of starting every search from scratch.
+
+    collect_stats : bool (optional)
+        Record the statistics of every search in a `game_agent.SearchStats`
+        object available as `self.stats` (None if disabled); the depth is
+        that of the most visited line and the nodes are the positions
+        visited by the iterations, including playouts.
     """
 
-    def __init__(self, data=None, timeout=1.):
+    def __init__(self, data=None, timeout=1., exploration=math.sqrt(2),
+                 reuse_tree=True, collect_stats=False):
         self.score = custom_score
         self.time_left = None
         self.TIMER_THRESHOLD = timeout
+        self.exploration = exploration
+        self.reuse_tree = reuse_tree
+        self.stats = SearchStats() if collect_stats else None
+        self._nodes = 0
+        # (node, board) of the position after the agent's last move
+        self._tree = None
 
     def get_move(self, game, time_left):
         """Search for the best move from the available legal moves and return a
@@ -93,5 +154,102 @@ class CustomPlayer:
             Board coordinates corresponding to a legal move; may return
             (-1, -1) if there are no available legal moves.
         """
-        # OPTIONAL: Finish this function!
-        raise NotImplementedError
+        self.time_left = time_left
+        start = time_left()
+        self._nodes = 0
+
+        root = self.__reuse_tree(game)
+        if root is None:
+            root = _Node(moves=game.get_legal_moves(shuffle=False))
+        if not root.children and not root.untried:
+            return (-1, -1)
+
+        board = game.copy()
+        while self.time_left() > self.TIMER_THRESHOLD:
+            self.mcts(board, root)
+
+        if not root.children:
+            # no time for a single iteration
+            return random.choice(root.untried)
+        best = max(root.children, key=lambda n: n.visits)
+        if self.reuse_tree:
+            self._tree = (best, game.forecast_move(best.move))
+        if self.stats is not None:
+            depth, node = 0, root
+            while node.children:
+                node = max(node.children, key=lambda n: n.visits)
+                depth += 1
+            end = time_left()
+            self.stats.record_move(game.move_count, depth, self._nodes, 0,
+                                   start - end, end, False)
+        return best.move
+
+    def __reuse_tree(self, game):
+        """Return the node of the previous tree for the position of `game`,
+        or None if it was not expanded (or is from another game)."""
+        if self._tree is None:
+            return None
+        node, board = self._tree
+        self._tree = None
+        if board.move_count + 1 != game.move_count:
+            return None
+        opp_move = game.get_player_location(game.inactive_player)
+        if not board.move_is_legal(opp_move):
+            return None
+        board.apply_move(opp_move)
+        if board.hash() != game.hash():
+            return None
+        return node.child(opp_move)
+
+    def mcts(self, board, root):
+        """Run one MCTS iteration from `root`, the node of the position of
+        `board`; moves are pushed on the board and popped before returning.
+
+        Parameters
+        ----------
+        board : `isolation.Board`
+            The position of the root node; it is left unchanged.
+
+        root : `_Node`
+            The root of the search tree, updated with the playout result.
+        """
+        node = root
+        path = [root]
+        depth = 0
+        try:
+            # Selection
+            while not node.untried and node.children:
+                node = node.select_child(self.exploration)
+                path.append(node)
+                board.push(node.move)
+                depth += 1
+
+            # Expansion
+            if node.untried:
+                move = node.untried.pop(random.randrange(len(node.untried)))
+                board.push(move)
+                depth += 1
+                child = _Node(move, board.get_legal_moves(shuffle=False))
+                node.children.append(child)
+                path.append(child)
+            tree_depth = depth
+
+            # Playout: the player to move with no legal moves loses
+            moves = board.get_legal_moves(shuffle=False)
+            while moves:
+                board.push(random.choice(moves))
+                depth += 1
+                moves = board.get_legal_moves(shuffle=False)
+        finally:
+            self._nodes += depth
+            for _ in range(depth):
+                board.pop()
+
+        # Backpropagation: the player who moved into a node wins if the
+        # player to move at the end of the game is its opponent
+        won = (depth - tree_depth) % 2 == 0
+        for node in reversed(path):
+            node.visits += 1
+            if won:
+                node.wins += 1
+            won = not won
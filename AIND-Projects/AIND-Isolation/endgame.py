@@ -0,0 +1,141 @@
+"""Exact endgame solver for Isolation positions in which the two players have
+been separated into disconnected regions of the board.
+
+Once no open cell can be reached by both players, the players can no longer
+interfere with each other, and the game is decided by the length of the
+longest knight path each of them can make inside its own region: the player
+to move wins if and only if its longest path is strictly longer than the
+opponent's. Regions are found by a flood fill over the knight-move graph of
+the open cells, and longest paths are found by a depth-first search memoised
+on (square, region bitmask), so results are shared between the positions of a
+game and across games on the same board size.
+"""
+from collections import namedtuple
+
+from isolation.bitboard import knight_masks
+
+# Number of search nodes between two calls to the caller's timer check
+CHECK_INTERVAL = 256
+
+EndgameResult = namedtuple("EndgameResult",
+                           ["move", "length", "opponent_length", "win"])
+EndgameResult.__doc__ = """Outcome of a separated position for the player to
+move: the first move of its longest path (None if it has no moves), the
+length of that path, the length of the opponent's longest path (computed
+only up to `length`), and whether the player to move wins."""
+
+
+def open_mask(game):
+    """Return the bitmask of the open cells of a board. """
+    mask = 0
+    for r, c in game.get_blank_spaces():
+        mask |= 1 << (r + c * game.height)
+    return mask
+
+
+def region(start, cells, masks):
+    """Return the bitmask of the cells in `cells` reachable by a sequence of
+    knight moves from the cell index `start` (which need not be open)."""
+    reached = 0
+    frontier = masks[start] & cells
+    while frontier:
+        reached |= frontier
+        nxt = 0
+        while frontier:
+            low = frontier & -frontier
+            nxt |= masks[low.bit_length() - 1]
+            frontier ^= low
+        frontier = nxt & cells & ~reached
+    return reached
+
+
+class _PathSearch:
+    """Depth-first longest knight path search within a region. """
+
+    def __init__(self, masks, memo, check):
+        self.masks = masks
+        self.memo = memo
+        self.check = check
+        self.countdown = CHECK_INTERVAL
+
+    def longest(self, pos, cells, limit):
+        """Return the length of the longest path from `pos` over `cells`,
+        stopping early once a path of `limit` moves is found."""
+        key = (pos, cells)
+        if key in self.memo:
+            return self.memo[key]
+        if self.check is not None:
+            self.countdown -= 1
+            if not self.countdown:
+                self.countdown = CHECK_INTERVAL
+                self.check()
+
+        best = 0
+        upper = bin(cells).count("1")
+        moves = self.masks[pos] & cells
+        while moves and best < min(upper, limit):
+            low = moves & -moves
+            moves ^= low
+            length = 1 + self.longest(low.bit_length() - 1, cells ^ low, limit - 1)
+            if length > best:
+                best = length
+        if best < limit or best == upper:
+            self.memo[key] = best
+        return best
+
+    def first_move(self, pos, cells):
+        """Return (length, first cell index) of the longest path from `pos`
+        over `cells`, or (0, None) if there is no move."""
+        best, best_move = 0, None
+        moves = self.masks[pos] & cells
+        while moves:
+            low = moves & -moves
+            moves ^= low
+            idx = low.bit_length() - 1
+            length = 1 + self.longest(idx, cells ^ low, len(self.masks))
+            if length > best:
+                best, best_move = length, idx
+        return best, best_move
+
+
+def solve(game, memo=None, check=None):
+    """Solve a position exactly if the players are in separate regions.
+
+    Parameters
+    ----------
+    game : `isolation.Board`
+        The position to solve, from the point of view of its active player.
+
+    memo : dict (optional)
+        Table of longest path lengths keyed by (cell index, region bitmask);
+        pass the same dict between calls to reuse previous results.
+
+    check : callable (optional)
+        Called regularly during the search, e.g. to raise a SearchTimeout.
+
+    Returns
+    -------
+    EndgameResult or None
+        The solution, or None if either player has not moved yet or the
+        players can still reach a common cell.
+    """
+    me = game.get_player_location(game.active_player)
+    opp = game.get_player_location(game.inactive_player)
+    if me is None or opp is None:
+        return None
+    masks = knight_masks(game.width, game.height)
+    cells = open_mask(game)
+    my_idx = me[0] + me[1] * game.height
+    opp_idx = opp[0] + opp[1] * game.height
+    my_region = region(my_idx, cells, masks)
+    opp_region = region(opp_idx, cells, masks)
+    if my_region & opp_region:
+        return None
+
+    search = _PathSearch(masks, memo if memo is not None else {}, check)
+    length, move_idx = search.first_move(my_idx, my_region)
+    opp_length = search.longest(opp_idx, opp_region, length)
+    move = None
+    if move_idx is not None:
+        move = (move_idx % game.height, move_idx // game.height)
+    return EndgameResult(move, length, opp_length, length > opp_length)
@@ -4,6 +4,7 @@ and include the results in your report.
 """
 import random
 import math
+from collections import defaultdict
 
 
 class SearchTimeout(Exception):
@@ -11,6 +12,17 @@ class SearchTimeout(Exception):
     pass
 
 
+# Weights of the parameterised heuristics, keyed by heuristic name. The
+# defaults are the hand-picked values; tuned values (see `tuning.py`) are
+# injected into this dict by the scripts that use them, since this module may
+# only import whitelisted libraries and must not read files.
+PARAMS = {
+    "custom_score_2": {"center_divisor": 2.},
+    "custom_score_3": {"own_weight": 2., "enemy_weight": 1.,
+                       "center_weight": 0.5},
+}
+
+
 def custom_score(game, player):
     """Calculate the heuristic value of a game state from the point of view
     of the given player.
@@ -41,8 +53,8 @@ def custom_score(game, player):
     if game.is_winner(player):
         return float("inf")
 
-    my_moves = len(game.get_legal_moves(player))
-    enemy_moves = len(game.get_legal_moves(game.get_opponent(player)))
+    my_moves = game.mobility(player)
+    enemy_moves = game.mobility(game.get_opponent(player))
     # If number of moves is different return the difference
     if my_moves != enemy_moves:
         return float(my_moves - enemy_moves)
@@ -56,7 +68,7 @@ def custom_score(game, player):
         return float(enemy_dist - my_dist)
 
 
-def custom_score_2(game, player):
+def custom_score_2(game, player, params=None):
     """Calculate the heuristic value of a game state from the point of view
     of the given player.
 
@@ -73,6 +85,9 @@ def custom_score_2(game, player):
         A player instance in the current game (i.e., an object corresponding to
         one of the player objects `game.__player_1__` or `game.__player_2__`.)
 
+    params : dict (optional)
+        The weights of the heuristic; `PARAMS["custom_score_2"]` if None.
+
     Returns
     -------
     float
@@ -83,17 +98,18 @@ def custom_score_2(game, player):
 
     if game.is_winner(player):
         return float("inf")
-    my_moves = len(game.get_legal_moves(player))
-    enemy_moves = len(game.get_legal_moves(game.get_opponent(player)))
+    my_moves = game.mobility(player)
+    enemy_moves = game.mobility(game.get_opponent(player))
     cx, cy = game.width/2. , game.height/2.
     my, mx = game.get_player_location(player)
     ey, ex = game.get_player_location(game.get_opponent(player))
     my_dist_to_center = float((cy - my)**2 + (cx - mx)**2)
     enemy_dist_to_center = float((cy - ey)**2 + (cx - ex)**2)
-    return float((my_moves - enemy_moves) + (enemy_dist_to_center - my_dist_to_center)/(2*game.move_count))
+    divisor = (params or PARAMS["custom_score_2"])["center_divisor"]
+    return float((my_moves - enemy_moves) + (enemy_dist_to_center - my_dist_to_center)/(divisor*game.move_count))
 
 
-def custom_score_3(game, player):
+def custom_score_3(game, player, params=None):
     """Calculate the heuristic value of a game state from the point of view
     of the given player.
 
@@ -110,6 +126,9 @@ def custom_score_3(game, player):
         A player instance in the current game (i.e., an object corresponding to
         one of the player objects `game.__player_1__` or `game.__player_2__`.)
 
+    params : dict (optional)
+        The weights of the heuristic; `PARAMS["custom_score_3"]` if None.
+
     Returns
     -------
     float
@@ -120,14 +139,343 @@ def custom_score_3(game, player):
 
     if game.is_winner(player):
         return float("inf")
-    my_moves = len(game.get_legal_moves(player))
-    enemy_moves = len(game.get_legal_moves(game.get_opponent(player)))
+    my_moves = game.mobility(player)
+    enemy_moves = game.mobility(game.get_opponent(player))
     my, mx = game.get_player_location(player)
     cx, cy = game.width/2. , game.height/2.
     jumps_to_center = min(abs(mx - cx) , abs(my - cy))
-    return (2*my_moves - enemy_moves - 0.5*jumps_to_center)
+    weights = params or PARAMS["custom_score_3"]
+    return (weights["own_weight"]*my_moves - weights["enemy_weight"]*enemy_moves
+            - weights["center_weight"]*jumps_to_center)
+
+
+def search_child(game, move, in_place, value_fn, *args):
+    """Return `value_fn(child, *args)` for the successor of `game` reached by
+    playing `move`.
+
+    By default the successor is a copy created by `game.forecast_move()`. When
+    `in_place` is True the move is applied to `game` itself with `push()` and
+    reverted with `pop()` afterwards (even if the search is interrupted by a
+    SearchTimeout), so a search only keeps O(depth) undo records instead of
+    allocating a new board for every node.
+    """
+    if not in_place:
+        return value_fn(game.forecast_move(move), *args)
+    game.push(move)
+    try:
+        return value_fn(game, *args)
+    finally:
+        game.pop()
+
+
+def to_canonical(move, perm, height):
+    """Map a move to the coordinates of the canonical position given by the
+    symmetry `perm` (see `isolation.Board.canonical`)."""
+    if move is None or move == (-1, -1):
+        return move
+    idx = perm[move[0] + move[1] * height]
+    return (idx % height, idx // height)
+
+
+def from_canonical(move, perm, height):
+    """Map a move in canonical coordinates back through the symmetry `perm`
+    (the inverse of `to_canonical`)."""
+    if move is None or move == (-1, -1):
+        return move
+    idx = perm.index(move[0] + move[1] * height)
+    return (idx % height, idx // height)
+
+
+class TranspositionTable:
+    """Fixed-size table of search results keyed by the Zobrist hash of a
+    position (see `isolation.Board.hash`).
+
+    Each slot holds a tuple (key, depth, value, bound, move, generation),
+    where `bound` tells whether `value` is the EXACT minimax value of the
+    position searched to `depth` plies, or only a LOWER or UPPER bound on it
+    (after a beta or alpha cutoff), and `move` is the best move found.
+
+    Parameters
+    ----------
+    size : int (optional)
+        The number of slots in the table; a position is stored in slot
+        `key % size`, replacing the previous entry if it was stored by an
+        earlier call to `new_search()` or searched to a smaller depth.
+    """
+    EXACT, LOWER, UPPER = 0, 1, 2
+
+    def __init__(self, size=2**16):
+        self.size = size
+        self.generation = 0
+        self._entries = [None] * size
+
+    def new_search(self):
+        """Age the current entries so that they can be replaced by results
+        from the next search."""
+        self.generation += 1
+
+    def clear(self):
+        self._entries = [None] * self.size
+
+    def lookup(self, key):
+        """Return the entry stored for `key`, or None. """
+        entry = self._entries[key % self.size]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def probe(self, key, depth, alpha, beta):
+        """Return (value, move) for a stored position, where `value` is None
+        unless the entry was searched at least `depth` plies deep and its
+        bound settles the (alpha, beta) window. `move` is the stored best
+        move, or None if the position is not in the table.
+        """
+        entry = self.lookup(key)
+        if entry is None:
+            return None, None
+        _, entry_depth, value, bound, move, _ = entry
+        if entry_depth >= depth and (
+                bound == self.EXACT or
+                (bound == self.LOWER and value >= beta) or
+                (bound == self.UPPER and value <= alpha)):
+            return value, move
+        return None, move
+
+    def store(self, key, depth, value, alpha, beta, move):
+        """Save the result of searching a position to `depth` plies with the
+        initial window (alpha, beta).
+        """
+        if value <= alpha:
+            bound = self.UPPER
+        elif value >= beta:
+            bound = self.LOWER
+        else:
+            bound = self.EXACT
+        slot = key % self.size
+        entry = self._entries[slot]
+        if (entry is None or entry[0] == key or depth >= entry[1] or
+                entry[5] != self.generation):
+            self._entries[slot] = (key, depth, value, bound, move, self.generation)
+
+
+class SearchStats:
+    """Opt-in collector of per-move search statistics for the agents in this
+    module.
+
+    Every call to `record_move` stores a dict with the move number, the
+    depth of the deepest completed search iteration, the number of nodes
+    visited (in total, and in the deepest completed iteration), the time
+    spent and left on return (in milliseconds), the effective branching
+    factor of the deepest iteration, and whether the search was interrupted
+    by a SearchTimeout. Moves are grouped by game in `games`; a new game is
+    started automatically when the move count does not increase.
+    """
+
+    def __init__(self):
+        self.games = []
+
+    def record_move(self, move_count, depth, nodes, iteration_nodes,
+                    elapsed, time_left, timed_out):
+        if not self.games or self.games[-1][-1]["move_count"] >= move_count:
+            self.games.append([])
+        self.games[-1].append({
+            "move_count": move_count,
+            "depth": depth,
+            "nodes": nodes,
+            "iteration_nodes": iteration_nodes,
+            "elapsed": elapsed,
+            "time_left": time_left,
+            "branching_factor": iteration_nodes ** (1. / depth) if depth else 0.,
+            "timed_out": timed_out,
+        })
+
+    def merge(self, games):
+        """Append the move records of games collected elsewhere (e.g., by an
+        agent in a worker process)."""
+        self.games.extend(games)
+
+    @property
+    def moves(self):
+        return [move for game in self.games for move in game]
+
+    def summary(self):
+        """Return a dict summarizing the statistics of all recorded moves. """
+        moves = self.moves
+        if not moves:
+            return {"games": len(self.games), "moves": 0}
+        depths = [m["depth"] for m in moves]
+        nodes = sum(m["nodes"] for m in moves)
+        elapsed = sum(m["elapsed"] for m in moves)
+        return {
+            "games": len(self.games),
+            "moves": len(moves),
+            "mean_depth": sum(depths) / len(moves),
+            "min_depth": min(depths),
+            "max_depth": max(depths),
+            "nodes": nodes,
+            "nodes_per_second": 1000. * nodes / elapsed if elapsed else 0.,
+            "mean_branching_factor":
+                sum(m["branching_factor"] for m in moves) / len(moves),
+            "mean_time_left": sum(m["time_left"] for m in moves) / len(moves),
+            "min_time_left": min(m["time_left"] for m in moves),
+            "timed_out": sum(m["timed_out"] for m in moves),
+        }
+
+
+class AmortisedTimer:
+    """Time control that reads the clock only every few nodes.
+
+    Each call to `check(nodes)` reads `time_left()`, raises SearchTimeout if
+    less than `threshold` milliseconds remain, and returns the number of nodes
+    to search before the next check. The interval is calibrated from the node
+    rate measured since the previous check (`nodes` is the caller's running
+    node count), so that the nodes searched until the next check are expected
+    to take at most `safety` times the time left above the threshold; it
+    shrinks to a single node as the deadline nears.
+
+    Parameters
+    ----------
+    time_left : callable
+        The function returning the number of milliseconds left in the turn.
+
+    threshold : float
+        Time remaining (in milliseconds) when search is aborted.
+
+    safety : float (optional)
+        Fraction of the remaining time budget that may elapse between checks.
+
+    max_interval : int (optional)
+        Upper bound on the number of nodes between two checks.
+    """
+
+    def __init__(self, time_left, threshold, safety=0.25, max_interval=1024):
+        self.time_left = time_left
+        self.threshold = threshold
+        self.safety = safety
+        self.max_interval = max_interval
+        self._last_left = None
+        self._last_nodes = 0
+
+    def check(self, nodes):
+        left = self.time_left()
+        if left < self.threshold:
+            raise SearchTimeout()
+        interval = 1
+        if self._last_left is not None and self._last_left > left:
+            rate = (nodes - self._last_nodes) / (self._last_left - left)
+            interval = max(1, min(self.max_interval,
+                                  int(self.safety * rate * (left - self.threshold))))
+        self._last_left = left
+        self._last_nodes = nodes
+        return interval
+
+
+class TimeManager:
+    """Time control of an iterative deepening search that stops deepening
+    when the next iteration is not expected to finish in time.
+
+    After each completed iteration, `next_iteration(nodes, value)` predicts
+    the duration of the next one as the duration of the last one (measured
+    from the average time per node so far) times the growth of the node
+    count per iteration (averaged over the last two iterations, as odd and
+    even depths grow differently), and returns False if it would exceed the
+    time left above `threshold`, so that no time is spent on an iteration
+    whose result would be thrown away. The search also stops once the value
+    is infinite (a proven win or loss), and never stops while the time left
+    is infinite (e.g., a search stopped from outside).
+
+    In critical positions -- when the value swings by at least `swing`
+    between two iterations of the same parity, or the root has at most
+    `few_moves` legal moves -- the predicted duration is divided by
+    `stretch`, allowing deeper iterations that may finish thanks to good
+    move ordering.
+
+    Parameters
+    ----------
+    time_left : callable
+        The function returning the number of milliseconds left in the turn.
+
+    threshold : float
+        Time remaining (in milliseconds) when search is aborted.
+
+    num_moves : int
+        The number of legal moves at the root.
+
+    stretch : float (optional)
+        Factor by which predicted durations are divided in critical
+        positions.
+
+    swing : float (optional)
+        Change of the root value between two iterations of the same parity
+        (depth d and d + 2) that makes a position critical.
+
+    few_moves : int (optional)
+        Number of legal moves at the root below which (inclusive) a position
+        is critical.
+
+    max_growth : float (optional)
+        Upper bound on the predicted growth of the node count (the maximum
+        branching factor of knight moves).
+    """
+
+    def __init__(self, time_left, threshold, num_moves, stretch=1.5, swing=2.,
+                 few_moves=2, max_growth=8.):
+        self.time_left = time_left
+        self.threshold = threshold
+        self.stretch = stretch
+        self.swing = swing
+        self.max_growth = max_growth
+        self.critical = num_moves <= few_moves
+        self._start = time_left()
+        self._nodes = []
+        self._values = []
+
+    def next_iteration(self, nodes, value):
+        """Record an iteration that searched `nodes` nodes and found `value`
+        at the root, and return whether to start the next one."""
+        if abs(value) == float("inf"):
+            return False
+        if len(self._values) > 1 and abs(value - self._values[-2]) >= self.swing:
+            self.critical = True
+        self._values.append(value)
+        self._nodes.append(nodes)
+        left = self.time_left()
+        if math.isinf(left) or math.isinf(self._start):
+            return True
+        elapsed = self._start - left
+        if len(self._nodes) < 2 or elapsed <= 0:
+            return True
+        if len(self._nodes) > 2:
+            growth = (self._nodes[-1] / max(self._nodes[-3], 1)) ** 0.5
+        else:
+            growth = self._nodes[-1] / max(self._nodes[-2], 1)
+        growth = min(max(growth, 1.), self.max_growth)
+        predicted = elapsed * self._nodes[-1] / sum(self._nodes) * growth
+        if self.critical:
+            predicted /= self.stretch
+        return predicted < left - self.threshold
 
 
+# Number of entries of the endgame solver's longest path table above which
+# it is cleared
+ENDGAME_MEMO_SIZE = 2**18
+
+# Number of moves played before the root of a search above which
+# `canonical_tt` keys the table by plain hashes: in depth 4 trees, symmetric
+# positions make up 18% of the nodes below a root after 2 moves, and none
+# below a root after 4 moves, while a canonical hash costs 10-20 us per node
+CANONICAL_TT_PLIES = 4
+
+# Smallest number of leaves evaluated in one batch by `batch_leaves`: the
+# NumPy overhead of a batch costs about as much as evaluating 6 leaves one by
+# one
+BATCH_MIN_LEAVES = 6
+
+
+# Salt xor-ed into the transposition table keys of an agent playing second, so
+# that an agent sharing its table across games never reads values computed
+# from the other player's point of view
+_TT_PLAYER_2_KEY = random.Random("tt-player-2").getrandbits(64)
 
 
 class IsolationPlayer:
@@ -163,7 +511,32 @@ class MinimaxPlayer(IsolationPlayer):
     """Game-playing agent that chooses a move using depth-limited minimax
     search. You must finish and test this player to make sure it properly uses
     minimax to return a good move before the search time limit expires.
+
+    Parameters
+    ----------
+    in_place : bool (optional)
+        Search the game tree by pushing and popping moves on a single board
+        rather than creating a copy of the board for every node (see
+        `search_child`).
+
+    collect_stats : bool (optional)
+        Record the statistics of every search in a `SearchStats` object
+        available as `self.stats` (None if disabled).
+
+    amortised_timer : bool (optional)
+        Read the clock only every few nodes through an `AmortisedTimer`
+        instead of at every node. The remaining parameters are described in
+        `IsolationPlayer`.
     """
+    def __init__(self, search_depth=3, score_fn=custom_score, timeout=10.,
+                 in_place=False, collect_stats=False, amortised_timer=False):
+        super().__init__(search_depth, score_fn, timeout)
+        self.in_place = in_place
+        self.stats = SearchStats() if collect_stats else None
+        self._nodes = 0
+        self.amortised_timer = amortised_timer
+        self._clock = None
+        self._countdown = 0
 
     def get_move(self, game, time_left):
         """Search for the best move from the available legal moves and return a
@@ -194,53 +567,72 @@ class MinimaxPlayer(IsolationPlayer):
             (-1, -1) if there are no available legal moves.
         """
         self.time_left = time_left
+        self._nodes = 0
+        start = time_left()
 
         # Initialize the best move so that this function returns something
         # in case the search fails due to timeout
         best_move = (-1, -1)
+        depth = 0
 
         try:
             # The try/except block will automatically catch the exception
             # raised when the timer is about to expire.
-            return self.minimax(game, self.search_depth)
+            best_move = self.minimax(game, self.search_depth)
+            depth = self.search_depth
 
         except SearchTimeout:
             pass  # Handle any actions required after timeout as needed
 
+        if self.stats is not None:
+            end = time_left()
+            self.stats.record_move(game.move_count, depth, self._nodes,
+                                   self._nodes if depth else 0, start - end,
+                                   end, not depth)
+
         # Return the best move from the last completed search iteration
         return best_move
 
     def __min_value(self, game, depth):
         self.__timer()
+        self._nodes += 1
         if self.__terminal_test(game , depth):
             return self.score(game, self)
         poss_moves = game.get_legal_moves()
         min_val = float("inf")
         for move in poss_moves:
-            new_gameState = game.forecast_move(move)
-            min_val = min(min_val, self.__max_value(new_gameState, depth-1))
+            min_val = min(min_val, search_child(game, move, self.in_place,
+                                                self.__max_value, depth-1))
         return min_val
 
     def __max_value(self, game, depth):
         self.__timer()
+        self._nodes += 1
         if self.__terminal_test(game , depth):
             return self.score(game, self)
         poss_moves = game.get_legal_moves()
         max_val = float("-inf")
         for move in poss_moves:
-            new_gameState = game.forecast_move(move)
-            max_val = max(max_val, self.__min_value(new_gameState, depth-1))
+            max_val = max(max_val, search_child(game, move, self.in_place,
+                                                self.__min_value, depth-1))
         return max_val
 
     def __terminal_test(self, game, depth):
-        self.__timer()
-        if len(game.get_legal_moves()) != 0  and depth > 0:
+        # The timer has just been checked by the calling node
+        if game.mobility() != 0  and depth > 0:
             return False
         return True
 
     def __timer(self):
-        if self.time_left() < self.TIMER_THRESHOLD:
-            raise SearchTimeout()
+        if not self.amortised_timer:
+            if self.time_left() < self.TIMER_THRESHOLD:
+                raise SearchTimeout()
+            return
+        self._countdown -= 1
+        if self._countdown <= 0:
+            if self._clock is None or self._clock.time_left is not self.time_left:
+                self._clock = AmortisedTimer(self.time_left, self.TIMER_THRESHOLD)
+            self._countdown = self._clock.check(self._nodes)
 
     def minimax(self, game, depth):
         """Implement depth-limited minimax search algorithm as described in
@@ -281,6 +673,7 @@ class MinimaxPlayer(IsolationPlayer):
                 each helper function or else your agent will timeout during
                 testing.
         """
+        self._countdown = 0
         self.__timer()
         poss_moves = game.get_legal_moves()
         if not poss_moves:
@@ -289,7 +682,8 @@ class MinimaxPlayer(IsolationPlayer):
         # _, move = max(vals)
         # return move
         return max(poss_moves,
-               key=lambda m: self.__min_value(game.forecast_move(m), depth - 1))
+               key=lambda m: search_child(game, m, self.in_place,
+                                          self.__min_value, depth - 1))
 
         
 
@@ -298,7 +692,131 @@ class AlphaBetaPlayer(IsolationPlayer):
     """Game-playing agent that chooses a move using iterative deepening minimax
     search with alpha-beta pruning. You must finish and test this player to
     make sure it returns a good move before the search time limit expires.
+
+    Parameters
+    ----------
+    in_place : bool (optional)
+        Search the game tree by pushing and popping moves on a single board
+        rather than creating a copy of the board for every node (see
+        `search_child`).
+
+    tt_size : int (optional)
+        Number of slots of a `TranspositionTable` used to reuse results
+        from previous iterations, previous moves and transposed positions;
+        the table is disabled if None.
+
+    move_ordering : bool (optional)
+        Search the principal variation move of the previous iteration first,
+        then the table move, the killer moves of the current ply, and the
+        remaining moves by their history heuristic score, instead of in
+        random order.
+
+    collect_stats : bool (optional)
+        Record the statistics of every search in a `SearchStats` object
+        available as `self.stats` (None if disabled).
+
+    amortised_timer : bool (optional)
+        Read the clock only every few nodes through an `AmortisedTimer`
+        instead of at every node.
+
+    endgame_solver : bool (optional)
+        Once the players are separated into disconnected regions, play the
+        longest path found by the exact solver in `endgame` (given up to half
+        of the remaining time) instead of searching.
+
+    opening_book : str or `opening_book.OpeningBook` (optional)
+        Play the move stored in an opening book (or book file) whenever the
+        position is in the book instead of searching.
+
+    canonical_tt : bool (optional)
+        Key the transposition table by the canonical hash of the positions
+        (see `isolation.Board.canonical`) so that symmetric positions share
+        their entries, in the searches of the opening (fewer than
+        CANONICAL_TT_PLIES moves played at the root), where symmetric
+        positions recur. Values are only exact for heuristics that score
+        symmetric positions equally (e.g., `sample_players.improved_score`).
+
+    pvs : bool (optional)
+        Principal variation search: search the first move of every node with
+        the full window and the other moves with a null window (between the
+        best value so far and the next float), searching again with the full
+        window only the moves that turn out to be better.
+
+    aspiration_window : float (optional)
+        Start every iteration of the iterative deepening with the window
+        (value - aspiration_window, value + aspiration_window) around the
+        value of the previous iteration, searching again with the full window
+        if the value falls outside it (e.g., 1. for mobility heuristics);
+        every iteration uses the full window if None.
+
+    batch_leaves : bool (optional)
+        At the nodes one ply above the horizon, evaluate the children that
+        remain after the first one (when it does not cause a cutoff) in a
+        single vectorised batch (see `batch_eval`) instead of one by one, if
+        there are at least BATCH_MIN_LEAVES of them; requires NumPy and a
+        heuristic listed in `batch_eval.BATCH_SCORES`. Off by default: with
+        at most 8 children per node, batches barely pay for their overhead,
+        and the search is slower than with scalar evaluation.
+
+    time_manager : bool (optional)
+        Stop deepening when the next iteration is not expected to finish in
+        the time left, allowing deeper iterations in critical positions (see
+        `TimeManager`), instead of always deepening until the search times
+        out. The remaining parameters are described in `IsolationPlayer`.
     """
+    def __init__(self, search_depth=3, score_fn=custom_score, timeout=10.,
+                 in_place=False, tt_size=None, move_ordering=False,
+                 collect_stats=False, amortised_timer=False,
+                 endgame_solver=False, opening_book=None, canonical_tt=False,
+                 pvs=False, aspiration_window=None, batch_leaves=False,
+                 time_manager=False):
+        super().__init__(search_depth, score_fn, timeout)
+        self.in_place = in_place
+        self.stats = SearchStats() if collect_stats else None
+        self._nodes = 0
+        self.amortised_timer = amortised_timer
+        self._clock = None
+        self._countdown = 0
+        self.tt = TranspositionTable(tt_size) if tt_size else None
+        self._tt_salt = 0
+        self.canonical_tt = canonical_tt
+        self._canonical = False
+        self.pvs = pvs
+        self.aspiration_window = aspiration_window
+        self._root_value = None
+        self._batch_score = None
+        if batch_leaves:
+            import batch_eval
+            self._batch_score = batch_eval.batch_version(score_fn)
+            if self._batch_score is None:
+                raise ValueError("No batch version of the heuristic {}.".format(
+                    getattr(score_fn, "__name__", score_fn)))
+        self.move_ordering = move_ordering
+        self.time_manager = time_manager
+        # Search diversity of the helpers of a parallel search (see
+        # `lazy_smp`): every iteration searches `depth_offset` plies deeper,
+        # and moves with equal ordering scores are searched in random order
+        self.depth_offset = 0
+        self.shuffle_ties = False
+        self._root_depth = 0
+        self._completed_depth = None
+        # Whether the current iteration cut any line of play at the depth
+        # limit (or used a table value that may have), i.e., whether a deeper
+        # iteration could change its result
+        self._horizon = False
+        self._pv = defaultdict(list)
+        self._prev_pv = []
+        self._follow_pv = False
+        self._killers = defaultdict(list)
+        self._history = defaultdict(int)
+        self.endgame_solver = endgame_solver
+        self._endgame_memo = {}
+        if isinstance(opening_book, str):
+            # Imported here so that agents without a book only depend on the
+            # modules allowed in the project sandbox
+            from opening_book import OpeningBook
+            opening_book = OpeningBook.load(opening_book)
+        self.opening_book = opening_book
 
     def get_move(self, game, time_left):
         """Search for the best move from the available legal moves and return a
@@ -331,68 +849,357 @@ class AlphaBetaPlayer(IsolationPlayer):
             (-1, -1) if there are no available legal moves.
         """
         self.time_left = time_left
+        if self.tt is not None:
+            self.tt.new_search()
+        if self.move_ordering:
+            self.__new_search()
+
+        self._nodes = 0
+        start = time_left()
 
         poss_moves = game.get_legal_moves(self)
         if len(poss_moves) > 0:
             best_move = poss_moves[0]
         else:
             best_move = (-1, -1)
+        completed_depth = iteration_nodes = 0
+        timed_out = False
+        solved_move = None
+        if self.opening_book is not None:
+            solved_move = self.opening_book.lookup(game)
+            if solved_move not in poss_moves:
+                solved_move = None
+        if solved_move is None and self.endgame_solver:
+            solved_move = self.__solve_endgame(game)
+        if solved_move is not None:
+            best_move = solved_move
+        else:
+            manager = None
+            if self.time_manager:
+                manager = TimeManager(time_left, self.TIMER_THRESHOLD,
+                                      len(poss_moves))
+            # No line of play can be longer than the number of blank cells
+            max_depth = len(game.get_blank_spaces())
+            try:
+                depth = 1 + self.depth_offset
+                value = None
+                while True:
+                    start_nodes = self._nodes
+                    self._horizon = False
+                    curr_move = self.aspiration_search(game, depth, value)
+                    value = self._root_value
+                    completed_depth = depth
+                    iteration_nodes = self._nodes - start_nodes
+                    if curr_move == (-1, -1):
+                        break
+                    else:
+                        best_move = curr_move
+                    # Deeper iterations would search the same (solved) tree
+                    if not self._horizon or depth >= max_depth:
+                        break
+                    if (manager is not None and
+                            not manager.next_iteration(iteration_nodes, value)):
+                        break
+                    depth += 1
+            except SearchTimeout:
+                timed_out = True
+
+        # Depth of the deepest completed iteration (None for a book or
+        # solved move), read by the parallel search in `lazy_smp`
+        self._completed_depth = completed_depth if solved_move is None else None
+        if self.stats is not None:
+            end = time_left()
+            self.stats.record_move(game.move_count, completed_depth,
+                                   self._nodes, iteration_nodes, start - end,
+                                   end, timed_out)
+        return best_move
+
+    def aspiration_search(self, game, depth, guess=None):
+        """Search the game tree to `depth` plies like `alphabeta`, with an
+        aspiration window around `guess` (the value of the previous
+        iteration) if enabled, searching again with the full window when the
+        value falls outside it.
+
+        Parameters
+        ----------
+        game : isolation.Board
+            An instance of the Isolation game `Board` class representing the
+            current game state
+
+        depth : int
+            Depth is an integer representing the maximum number of plies to
+            search in the game tree before aborting
+
+        guess : float (optional)
+            The expected value of the search; the full window is used if None
+            or infinite.
+
+        Returns
+        -------
+        (int, int)
+            The board coordinates of the best move found in the current search;
+            (-1, -1) if there are no legal moves
+        """
+        if (self.aspiration_window is not None and guess is not None and
+                abs(guess) != float("inf")):
+            alpha = guess - self.aspiration_window
+            beta = guess + self.aspiration_window
+            move = self.alphabeta(game, depth, alpha, beta)
+            if alpha < self._root_value < beta:
+                return move
+        return self.alphabeta(game, depth)
+
+    def expected_reply(self, game, move):
+        """Return the reply of the opponent to `move` predicted by the last
+        search from `game`: the second move of the principal variation (with
+        move ordering), or else the best move stored in the transposition
+        table for the position after `move`; None if there is no prediction.
+        """
+        if (self.move_ordering and len(self._prev_pv) > 1 and
+                self._prev_pv[0] == move):
+            return self._prev_pv[1]
+        if self.tt is None:
+            return None
+        child = game.forecast_move(move)
+        key, perm = self.__tt_key(child)
+        entry = self.tt.lookup(key)
+        if entry is None or entry[4] is None:
+            return None
+        reply = entry[4]
+        if perm is not None:
+            reply = from_canonical(reply, perm, child.height)
+        return reply if reply in child.get_legal_moves(shuffle=False) else None
+
+    def __solve_endgame(self, game):
+        """Return the first move of the longest path of the agent if the
+        players are in separate regions and the solver finishes within half
+        of the remaining time, or None otherwise."""
+        deadline = (self.time_left() + self.TIMER_THRESHOLD) / 2
+
+        def check():
+            if self.time_left() < deadline:
+                raise SearchTimeout()
+
+        # Imported here so that agents without the solver only depend on the
+        # modules allowed in the project sandbox
+        import endgame
+
+        if len(self._endgame_memo) > ENDGAME_MEMO_SIZE:
+            self._endgame_memo.clear()
         try:
-            depth =1
-            while True:
-                curr_move = self.alphabeta(game, depth)
-                if curr_move == (-1, -1):
-                    return best_move
-                else:
-                    best_move = curr_move
-                depth += 1
+            result = endgame.solve(game, self._endgame_memo, check)
         except SearchTimeout:
-            return best_move
-        return best_move
+            return None
+        if result is None:
+            return None
+        return result.move
 
     def __min_value(self, game, depth, alpha, beta):
         self.__timer()
+        self._nodes += 1
         curr_best_move = (-1, -1)
+        ply = self._root_depth - depth
+        self._pv[ply] = []
         if self.__terminal_test(game , depth):
             return (self.score(game, self), curr_best_move)
-        poss_moves = game.get_legal_moves()
+        alpha_orig, beta_orig = alpha, beta
+        key = hash_move = perm = None
+        if self.tt is not None:
+            key, perm = self.__tt_key(game)
+            value, hash_move = self.tt.probe(key, depth, alpha, beta)
+            if perm is not None:
+                hash_move = from_canonical(hash_move, perm, game.height)
+            if value is not None:
+                if not math.isinf(value):
+                    self._horizon = True
+                return (value, hash_move)
+        poss_moves = self.__order_moves(game, ply, hash_move, False)
+        batch = (depth == 1 and self._batch_score is not None and
+                 len(poss_moves) > BATCH_MIN_LEAVES)
+        leaf_values = None
         min_val = float("inf")
-        for move in poss_moves:
-            ans = self.__max_value(game.forecast_move(move), depth-1, alpha, beta)
+        for i, move in enumerate(poss_moves):
+            if i:
+                self._follow_pv = False
+            if i == 1 and batch:
+                # No cutoff on the first move: evaluate the others at once
+                leaf_values = [None] + self.__batch_leaves(game, ply,
+                                                           poss_moves[1:])
+            if leaf_values is not None:
+                ans = (leaf_values[i], (-1, -1))
+            elif i and self.pvs:
+                # Null window: is the move better than the best so far?
+                ans = search_child(game, move, self.in_place, self.__max_value,
+                                   depth-1, math.nextafter(beta, -math.inf), beta)
+                if alpha < ans[0] < beta:
+                    ans = search_child(game, move, self.in_place,
+                                       self.__max_value, depth-1, alpha, beta)
+            else:
+                ans = search_child(game, move, self.in_place,
+                                   self.__max_value, depth-1, alpha, beta)
             if ans[0] < min_val:
                 min_val, _  = ans
                 curr_best_move = move
+                if self.move_ordering:
+                    self._pv[ply] = [move] + self._pv[ply + 1]
             if min_val <= alpha:
-                return (min_val, curr_best_move)
+                if self.move_ordering:
+                    self.__record_cutoff(ply, depth, move, False)
+                break
             beta = min(beta, min_val)
+        if key is not None:
+            tt_move = curr_best_move
+            if perm is not None:
+                tt_move = to_canonical(curr_best_move, perm, game.height)
+            self.tt.store(key, depth, min_val, alpha_orig, beta_orig, tt_move)
         return (min_val, curr_best_move)
 
     def __max_value(self, game, depth, alpha, beta):
         self.__timer()
+        self._nodes += 1
         curr_best_move  = (-1, -1)
+        ply = self._root_depth - depth
+        self._pv[ply] = []
         if self.__terminal_test(game , depth):
             return (self.score(game, self), curr_best_move)
-        poss_moves = game.get_legal_moves()
+        alpha_orig, beta_orig = alpha, beta
+        key = hash_move = perm = None
+        if self.tt is not None:
+            key, perm = self.__tt_key(game)
+            value, hash_move = self.tt.probe(key, depth, alpha, beta)
+            if perm is not None:
+                hash_move = from_canonical(hash_move, perm, game.height)
+            if value is not None:
+                if not math.isinf(value):
+                    self._horizon = True
+                return (value, hash_move)
+        poss_moves = self.__order_moves(game, ply, hash_move, True)
+        batch = (depth == 1 and self._batch_score is not None and
+                 len(poss_moves) > BATCH_MIN_LEAVES)
+        leaf_values = None
         max_val = float("-inf")
-        for move in poss_moves:
-            ans = self.__min_value(game.forecast_move(move), depth-1, alpha, beta)
+        for i, move in enumerate(poss_moves):
+            if i:
+                self._follow_pv = False
+            if i == 1 and batch:
+                # No cutoff on the first move: evaluate the others at once
+                leaf_values = [None] + self.__batch_leaves(game, ply,
+                                                           poss_moves[1:])
+            if leaf_values is not None:
+                ans = (leaf_values[i], (-1, -1))
+            elif i and self.pvs:
+                # Null window: is the move better than the best so far?
+                ans = search_child(game, move, self.in_place, self.__min_value,
+                                   depth-1, alpha, math.nextafter(alpha, math.inf))
+                if alpha < ans[0] < beta:
+                    ans = search_child(game, move, self.in_place,
+                                       self.__min_value, depth-1, alpha, beta)
+            else:
+                ans = search_child(game, move, self.in_place,
+                                   self.__min_value, depth-1, alpha, beta)
             if ans[0] > max_val:
                 max_val, _  = ans
                 curr_best_move = move
+                if self.move_ordering:
+                    self._pv[ply] = [move] + self._pv[ply + 1]
             if max_val >= beta:
-                return (max_val, curr_best_move)
+                if self.move_ordering:
+                    self.__record_cutoff(ply, depth, move, True)
+                break
             alpha = max(alpha, max_val)
+        if key is not None:
+            tt_move = curr_best_move
+            if perm is not None:
+                tt_move = to_canonical(curr_best_move, perm, game.height)
+            self.tt.store(key, depth, max_val, alpha_orig, beta_orig, tt_move)
         return (max_val, curr_best_move)
 
-    def __terminal_test(self, game, depth):
+    def __batch_leaves(self, game, ply, moves):
+        """Return the heuristic values of the children of `game` reached by
+        `moves`, evaluated in one batch."""
+        import batch_eval
         self.__timer()
-        if len(game.get_legal_moves()) != 0  and depth > 0:
-            return False
+        self._nodes += len(moves)
+        self._horizon = True
+        self._pv[ply + 1] = []
+        batch = batch_eval.children(batch_eval.encode(game, self), moves,
+                                    game.height)
+        return self._batch_score(batch, game.width, game.height).tolist()
+
+    def __tt_key(self, game):
+        """Return the transposition table key of a position and the
+        symmetry mapping it to its canonical form (None unless the table is
+        keyed by canonical hashes)."""
+        if self._canonical:
+            key, perm = game.canonical()
+            return key ^ self._tt_salt, perm
+        return game.hash() ^ self._tt_salt, None
+
+    def __new_search(self):
+        """Reset the move ordering tables at the start of a new move. """
+        self._prev_pv = []
+        self._killers.clear()
+        # Keep the history of previous moves, but let recent cutoffs dominate
+        for move in self._history:
+            self._history[move] //= 2
+
+    def __order_moves(self, game, ply, hash_move, maximizing):
+        """Return the legal moves of the active player in the order they
+        should be searched.
+
+        Without move ordering this is the (shuffled) legal move list with the
+        transposition table move, if any, moved to the front. Otherwise the
+        moves are sorted by: the previous iteration's principal variation move
+        (while the search is still following that line), the table move, the
+        killer moves of this ply, and then by descending history score.
+        """
+        if not self.move_ordering:
+            moves = game.get_legal_moves()
+            if hash_move is not None and hash_move in moves:
+                moves.remove(hash_move)
+                moves.insert(0, hash_move)
+            return moves
+
+        moves = game.get_legal_moves(shuffle=self.shuffle_ties)
+        pv_move = None
+        if self._follow_pv and ply < len(self._prev_pv):
+            pv_move = self._prev_pv[ply]
+        if pv_move not in moves:
+            self._follow_pv = False
+        killers = self._killers[ply]
+        history = self._history
+        moves.sort(key=lambda m: (m == pv_move, m == hash_move, m in killers,
+                                  history[maximizing, m]),
+                   reverse=True)
+        return moves
+
+    def __record_cutoff(self, ply, depth, move, maximizing):
+        """Update the killer moves and history scores with a move that caused
+        a cutoff."""
+        killers = self._killers[ply]
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[2:]
+        self._history[maximizing, move] += depth * depth
+
+    def __terminal_test(self, game, depth):
+        # The timer has just been checked by the calling node
+        if game.mobility() != 0:
+            if depth > 0:
+                return False
+            self._horizon = True
         return True
 
     def __timer(self):
-        if self.time_left() < self.TIMER_THRESHOLD:
-            raise SearchTimeout()
+        if not self.amortised_timer:
+            if self.time_left() < self.TIMER_THRESHOLD:
+                raise SearchTimeout()
+            return
+        self._countdown -= 1
+        if self._countdown <= 0:
+            if self._clock is None or self._clock.time_left is not self.time_left:
+                self._clock = AmortisedTimer(self.time_left, self.TIMER_THRESHOLD)
+            self._countdown = self._clock.check(self._nodes)
 
     def alphabeta(self, game, depth, alpha=float("-inf"), beta=float("inf")):
         """Implement depth-limited minimax search with alpha-beta pruning as
@@ -439,6 +1246,16 @@ class AlphaBetaPlayer(IsolationPlayer):
                 each helper function or else your agent will timeout during
                 testing.
         """
+        self._countdown = 0
         self.__timer()
-        _, move = self.__max_value(game, depth, alpha, beta)
+        # The search is always rooted at the agent's own turn, so the parity
+        # of the move count tells whether the agent is the second player
+        self._tt_salt = _TT_PLAYER_2_KEY if game.move_count % 2 else 0
+        self._canonical = (self.canonical_tt and
+                           game.move_count < CANONICAL_TT_PLIES)
+        self._root_depth = depth
+        self._follow_pv = True
+        self._root_value, move = self.__max_value(game, depth, alpha, beta)
+        if self.move_ordering:
+            self._prev_pv = self._pv[0]
         return move
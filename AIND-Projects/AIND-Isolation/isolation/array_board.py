@@ -0,0 +1,344 @@
+"""
+This file contains the `ArrayBoard` class, an alternative backend for the
+game Isolation that stores the blocked cells in a NumPy `uint8` array
+instead of the Python list used by `isolation.Board`, with the player
+locations and initiative kept in separate attributes.
+
+A copy of the board is a single array copy plus a handful of scalar
+attributes, but the NumPy call overhead makes it barely faster than a copy of
+a `Board` (3.4 us against 3.6 us measured on a 7x7 board, and 1.8 us for a
+`BitBoard`): this backend is meant for exchanging positions with NumPy code,
+not for faster searches. The state of any number of boards can be exported
+with
+`to_array` -- in the layout of `Board._board_state`: one byte per cell
+followed by the initiative and the locations of player 2 and player 1 (255
+for a player that has not moved) -- and stacked into a 2D array with
+`stack_boards`, e.g., for vectorised evaluation (see `batch_eval`) or to
+store the positions of game records (see `isolation.records`). `from_array`
+rebuilds a board from such a row.
+
+`ArrayBoard` is a subclass of `Board` and exposes exactly the same public
+API, so any agent written against `Board` can use it unchanged. It requires
+NumPy, so it is not imported by the `isolation` package itself:
+
+    from isolation.array_board import ArrayBoard
+"""
+import math
+import random
+
+import numpy as np
+
+from .isolation import Board, canonical_hash, knight_moves, zobrist_keys
+from .bitboard import cell_coords
+
+# Location byte of a player that has not moved in exported arrays
+NOT_MOVED_INDEX = 255
+
+
+class ArrayBoard(Board):
+    """Implement a model for the game Isolation assuming each player moves like
+    a knight in chess, using a NumPy array to represent the board.
+
+    Parameters
+    ----------
+    player_1 : object
+        An object with a get_move() function. This is the only function
+        directly called by the Board class for each player.
+
+    player_2 : object
+        An object with a get_move() function. This is the only function
+        directly called by the Board class for each player.
+
+    width : int (optional)
+        The number of columns that the board should have.
+
+    height : int (optional)
+        The number of rows that the board should have.
+    """
+
+    def __init__(self, player_1, player_2, width=7, height=7):
+        self.width = width
+        self.height = height
+        self.move_count = 0
+        self._player_1 = player_1
+        self._player_2 = player_2
+        self._active_player = player_1
+        self._inactive_player = player_2
+
+        # Blocked cells are the non-zero entries of `_cells`, read and written
+        # through the memoryview `_view` (much faster than indexing the array
+        # for single cells); player locations are cell indices (or NOT_MOVED),
+        # and `_initiative` is 0 when player 1 is to move and 1 otherwise
+        self._cells = np.zeros(width * height, dtype=np.uint8)
+        self._view = memoryview(self._cells)
+        self._p1_loc = Board.NOT_MOVED
+        self._p2_loc = Board.NOT_MOVED
+        self._initiative = 0
+        self._knight_moves = knight_moves(width, height)
+        self._coords = cell_coords(width, height)
+        self._zobrist = zobrist_keys(width, height)
+        self._hash = 0
+        self._undo = []
+        self._moves_cache = {}
+
+    @classmethod
+    def from_array(cls, player_1, player_2, state, width=None, height=None):
+        """Build a board from a state exported by `to_array`. The move count
+        is the number of blocked cells.
+
+        The dimensions of the board are inferred from the length of the state
+        if it is a square board; they must be given for other boards, whose
+        dimensions the length does not determine.
+        """
+        cells = len(state) - 3
+        if width is None or height is None:
+            side = math.isqrt(cells)
+            if side * side != cells:
+                raise ValueError("A state of {} cells is not a square board; "
+                                 "give its width and height.".format(cells))
+            width = height = side
+        elif width * height != cells:
+            raise ValueError("A state of {} cells is not a {}x{} board.".format(
+                cells, width, height))
+        board = cls(player_1, player_2, width, height)
+        board._cells[:] = state[:cells] != 0
+        initiative, p2_loc, p1_loc = (int(x) for x in state[cells:cells + 3])
+        board._p1_loc = None if p1_loc == NOT_MOVED_INDEX else p1_loc
+        board._p2_loc = None if p2_loc == NOT_MOVED_INDEX else p2_loc
+        board._initiative = initiative
+        board.move_count = int(board._cells.sum())
+        if initiative:
+            board._active_player, board._inactive_player = player_2, player_1
+        cell_keys, location_keys, initiative_key = board._zobrist
+        for idx in np.flatnonzero(board._cells).tolist():
+            board._hash ^= cell_keys[idx]
+        for loc, keys in ((board._p1_loc, location_keys[0]),
+                          (board._p2_loc, location_keys[1])):
+            if loc is not None:
+                board._hash ^= keys[loc]
+        if initiative:
+            board._hash ^= initiative_key
+        return board
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_view"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._view = memoryview(self._cells)
+
+    def to_array(self):
+        """Return a snapshot of the state as a new `uint8` array of the cell
+        flags followed by the initiative and the locations of player 2 and
+        player 1 (NOT_MOVED_INDEX if not moved yet)."""
+        state = np.empty(self._cells.size + 3, dtype=np.uint8)
+        state[:-3] = self._cells
+        state[-3] = self._initiative
+        state[-2] = NOT_MOVED_INDEX if self._p2_loc is None else self._p2_loc
+        state[-1] = NOT_MOVED_INDEX if self._p1_loc is None else self._p1_loc
+        return state
+
+    def blocked_cells(self):
+        """Return a read-only view (not a copy) of the blocked cell flags, in
+        cell index order (row + column * height)."""
+        view = self._cells.view()
+        view.flags.writeable = False
+        return view
+
+    def canonical(self):
+        """Return the canonical form of the current state (see
+        `Board.canonical`)."""
+        return canonical_hash(self.width, self.height,
+                              np.flatnonzero(self._cells).tolist(),
+                              self._p1_loc, self._p2_loc, self._initiative)
+
+    def copy(self):
+        """ Return a deep copy of the current board. """
+        new_board = self.__class__.__new__(self.__class__)
+        new_board.__dict__.update(self.__dict__)
+        new_board._cells = self._cells.copy()
+        new_board._view = memoryview(new_board._cells)
+        new_board._undo = []
+        new_board._moves_cache = {}
+        return new_board
+
+    def move_is_legal(self, move):
+        """Test whether a move is legal in the current game state.
+
+        Parameters
+        ----------
+        move : (int, int)
+            A coordinate pair (row, column) indicating the next position for
+            the active player on the board.
+
+        Returns
+        -------
+        bool
+            Returns True if the move is legal, False otherwise
+        """
+        return (0 <= move[0] < self.height and 0 <= move[1] < self.width and
+                not self._view[move[0] + move[1] * self.height])
+
+    def get_blank_spaces(self):
+        """Return a list of the locations that are still available on the board.
+        """
+        coords = self._coords
+        return [coords[idx] for idx in np.flatnonzero(self._cells == 0).tolist()]
+
+    def get_player_location(self, player):
+        """Find the current location of the specified player on the board.
+
+        Parameters
+        ----------
+        player : object
+            An object registered as a player in the current game.
+
+        Returns
+        -------
+        (int, int) or None
+            The coordinate pair (row, column) of the input player, or None
+            if the player has not moved.
+        """
+        if player == self._player_1:
+            idx = self._p1_loc
+        elif player == self._player_2:
+            idx = self._p2_loc
+        else:
+            raise RuntimeError(
+                "Invalid player in get_player_location: {}".format(player))
+        if idx == Board.NOT_MOVED:
+            return Board.NOT_MOVED
+        return self._coords[idx]
+
+    def get_legal_moves(self, player=None, shuffle=True):
+        """Return the list of all legal moves for the specified player.
+
+        Parameters
+        ----------
+        player : object (optional)
+            An object registered as a player in the current game. If None,
+            return the legal moves for the active player on the board.
+
+        shuffle : bool (optional)
+            Return the moves in random order (the default), or in ascending
+            cell index order if False.
+
+        Returns
+        -------
+        list<(int, int)>
+            The list of coordinate pairs (row, column) of all legal moves
+            for the player constrained by the current game state.
+        """
+        moves = list(self.__get_moves(self.__location(player)))
+        if shuffle:
+            random.shuffle(moves)
+        return moves
+
+    def mobility(self, player=None):
+        """Return the number of legal moves of the specified player (the
+        active player if None), see `Board.mobility`.
+        """
+        return len(self.__get_moves(self.__location(player)))
+
+    def apply_move(self, move):
+        """Move the active player to a specified location.
+
+        Parameters
+        ----------
+        move : (int, int)
+            A coordinate pair (row, column) indicating the next position for
+            the active player on the board.
+        """
+        idx = move[0] + move[1] * self.height
+        cell_keys, location_keys, initiative_key = self._zobrist
+        loc_keys = location_keys[self._initiative]
+        if self._initiative:
+            prev_loc, self._p2_loc = self._p2_loc, idx
+        else:
+            prev_loc, self._p1_loc = self._p1_loc, idx
+        if prev_loc != Board.NOT_MOVED:
+            self._hash ^= loc_keys[prev_loc]
+        self._hash ^= cell_keys[idx] ^ loc_keys[idx] ^ initiative_key
+        self._view[idx] = 1
+        self._initiative ^= 1
+        self._active_player, self._inactive_player = self._inactive_player, self._active_player
+        self.move_count += 1
+        self._moves_cache.clear()
+
+    def push(self, move):
+        """Apply a move in-place like `apply_move`, saving the information
+        needed to undo it with `pop()`.
+        """
+        self._undo.append((self._p1_loc, self._p2_loc, self.move_count,
+                           self._hash))
+        self.apply_move(move)
+
+    def pop(self):
+        """Undo the most recent move applied with `push()`. """
+        if not self._undo:
+            raise RuntimeError("No pushed moves left to pop from the board.")
+        self._view[self._p1_loc if self._initiative else self._p2_loc] = 0
+        self._p1_loc, self._p2_loc, self.move_count, self._hash = self._undo.pop()
+        self._initiative ^= 1
+        self._active_player, self._inactive_player = self._inactive_player, self._active_player
+        self._moves_cache.clear()
+
+    def to_string(self, symbols=['1', '2']):
+        """Generate a string representation of the current game state, marking
+        the location of each player and indicating which cells have been
+        blocked, and which remain open.
+        """
+        col_margin = len(str(self.height - 1)) + 1
+        prefix = "{:<" + "{}".format(col_margin) + "}"
+        offset = " " * (col_margin + 3)
+        out = offset + '   '.join(map(str, range(self.width))) + '\n\r'
+        for i in range(self.height):
+            out += prefix.format(i) + ' | '
+            for j in range(self.width):
+                idx = i + j * self.height
+                if not self._view[idx]:
+                    out += ' '
+                elif self._p1_loc == idx:
+                    out += symbols[0]
+                elif self._p2_loc == idx:
+                    out += symbols[1]
+                else:
+                    out += '-'
+                out += ' | '
+            out += '\n\r'
+
+        return out
+
+    def __location(self, player):
+        """Return the cell index of a player (the active player if None). """
+        if player is None:
+            player = self._active_player
+        if player == self._player_1:
+            return self._p1_loc
+        if player == self._player_2:
+            return self._p2_loc
+        raise RuntimeError(
+            "Invalid player in get_legal_moves: {}".format(player))
+
+    def __get_moves(self, loc):
+        """Return the tuple of possible moves from the cell index `loc`,
+        memoised until the position changes.
+        """
+        moves = self._moves_cache.get(loc)
+        if moves is None:
+            if loc == Board.NOT_MOVED:
+                moves = tuple(self.get_blank_spaces())
+            else:
+                view = self._view
+                moves = tuple(move for idx, move in self._knight_moves[loc]
+                              if not view[idx])
+            self._moves_cache[loc] = moves
+        return moves
+
+
+def stack_boards(boards):
+    """Return the states of several boards (see `ArrayBoard.to_array`)
+    stacked into a 2D array with one row per board."""
+    return np.stack([board.to_array() for board in boards])
@@ -0,0 +1,317 @@
+"""
+This file contains the `BitBoard` class, an alternative backend for the game
+Isolation that stores the game state in integer bitmasks instead of the
+Python list used by `isolation.Board`.
+
+Each cell of the board is assigned the same index used by `Board`
+(``row + column * height``), and the set of blocked cells is kept as a single
+integer with one bit per cell. Knight-move destinations are precomputed once
+per board size as a bitmask for every square, so legal move generation is a
+single AND-NOT of two integers, and copying a board only copies a handful of
+scalar attributes.
+
+`BitBoard` is a subclass of `Board` and exposes exactly the same public API,
+so any agent written against `Board` can use it unchanged.
+"""
+import random
+
+from .isolation import Board, canonical_hash, knight_moves, zobrist_keys
+
+_KNIGHT_MASKS = {}
+_CELL_COORDS = {}
+
+
+def knight_masks(width, height):
+    """Return a tuple holding, for every cell index of a board with the given
+    dimensions, the bitmask of in-bounds cells reachable by a knight move.
+
+    The tables are computed once per board size and cached.
+    """
+    key = (width, height)
+    masks = _KNIGHT_MASKS.get(key)
+    if masks is None:
+        masks = _KNIGHT_MASKS[key] = tuple(
+            sum(1 << dest for dest, _ in moves)
+            for moves in knight_moves(width, height))
+    return masks
+
+
+def cell_coords(width, height):
+    """Return a tuple mapping every cell index of a board with the given
+    dimensions to its (row, column) coordinate pair.
+    """
+    key = (width, height)
+    coords = _CELL_COORDS.get(key)
+    if coords is None:
+        coords = _CELL_COORDS[key] = tuple(
+            (idx % height, idx // height) for idx in range(width * height))
+    return coords
+
+
+class BitBoard(Board):
+    """Implement a model for the game Isolation assuming each player moves like
+    a knight in chess, using integer bitmasks to represent the board.
+
+    Parameters
+    ----------
+    player_1 : object
+        An object with a get_move() function. This is the only function
+        directly called by the Board class for each player.
+
+    player_2 : object
+        An object with a get_move() function. This is the only function
+        directly called by the Board class for each player.
+
+    width : int (optional)
+        The number of columns that the board should have.
+
+    height : int (optional)
+        The number of rows that the board should have.
+    """
+
+    def __init__(self, player_1, player_2, width=7, height=7):
+        self.width = width
+        self.height = height
+        self.move_count = 0
+        self._player_1 = player_1
+        self._player_2 = player_2
+        self._active_player = player_1
+        self._inactive_player = player_2
+
+        # Blocked cells are the set bits of `_blocked`; player locations are
+        # cell indices (or NOT_MOVED), and `_initiative` is 0 when player 1
+        # is to move and 1 when player 2 is to move
+        self._blocked = 0
+        self._p1_loc = Board.NOT_MOVED
+        self._p2_loc = Board.NOT_MOVED
+        self._initiative = 0
+        self._full = (1 << (width * height)) - 1
+        self._masks = knight_masks(width, height)
+        self._coords = cell_coords(width, height)
+        self._zobrist = zobrist_keys(width, height)
+        self._hash = 0
+        self._undo = []
+
+    def hash(self):
+        """Return the Zobrist hash of the current state (see `Board.hash`). """
+        return self._hash
+
+    def canonical(self):
+        """Return the canonical form of the current state (see
+        `Board.canonical`)."""
+        blocked = []
+        mask = self._blocked
+        while mask:
+            low = mask & -mask
+            blocked.append(low.bit_length() - 1)
+            mask ^= low
+        return canonical_hash(self.width, self.height, blocked,
+                              self._p1_loc, self._p2_loc, self._initiative)
+
+    def copy(self):
+        """ Return a deep copy of the current board. """
+        new_board = self.__class__.__new__(self.__class__)
+        new_board.__dict__.update(self.__dict__)
+        new_board._undo = []
+        return new_board
+
+    def move_is_legal(self, move):
+        """Test whether a move is legal in the current game state.
+
+        Parameters
+        ----------
+        move : (int, int)
+            A coordinate pair (row, column) indicating the next position for
+            the active player on the board.
+
+        Returns
+        -------
+        bool
+            Returns True if the move is legal, False otherwise
+        """
+        return (0 <= move[0] < self.height and 0 <= move[1] < self.width and
+                not self._blocked >> (move[0] + move[1] * self.height) & 1)
+
+    def get_blank_spaces(self):
+        """Return a list of the locations that are still available on the board.
+        """
+        return self.__decode(~self._blocked & self._full)
+
+    def get_player_location(self, player):
+        """Find the current location of the specified player on the board.
+
+        Parameters
+        ----------
+        player : object
+            An object registered as a player in the current game.
+
+        Returns
+        -------
+        (int, int) or None
+            The coordinate pair (row, column) of the input player, or None
+            if the player has not moved.
+        """
+        if player == self._player_1:
+            idx = self._p1_loc
+        elif player == self._player_2:
+            idx = self._p2_loc
+        else:
+            raise RuntimeError(
+                "Invalid player in get_player_location: {}".format(player))
+        if idx == Board.NOT_MOVED:
+            return Board.NOT_MOVED
+        return self._coords[idx]
+
+    def get_legal_moves(self, player=None, shuffle=True):
+        """Return the list of all legal moves for the specified player.
+
+        Parameters
+        ----------
+        player : object (optional)
+            An object registered as a player in the current game. If None,
+            return the legal moves for the active player on the board.
+
+        shuffle : bool (optional)
+            Return the moves in random order (the default), or in ascending
+            cell index order if False.
+
+        Returns
+        -------
+        list<(int, int)>
+            The list of coordinate pairs (row, column) of all legal moves
+            for the player constrained by the current game state.
+        """
+        valid_moves = self.__decode(self._move_mask(self.__location(player)))
+        if shuffle:
+            random.shuffle(valid_moves)
+        return valid_moves
+
+    def mobility(self, player=None):
+        """Return the number of legal moves of the specified player (the
+        active player if None), counted from the move bitmask without
+        building the list of moves.
+        """
+        return bin(self._move_mask(self.__location(player))).count("1")
+
+    def apply_move(self, move):
+        """Move the active player to a specified location.
+
+        Parameters
+        ----------
+        move : (int, int)
+            A coordinate pair (row, column) indicating the next position for
+            the active player on the board.
+        """
+        idx = move[0] + move[1] * self.height
+        cell_keys, location_keys, initiative_key = self._zobrist
+        loc_keys = location_keys[self._initiative]
+        if self._initiative:
+            prev_loc, self._p2_loc = self._p2_loc, idx
+        else:
+            prev_loc, self._p1_loc = self._p1_loc, idx
+        if prev_loc != Board.NOT_MOVED:
+            self._hash ^= loc_keys[prev_loc]
+        self._hash ^= cell_keys[idx] ^ loc_keys[idx] ^ initiative_key
+        self._blocked |= 1 << idx
+        self._initiative ^= 1
+        self._active_player, self._inactive_player = self._inactive_player, self._active_player
+        self.move_count += 1
+
+    def push(self, move):
+        """Apply a move in-place like `apply_move`, saving the information
+        needed to undo it with `pop()`.
+        """
+        self._undo.append((self._blocked, self._p1_loc, self._p2_loc,
+                           self.move_count, self._hash))
+        self.apply_move(move)
+
+    def pop(self):
+        """Undo the most recent move applied with `push()`. """
+        if not self._undo:
+            raise RuntimeError("No pushed moves left to pop from the board.")
+        (self._blocked, self._p1_loc, self._p2_loc,
+         self.move_count, self._hash) = self._undo.pop()
+        self._initiative ^= 1
+        self._active_player, self._inactive_player = self._inactive_player, self._active_player
+
+    def is_winner(self, player):
+        """ Test whether the specified player has won the game. """
+        return player == self._inactive_player and not self._active_move_mask()
+
+    def is_loser(self, player):
+        """ Test whether the specified player has lost the game. """
+        return player == self._active_player and not self._active_move_mask()
+
+    def utility(self, player):
+        """Returns the utility of the current game state from the perspective
+        of the specified player (see `Board.utility`).
+        """
+        if not self._active_move_mask():
+
+            if player == self._inactive_player:
+                return float("inf")
+
+            if player == self._active_player:
+                return float("-inf")
+
+        return 0.
+
+    def to_string(self, symbols=['1', '2']):
+        """Generate a string representation of the current game state, marking
+        the location of each player and indicating which cells have been
+        blocked, and which remain open.
+        """
+        col_margin = len(str(self.height - 1)) + 1
+        prefix = "{:<" + "{}".format(col_margin) + "}"
+        offset = " " * (col_margin + 3)
+        out = offset + '   '.join(map(str, range(self.width))) + '\n\r'
+        for i in range(self.height):
+            out += prefix.format(i) + ' | '
+            for j in range(self.width):
+                idx = i + j * self.height
+                if not self._blocked >> idx & 1:
+                    out += ' '
+                elif self._p1_loc == idx:
+                    out += symbols[0]
+                elif self._p2_loc == idx:
+                    out += symbols[1]
+                else:
+                    out += '-'
+                out += ' | '
+            out += '\n\r'
+
+        return out
+
+    def _move_mask(self, loc):
+        """Return the bitmask of open cells reachable from the cell index
+        `loc`, or of all open cells if the player has not moved yet.
+        """
+        if loc == Board.NOT_MOVED:
+            return ~self._blocked & self._full
+        return self._masks[loc] & ~self._blocked
+
+    def __location(self, player):
+        """Return the cell index of a player (the active player if None). """
+        if player is None:
+            player = self._active_player
+        if player == self._player_1:
+            return self._p1_loc
+        if player == self._player_2:
+            return self._p2_loc
+        raise RuntimeError(
+            "Invalid player in get_legal_moves: {}".format(player))
+
+    def _active_move_mask(self):
+        return self._move_mask(self._p2_loc if self._initiative else self._p1_loc)
+
+    def __decode(self, mask):
+        """Convert a cell bitmask to a list of (row, column) pairs in
+        ascending index order.
+        """
+        coords = self._coords
+        moves = []
+        while mask:
+            low = mask & -mask
+            moves.append(coords[low.bit_length() - 1])
+            mask ^= low
+        return moves
@@ -0,0 +1,386 @@
+"""
+This file contains the `CompactBoard` class, a memory-lean backend for the
+game Isolation for searches and tournaments that create millions of boards.
+
+Like `BitBoard`, it keeps the blocked cells in an integer bitmask, but every
+instance uses `__slots__` instead of an attribute dictionary, the lookup
+tables shared by all boards of the same size are held in a single slot, and
+the two players are kept in a tuple indexed by the initiative (0 when player
+1 is to move, 1 when player 2 is to move). The player locations are a tuple
+indexed the same way, so moves, copies and terminal tests only work on small
+integers and tuples.
+
+Player objects are only translated to their index at the API boundary
+(`get_player_location`, `get_opponent`, `is_winner`, ...), comparing them
+by identity first: the `__eq__` method of a player object is never called
+when an agent passes itself (or the object returned by `active_player`),
+and is only used as a fallback for equal objects that are not the registered
+ones (e.g., player names unpickled in another process).
+
+`CompactBoard` exposes exactly the same public API as `Board`, so any agent
+written against `Board` can use it unchanged. It is not a subclass of
+`Board`, because the instances of a subclass of a class without `__slots__`
+always have an attribute dictionary.
+"""
+import random
+
+from .isolation import Board, canonical_hash, zobrist_keys
+from .bitboard import cell_coords, knight_masks
+
+_TABLES = {}
+
+
+def board_tables(width, height):
+    """Return the tables shared by all the boards of the given dimensions as
+    a tuple (full mask, knight masks, cell coordinates, Zobrist keys).
+    """
+    key = (width, height)
+    tables = _TABLES.get(key)
+    if tables is None:
+        tables = _TABLES[key] = ((1 << (width * height)) - 1,
+                                 knight_masks(width, height),
+                                 cell_coords(width, height),
+                                 zobrist_keys(width, height))
+    return tables
+
+
+class CompactBoard(object):
+    """Implement a model for the game Isolation assuming each player moves like
+    a knight in chess, using `__slots__` and integer bitmasks to represent the
+    board.
+
+    Parameters
+    ----------
+    player_1 : object
+        An object with a get_move() function. This is the only function
+        directly called by the Board class for each player.
+
+    player_2 : object
+        An object with a get_move() function. This is the only function
+        directly called by the Board class for each player.
+
+    width : int (optional)
+        The number of columns that the board should have.
+
+    height : int (optional)
+        The number of rows that the board should have.
+    """
+    __slots__ = ("width", "height", "move_count", "_players", "_initiative",
+                 "_locs", "_blocked", "_hash", "_tables", "_undo")
+
+    BLANK = Board.BLANK
+    NOT_MOVED = Board.NOT_MOVED
+
+    def __init__(self, player_1, player_2, width=7, height=7):
+        self.width = width
+        self.height = height
+        self.move_count = 0
+
+        # Players and their locations (cell indices, or NOT_MOVED) are tuples
+        # indexed by player number: 0 for player 1 and 1 for player 2, so the
+        # active player is `_players[_initiative]`
+        self._players = (player_1, player_2)
+        self._initiative = 0
+        self._locs = (Board.NOT_MOVED, Board.NOT_MOVED)
+        self._blocked = 0
+        self._hash = 0
+        self._tables = board_tables(width, height)
+        self._undo = []
+
+    def hash(self):
+        """Return the Zobrist hash of the current state (see `Board.hash`). """
+        return self._hash
+
+    def canonical(self):
+        """Return the canonical form of the current state (see
+        `Board.canonical`)."""
+        blocked = []
+        mask = self._blocked
+        while mask:
+            low = mask & -mask
+            blocked.append(low.bit_length() - 1)
+            mask ^= low
+        return canonical_hash(self.width, self.height, blocked,
+                              self._locs[0], self._locs[1], self._initiative)
+
+    @property
+    def active_player(self):
+        """The object registered as the player holding initiative in the
+        current game state.
+        """
+        return self._players[self._initiative]
+
+    @property
+    def inactive_player(self):
+        """The object registered as the player in waiting for the current
+        game state.
+        """
+        return self._players[self._initiative ^ 1]
+
+    # Attribute names of `Board` used by the methods shared with it
+    _player_1 = property(lambda self: self._players[0])
+    _player_2 = property(lambda self: self._players[1])
+    _active_player = active_player
+    _inactive_player = inactive_player
+
+    def get_opponent(self, player):
+        """Return the opponent of the supplied player.
+
+        Parameters
+        ----------
+        player : object
+            An object registered as a player in the current game. Raises an
+            error if the supplied object is not registered as a player in
+            this game.
+
+        Returns
+        -------
+        object
+            The opponent of the input player object.
+        """
+        index = self.__index(player)
+        if index is None:
+            raise RuntimeError("`player` must be an object registered as a player in the current game.")
+        return self._players[index ^ 1]
+
+    def copy(self):
+        """ Return a deep copy of the current board. """
+        new_board = CompactBoard.__new__(self.__class__)
+        new_board.width = self.width
+        new_board.height = self.height
+        new_board.move_count = self.move_count
+        new_board._players = self._players
+        new_board._initiative = self._initiative
+        new_board._locs = self._locs
+        new_board._blocked = self._blocked
+        new_board._hash = self._hash
+        new_board._tables = self._tables
+        new_board._undo = []
+        return new_board
+
+    forecast_move = Board.forecast_move
+
+    def move_is_legal(self, move):
+        """Test whether a move is legal in the current game state.
+
+        Parameters
+        ----------
+        move : (int, int)
+            A coordinate pair (row, column) indicating the next position for
+            the active player on the board.
+
+        Returns
+        -------
+        bool
+            Returns True if the move is legal, False otherwise
+        """
+        return (0 <= move[0] < self.height and 0 <= move[1] < self.width and
+                not self._blocked >> (move[0] + move[1] * self.height) & 1)
+
+    def get_blank_spaces(self):
+        """Return a list of the locations that are still available on the board.
+        """
+        return self.__decode(~self._blocked & self._tables[0])
+
+    def get_player_location(self, player):
+        """Find the current location of the specified player on the board.
+
+        Parameters
+        ----------
+        player : object
+            An object registered as a player in the current game.
+
+        Returns
+        -------
+        (int, int) or None
+            The coordinate pair (row, column) of the input player, or None
+            if the player has not moved.
+        """
+        index = self.__index(player)
+        if index is None:
+            raise RuntimeError(
+                "Invalid player in get_player_location: {}".format(player))
+        idx = self._locs[index]
+        if idx == Board.NOT_MOVED:
+            return Board.NOT_MOVED
+        return self._tables[2][idx]
+
+    def get_legal_moves(self, player=None, shuffle=True):
+        """Return the list of all legal moves for the specified player.
+
+        Parameters
+        ----------
+        player : object (optional)
+            An object registered as a player in the current game. If None,
+            return the legal moves for the active player on the board.
+
+        shuffle : bool (optional)
+            Return the moves in random order (the default), or in ascending
+            cell index order if False.
+
+        Returns
+        -------
+        list<(int, int)>
+            The list of coordinate pairs (row, column) of all legal moves
+            for the player constrained by the current game state.
+        """
+        valid_moves = self.__decode(self._move_mask(self.__location(player)))
+        if shuffle:
+            random.shuffle(valid_moves)
+        return valid_moves
+
+    def mobility(self, player=None):
+        """Return the number of legal moves of the specified player (the
+        active player if None), counted from the move bitmask without
+        building the list of moves.
+        """
+        return bin(self._move_mask(self.__location(player))).count("1")
+
+    def apply_move(self, move):
+        """Move the active player to a specified location.
+
+        Parameters
+        ----------
+        move : (int, int)
+            A coordinate pair (row, column) indicating the next position for
+            the active player on the board.
+        """
+        idx = move[0] + move[1] * self.height
+        side = self._initiative
+        cell_keys, location_keys, initiative_key = self._tables[3]
+        loc_keys = location_keys[side]
+        locs = self._locs
+        if locs[side] != Board.NOT_MOVED:
+            self._hash ^= loc_keys[locs[side]]
+        self._hash ^= cell_keys[idx] ^ loc_keys[idx] ^ initiative_key
+        self._locs = (locs[0], idx) if side else (idx, locs[1])
+        self._blocked |= 1 << idx
+        self._initiative = side ^ 1
+        self.move_count += 1
+
+    def push(self, move):
+        """Apply a move in-place like `apply_move`, saving the information
+        needed to undo it with `pop()`.
+        """
+        self._undo.append((self._blocked, self._locs, self.move_count,
+                           self._hash))
+        self.apply_move(move)
+
+    def pop(self):
+        """Undo the most recent move applied with `push()`. """
+        if not self._undo:
+            raise RuntimeError("No pushed moves left to pop from the board.")
+        (self._blocked, self._locs, self.move_count,
+         self._hash) = self._undo.pop()
+        self._initiative ^= 1
+
+    def is_winner(self, player):
+        """ Test whether the specified player has won the game. """
+        return (self.__index(player) == self._initiative ^ 1 and
+                not self._active_move_mask())
+
+    def is_loser(self, player):
+        """ Test whether the specified player has lost the game. """
+        return (self.__index(player) == self._initiative and
+                not self._active_move_mask())
+
+    def utility(self, player):
+        """Returns the utility of the current game state from the perspective
+        of the specified player (see `Board.utility`).
+        """
+        if not self._active_move_mask():
+            index = self.__index(player)
+
+            if index == self._initiative ^ 1:
+                return float("inf")
+
+            if index == self._initiative:
+                return float("-inf")
+
+        return 0.
+
+    print_board = Board.print_board
+
+    def to_string(self, symbols=['1', '2']):
+        """Generate a string representation of the current game state, marking
+        the location of each player and indicating which cells have been
+        blocked, and which remain open.
+        """
+        p1_loc, p2_loc = self._locs
+
+        col_margin = len(str(self.height - 1)) + 1
+        prefix = "{:<" + "{}".format(col_margin) + "}"
+        offset = " " * (col_margin + 3)
+        out = offset + '   '.join(map(str, range(self.width))) + '\n\r'
+        for i in range(self.height):
+            out += prefix.format(i) + ' | '
+            for j in range(self.width):
+                idx = i + j * self.height
+                if not self._blocked >> idx & 1:
+                    out += ' '
+                elif p1_loc == idx:
+                    out += symbols[0]
+                elif p2_loc == idx:
+                    out += symbols[1]
+                else:
+                    out += '-'
+                out += ' | '
+            out += '\n\r'
+
+        return out
+
+    play = Board.play
+
+    def _set_players(self, player_1, player_2):
+        """Replace the player objects of the board (see `Board._set_players`).
+        """
+        self._players = (player_1, player_2)
+
+    def _move_mask(self, loc):
+        """Return the bitmask of open cells reachable from the cell index
+        `loc`, or of all open cells if the player has not moved yet.
+        """
+        if loc == Board.NOT_MOVED:
+            return ~self._blocked & self._tables[0]
+        return self._tables[1][loc] & ~self._blocked
+
+    def _active_move_mask(self):
+        return self._move_mask(self._locs[self._initiative])
+
+    def __index(self, player):
+        """Return the index of a player object (0 for player 1, 1 for player
+        2), or None if it is not registered in the game. Objects are compared
+        by identity before equality.
+        """
+        players = self._players
+        if player is players[0]:
+            return 0
+        if player is players[1]:
+            return 1
+        if player == players[0]:
+            return 0
+        if player == players[1]:
+            return 1
+        return None
+
+    def __location(self, player):
+        """Return the cell index of a player (the active player if None). """
+        if player is None:
+            return self._locs[self._initiative]
+        index = self.__index(player)
+        if index is None:
+            raise RuntimeError(
+                "Invalid player in get_legal_moves: {}".format(player))
+        return self._locs[index]
+
+    def __decode(self, mask):
+        """Convert a cell bitmask to a list of (row, column) pairs in
+        ascending index order.
+        """
+        coords = self._tables[2]
+        moves = []
+        while mask:
+            low = mask & -mask
+            moves.append(coords[low.bit_length() - 1])
+            mask ^= low
+        return moves
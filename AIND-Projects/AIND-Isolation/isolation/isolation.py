@@ -13,6 +13,126 @@ from copy import copy
 
 TIME_LIMIT_MILLIS = 150
 
+_DIRECTIONS = [(-2, -1), (-2, 1), (-1, -2), (-1, 2),
+               (1, -2), (1, 2), (2, -1), (2, 1)]
+
+_KNIGHT_MOVES = {}
+_ZOBRIST_KEYS = {}
+_SYMMETRIES = {}
+
+
+def knight_moves(width, height):
+    """Return a tuple holding, for every cell index of a board with the given
+    dimensions, a tuple of (index, (row, column)) pairs for the in-bounds
+    cells reachable from that cell by a knight move.
+
+    The tables are computed once per board size and cached, so that legal
+    move generation only needs to filter them against the blank cells.
+    """
+    key = (width, height)
+    table = _KNIGHT_MOVES.get(key)
+    if table is None:
+        table = []
+        for idx in range(width * height):
+            c, r = divmod(idx, height)
+            table.append(tuple(
+                ((r + dr) + (c + dc) * height, (r + dr, c + dc))
+                for dr, dc in _DIRECTIONS
+                if 0 <= r + dr < height and 0 <= c + dc < width))
+        table = _KNIGHT_MOVES[key] = tuple(table)
+    return table
+
+
+def zobrist_keys(width, height):
+    """Return the Zobrist keys for a board with the given dimensions as a
+    tuple (cell_keys, location_keys, initiative_key).
+
+    `cell_keys[idx]` is xor-ed into the hash when cell `idx` is blocked,
+    `location_keys[p][idx]` when player `p` (0 or 1) stands on cell `idx`, and
+    `initiative_key` when player 2 has the initiative. The keys come from a
+    generator seeded with the board size, so hashes are reproducible across
+    processes and runs (e.g., for shared tables or opening books).
+    """
+    key = (width, height)
+    keys = _ZOBRIST_KEYS.get(key)
+    if keys is None:
+        rng = random.Random("zobrist-{}x{}".format(width, height))
+        size = width * height
+        keys = _ZOBRIST_KEYS[key] = (
+            tuple(rng.getrandbits(64) for _ in range(size)),
+            (tuple(rng.getrandbits(64) for _ in range(size)),
+             tuple(rng.getrandbits(64) for _ in range(size))),
+            rng.getrandbits(64))
+    return keys
+
+
+def symmetries(width, height):
+    """Return the symmetries of a board with the given dimensions as a tuple
+    of cell index permutations, starting with the identity.
+
+    `perm[idx]` is the index of the cell that cell `idx` is mapped to. Every
+    rectangular board is symmetric under reflections about its middle row
+    and column (and their composition, a half turn); square boards also have
+    the quarter turns and the reflections about both diagonals. All of these
+    map knight moves to knight moves, so they map positions to equivalent
+    positions.
+    """
+    key = (width, height)
+    perms = _SYMMETRIES.get(key)
+    if perms is None:
+        w, h = width - 1, height - 1
+        transforms = [lambda r, c: (r, c),
+                      lambda r, c: (h - r, c),
+                      lambda r, c: (r, w - c),
+                      lambda r, c: (h - r, w - c)]
+        if width == height:
+            transforms += [lambda r, c: (c, r),
+                           lambda r, c: (w - c, h - r),
+                           lambda r, c: (c, h - r),
+                           lambda r, c: (w - c, r)]
+        perms = []
+        for transform in transforms:
+            perm = []
+            for idx in range(width * height):
+                r, c = transform(idx % height, idx // height)
+                perm.append(r + c * height)
+            perms.append(tuple(perm))
+        perms = _SYMMETRIES[key] = tuple(perms)
+    return perms
+
+
+def canonical_hash(width, height, blocked, p1_loc, p2_loc, initiative):
+    """Return (hash, perm) where `hash` is the smallest Zobrist hash of the
+    state under the board symmetries and `perm` the symmetry (see
+    `symmetries`) giving it.
+
+    Parameters
+    ----------
+    blocked : iterable
+        Indices of the blocked cells.
+
+    p1_loc, p2_loc : int or None
+        Cell indices of the player locations (None if not moved yet).
+
+    initiative : int
+        0 if player 1 is to move, 1 if player 2 is to move.
+    """
+    cell_keys, location_keys, initiative_key = zobrist_keys(width, height)
+    blocked = list(blocked)
+    base = initiative_key if initiative else 0
+    best = None
+    for perm in symmetries(width, height):
+        key = base
+        for idx in blocked:
+            key ^= cell_keys[perm[idx]]
+        if p1_loc is not None:
+            key ^= location_keys[0][perm[p1_loc]]
+        if p2_loc is not None:
+            key ^= location_keys[1][perm[p2_loc]]
+        if best is None or key < best[0]:
+            best = (key, perm)
+    return best
+
 
 class Board(object):
     """Implement a model for the game Isolation assuming each player moves like
@@ -51,9 +171,43 @@ class Board(object):
         self._board_state = [Board.BLANK] * (width * height + 3)
         self._board_state[-1] = Board.NOT_MOVED
         self._board_state[-2] = Board.NOT_MOVED
+        self._knight_moves = knight_moves(width, height)
+
+        # Zobrist hash of the board state, updated incrementally by apply_move
+        self._zobrist = zobrist_keys(width, height)
+        self._hash = 0
+
+        # Stack of (player 1 location, player 2 location, initiative, move
+        # count, hash) entries saved by push() so that pop() can undo moves
+        self._undo = []
+
+        # Legal moves from each player location in the current position,
+        # filled on demand and cleared whenever the position changes
+        self._moves_cache = {}
 
     def hash(self):
-        return str(self._board_state).__hash__()
+        """Return the Zobrist hash of the current state (occupied cells,
+        player locations and initiative), maintained incrementally by
+        `apply_move`.
+        """
+        return self._hash
+
+    def canonical(self):
+        """Return the canonical form of the current state as a tuple (hash,
+        perm), where `hash` is the smallest Zobrist hash over the symmetries
+        of the board and `perm` is the cell index permutation of the symmetry
+        giving it.
+
+        Equivalent positions have the same canonical hash, so tables keyed by
+        it (transposition tables, opening books, evaluation caches) share
+        their entries; moves are stored in canonical coordinates by mapping
+        cell index `idx` to `perm[idx]`, and mapped back with `perm.index`.
+        """
+        state = self._board_state
+        return canonical_hash(
+            self.width, self.height,
+            (idx for idx in range(self.width * self.height) if state[idx]),
+            state[-1], state[-2], state[-3])
 
     @property
     def active_player(self):
@@ -97,6 +251,7 @@ class Board(object):
         new_board._active_player = self._active_player
         new_board._inactive_player = self._inactive_player
         new_board._board_state = copy(self._board_state)
+        new_board._hash = self._hash
         return new_board
 
     def forecast_move(self, move):
@@ -171,7 +326,7 @@ class Board(object):
         h = idx % self.height
         return (h, w)
 
-    def get_legal_moves(self, player=None):
+    def get_legal_moves(self, player=None, shuffle=True):
         """Return the list of all legal moves for the specified player.
 
         Parameters
@@ -180,15 +335,32 @@ class Board(object):
             An object registered as a player in the current game. If None,
             return the legal moves for the active player on the board.
 
+        shuffle : bool (optional)
+            Return the moves in random order (the default). Callers that do
+            their own move ordering, or only count the moves, can pass False
+            to skip the shuffle.
+
         Returns
         -------
         list<(int, int)>
             The list of coordinate pairs (row, column) of all legal moves
             for the player constrained by the current game state.
         """
-        if player is None:
-            player = self.active_player
-        return self.__get_moves(self.get_player_location(player))
+        moves = list(self.__get_moves(self.__location(player)))
+        if shuffle:
+            random.shuffle(moves)
+        return moves
+
+    def mobility(self, player=None):
+        """Return the number of legal moves of the specified player (the
+        active player if None).
+
+        Legal moves are generated once per position and shared by every call
+        to `get_legal_moves`, `mobility`, and the terminal tests until the
+        next move, so heuristics should prefer this method to counting the
+        moves themselves.
+        """
+        return len(self.__get_moves(self.__location(player)))
 
     def apply_move(self, move):
         """Move the active player to a specified location.
@@ -201,19 +373,57 @@ class Board(object):
         """
         idx = move[0] + move[1] * self.height
         last_move_idx = int(self.active_player == self._player_2) + 1
+        cell_keys, location_keys, initiative_key = self._zobrist
+        loc_keys = location_keys[last_move_idx - 1]
+        if self._board_state[-last_move_idx] != Board.NOT_MOVED:
+            self._hash ^= loc_keys[self._board_state[-last_move_idx]]
+        self._hash ^= cell_keys[idx] ^ loc_keys[idx] ^ initiative_key
         self._board_state[-last_move_idx] = idx
         self._board_state[idx] = 1
         self._board_state[-3] ^= 1
         self._active_player, self._inactive_player = self._inactive_player, self._active_player
         self.move_count += 1
+        self._moves_cache.clear()
+
+    def push(self, move):
+        """Apply a move in-place like `apply_move`, saving the information
+        needed to undo it with `pop()`.
+
+        Searching with push()/pop() pairs lets an agent explore the game tree
+        on a single board instead of allocating a copy for every node.
+
+        Parameters
+        ----------
+        move : (int, int)
+            A coordinate pair (row, column) indicating the next position for
+            the active player on the board.
+        """
+        self._undo.append((self._board_state[-1], self._board_state[-2],
+                           self._board_state[-3], self.move_count, self._hash))
+        self.apply_move(move)
+
+    def pop(self):
+        """Undo the most recent move applied with `push()`, restoring the
+        previous player locations, initiative and move count.
+        """
+        if not self._undo:
+            raise RuntimeError("No pushed moves left to pop from the board.")
+        p1_loc, p2_loc, initiative, move_count, self._hash = self._undo.pop()
+        self._board_state[self._board_state[-1 - initiative]] = Board.BLANK
+        self._board_state[-1] = p1_loc
+        self._board_state[-2] = p2_loc
+        self._board_state[-3] = initiative
+        self._active_player, self._inactive_player = self._inactive_player, self._active_player
+        self.move_count = move_count
+        self._moves_cache.clear()
 
     def is_winner(self, player):
         """ Test whether the specified player has won the game. """
-        return player == self._inactive_player and not self.get_legal_moves(self._active_player)
+        return player == self._inactive_player and not self.mobility(self._active_player)
 
     def is_loser(self, player):
         """ Test whether the specified player has lost the game. """
-        return player == self._active_player and not self.get_legal_moves(self._active_player)
+        return player == self._active_player and not self.mobility(self._active_player)
 
     def utility(self, player):
         """Returns the utility of the current game state from the perspective
@@ -237,7 +447,7 @@ class Board(object):
             a value of -inf if the player has lost, and a value of 0
             otherwise.
         """
-        if not self.get_legal_moves(self._active_player):
+        if not self.mobility(self._active_player):
 
             if player == self._inactive_player:
                 return float("inf")
@@ -247,20 +457,42 @@ class Board(object):
 
         return 0.
 
-    def __get_moves(self, loc):
-        """Generate the list of possible moves for an L-shaped motion (like a
-        knight in chess).
+    def _set_players(self, player_1, player_2):
+        """Replace the player objects of the board, keeping the position (the
+        player to move is given by the move count).
         """
-        if loc == Board.NOT_MOVED:
-            return self.get_blank_spaces()
+        self._player_1, self._player_2 = player_1, player_2
+        if self.move_count % 2:
+            self._active_player, self._inactive_player = player_2, player_1
+        else:
+            self._active_player, self._inactive_player = player_1, player_2
+
+    def __location(self, player):
+        """Return the cell index of a player (the active player if None). """
+        if player is None:
+            player = self._active_player
+        if player == self._player_1:
+            return self._board_state[-1]
+        if player == self._player_2:
+            return self._board_state[-2]
+        raise RuntimeError(
+            "Invalid player in get_legal_moves: {}".format(player))
 
-        r, c = loc
-        directions = [(-2, -1), (-2, 1), (-1, -2), (-1, 2),
-                      (1, -2), (1, 2), (2, -1), (2, 1)]
-        valid_moves = [(r + dr, c + dc) for dr, dc in directions
-                       if self.move_is_legal((r + dr, c + dc))]
-        random.shuffle(valid_moves)
-        return valid_moves
+    def __get_moves(self, loc):
+        """Return the tuple of possible moves for an L-shaped motion (like a
+        knight in chess) from the cell index `loc`, memoised until the
+        position changes.
+        """
+        moves = self._moves_cache.get(loc)
+        if moves is None:
+            if loc == Board.NOT_MOVED:
+                moves = tuple(self.get_blank_spaces())
+            else:
+                state = self._board_state
+                moves = tuple(move for idx, move in self._knight_moves[loc]
+                              if state[idx] == Board.BLANK)
+            self._moves_cache[loc] = moves
+        return moves
 
     def print_board(self):
         """DEPRECATED - use Board.to_string()"""
@@ -295,7 +527,7 @@ class Board(object):
 
         return out
 
-    def play(self, time_limit=TIME_LIMIT_MILLIS):
+    def play(self, time_limit=TIME_LIMIT_MILLIS, move_times=None):
         """Execute a match between the players by alternately soliciting them
         to select a move and applying it in the game.
 
@@ -305,6 +537,10 @@ class Board(object):
             The maximum number of milliseconds to allow before timeout
             during each turn.
 
+        move_times : list (optional)
+            If given, the number of milliseconds taken by each move of the
+            move history is appended to this list (e.g., for game records).
+
         Returns
         ----------
         (player, list<[(int, int),]>, str)
@@ -324,7 +560,8 @@ class Board(object):
             move_start = time_millis()
             time_left = lambda : time_limit - (time_millis() - move_start)
             curr_move = self._active_player.get_move(game_copy, time_left)
-            move_end = time_left()
+            move_time = time_millis() - move_start
+            move_end = time_limit - move_time
 
             if curr_move is None:
                 curr_move = Board.NOT_MOVED
@@ -338,5 +575,7 @@ class Board(object):
                 return self._inactive_player, move_history, "illegal move"
 
             move_history.append(list(curr_move))
+            if move_times is not None:
+                move_times.append(move_time)
 
             self.apply_move(curr_move)
@@ -0,0 +1,172 @@
+"""
+This file contains a compact binary format for recording complete games of
+Isolation, so that large numbers of games (e.g., from tournaments) can be
+stored and mined without keeping Python objects in memory.
+
+A record file starts with a short header (magic bytes and format version)
+followed by the game records, each of which is:
+
+- a fixed header: board width, board height, termination reason, length of
+  the player names and number of moves;
+- the names of the two players, encoded in UTF-8 and separated by a NUL byte;
+- every move as one byte, its cell index ``row + column * height``;
+- the time taken by every move as an unsigned 16-bit count of tenths of a
+  millisecond (0xFFFF for moves that were not timed, such as the random
+  opening moves of a tournament game).
+
+Records are appended one at a time by `RecordWriter`, and read back lazily by
+`read_records`, which can skip to any game without decoding the ones before
+it. The player to move after the last move lost the game, so the winner is
+not stored.
+"""
+import struct
+
+from collections import namedtuple
+
+from .bitboard import BitBoard
+
+MAGIC = b"ISGR"
+VERSION = 1
+TERMINATIONS = ("illegal move", "timeout", "forfeit")
+
+_FILE_HEADER = struct.Struct("<4sB")
+_RECORD_HEADER = struct.Struct("<BBBBH")
+_UNTIMED = 0xFFFF
+
+
+class GameRecord(namedtuple("GameRecord", ["width", "height", "players",
+                                           "moves", "termination", "times"])):
+    """Record of a complete game.
+
+    Attributes
+    ----------
+    width, height : int
+        The dimensions of the board.
+
+    players : (str, str)
+        The names of the first and second player.
+
+    moves : list<(int, int)>
+        Every move of the game from the empty board, as (row, column) pairs.
+
+    termination : str
+        The reason the game ended (one of `TERMINATIONS`).
+
+    times : list<float or None>
+        The number of milliseconds taken by each move, or None if the move
+        was not timed.
+    """
+
+    @property
+    def winner(self):
+        """Index (0 or 1) of the player that won the game. """
+        return 1 - len(self.moves) % 2
+
+    def position(self, ply=None, board_cls=BitBoard):
+        """Return the board after the first `ply` moves of the game (all of
+        them if None), played by placeholder players "Player1" and "Player2".
+        """
+        game = board_cls("Player1", "Player2", self.width, self.height)
+        for move in self.moves[:ply]:
+            game.apply_move(move)
+        return game
+
+    def position_arrays(self):
+        """Return the states of every position of the game, from the empty
+        board to the end, stacked into a 2D `uint8` array with one row per
+        position (see `isolation.array_board.ArrayBoard.to_array`); requires
+        NumPy."""
+        from .array_board import ArrayBoard, stack_boards
+        game = ArrayBoard("Player1", "Player2", self.width, self.height)
+        positions = [game.copy()]
+        for move in self.moves:
+            game.apply_move(move)
+            positions.append(game.copy())
+        return stack_boards(positions)
+
+    def encode(self):
+        """Return the binary encoding of the record. """
+        names = "\0".join(self.players).encode("utf-8")
+        if len(names) > 255:
+            raise ValueError("Player names are too long to be recorded.")
+        height = self.height
+        return b"".join([
+            _RECORD_HEADER.pack(self.width, height,
+                                TERMINATIONS.index(self.termination),
+                                len(names), len(self.moves)),
+            names,
+            bytes(r + c * height for r, c in self.moves),
+            struct.pack("<{}H".format(len(self.times)), *(
+                _UNTIMED if t is None else min(int(round(t * 10)), _UNTIMED - 1)
+                for t in self.times))])
+
+
+def _decode(header, body):
+    """Build a GameRecord from its header fields and the following bytes. """
+    width, height, termination, names_len, num_moves = header
+    players = tuple(body[:names_len].decode("utf-8").split("\0"))
+    cells = body[names_len:names_len + num_moves]
+    times = struct.unpack_from("<{}H".format(num_moves), body,
+                              names_len + num_moves)
+    return GameRecord(width, height, players,
+                      [(idx % height, idx // height) for idx in cells],
+                      TERMINATIONS[termination],
+                      [None if t == _UNTIMED else t / 10. for t in times])
+
+
+class RecordWriter:
+    """Append game records to a file, writing the file header if the file is
+    new. Each record is flushed as soon as it is written, so that a long
+    tournament can be interrupted without losing the games already played.
+
+    Parameters
+    ----------
+    path : str
+        Path of the record file.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(_FILE_HEADER.pack(MAGIC, VERSION))
+
+    def write(self, record):
+        self._file.write(record.encode())
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_records(path, start=0, stop=None):
+    """Generate the records of a file lazily, from index `start` (inclusive)
+    to `stop` (exclusive, or the end of the file if None). The records before
+    `start` are skipped without being decoded.
+    """
+    with open(path, "rb") as f:
+        magic, version = _FILE_HEADER.unpack(f.read(_FILE_HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{} is not a game record file.".format(path))
+        index = 0
+        while stop is None or index < stop:
+            data = f.read(_RECORD_HEADER.size)
+            if not data:
+                return
+            if len(data) < _RECORD_HEADER.size:
+                raise ValueError("Truncated game record in {}.".format(path))
+            header = _RECORD_HEADER.unpack(data)
+            length = header[3] + 3 * header[4]
+            if index < start:
+                f.seek(length, 1)
+            else:
+                body = f.read(length)
+                if len(body) < length:
+                    raise ValueError("Truncated game record in {}.".format(path))
+                yield _decode(header, body)
+            index += 1
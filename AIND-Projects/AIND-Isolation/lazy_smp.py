@@ -0,0 +1,281 @@
+"""Lazy SMP: parallel alpha-beta search sharing a transposition table.
+
+`LazySMPPlayer` runs the iterative deepening search of `AlphaBetaPlayer` in
+the main process and, at the same time, in several worker processes. The
+searches are not coordinated: they only share results through a
+transposition table stored in shared memory. So that the workers fill the
+table with different parts of the tree instead of repeating the search of
+the main process, every worker searches the moves with equal ordering scores
+in its own random order (`AlphaBetaPlayer.shuffle_ties`, which also applies
+with move ordering), and every odd worker searches one ply deeper than the
+main process at every iteration (`AlphaBetaPlayer.depth_offset`). When the
+time is up, the move of the deepest completed iteration of any process is
+played.
+
+The shared table is lock-free: every entry is stored as three 64-bit words
+(check, value, data) where check = key ^ value ^ data, so an entry torn by
+two processes writing the same slot at once simply fails the key test on
+the next lookup.
+"""
+import multiprocessing
+import queue
+import random
+import struct
+import timeit
+import weakref
+
+from multiprocessing import shared_memory
+
+from game_agent import AlphaBetaPlayer, TranspositionTable, custom_score
+
+# Milliseconds by which the workers stop before the main search, leaving time
+# to send their results
+WORKER_MARGIN = 2.
+
+_WORDS = struct.Struct("<QQQ")
+_VALUE = struct.Struct("<d")
+_DATA = struct.Struct("<hBBBHx")
+_NO_MOVE = 255
+
+
+class SharedTranspositionTable(TranspositionTable):
+    """Transposition table stored in a `multiprocessing.shared_memory` block
+    so that it can be shared by the search processes.
+
+    The table behaves like `game_agent.TranspositionTable`. Only the process
+    that created it ages the entries with `new_search()`; the other processes
+    set `generation` to the value of the current search.
+
+    Parameters
+    ----------
+    size : int (optional)
+        The number of slots in the table.
+
+    name : str (optional)
+        The name of an existing shared memory block to attach to; a new block
+        is created if None.
+    """
+
+    def __init__(self, size=2**16, name=None):
+        self.size = size
+        self.generation = 0
+        self._owner = name is None
+        if self._owner:
+            self._shm = shared_memory.SharedMemory(create=True,
+                                                   size=size * _WORDS.size)
+            self._finalizer = weakref.finalize(self, _release, self._shm)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self._buf = self._shm.buf
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    def new_search(self):
+        if self._owner:
+            self.generation += 1
+
+    def clear(self):
+        self._buf[:] = bytes(len(self._buf))
+
+    def close(self):
+        """Release the shared memory (unlinking it in the owner process). """
+        self._buf = None
+        if self._owner:
+            self._finalizer()
+        else:
+            self._shm.close()
+
+    def lookup(self, key):
+        """Return the entry stored for `key`, or None. """
+        check, value_bits, data_bits = _WORDS.unpack_from(
+            self._buf, (key % self.size) * _WORDS.size)
+        if check ^ value_bits ^ data_bits != key or not (check or data_bits):
+            return None
+        depth, bound, row, col, generation = _DATA.unpack(
+            data_bits.to_bytes(8, "little"))
+        move = None if row == _NO_MOVE else (row - 1, col - 1)
+        value = _VALUE.unpack(value_bits.to_bytes(8, "little"))[0]
+        return (key, depth, value, bound, move, generation)
+
+    def store(self, key, depth, value, alpha, beta, move):
+        """Save the result of searching a position to `depth` plies with the
+        initial window (alpha, beta).
+        """
+        if value <= alpha:
+            bound = self.UPPER
+        elif value >= beta:
+            bound = self.LOWER
+        else:
+            bound = self.EXACT
+        slot = key % self.size
+        offset = slot * _WORDS.size
+        check, value_bits, data_bits = _WORDS.unpack_from(self._buf, offset)
+        entry = None
+        if check or data_bits:
+            entry_depth, _, _, _, generation = _DATA.unpack(
+                data_bits.to_bytes(8, "little"))
+            entry = (check ^ value_bits ^ data_bits, entry_depth, generation)
+        if (entry is None or entry[0] == key or depth >= entry[1] or
+                entry[2] != self.generation):
+            if move is None:
+                row = col = _NO_MOVE
+            else:
+                row, col = move[0] + 1, move[1] + 1
+            value_bits = int.from_bytes(_VALUE.pack(value), "little")
+            data_bits = int.from_bytes(_DATA.pack(
+                depth, bound, row, col, self.generation & 0xffff), "little")
+            _WORDS.pack_into(self._buf, offset,
+                             key ^ value_bits ^ data_bits, value_bits, data_bits)
+
+
+def _release(shm):
+    shm.close()
+    shm.unlink()
+
+
+def with_players(game, player_1, player_2):
+    """Return a copy of `game` played by different player objects, e.g., to
+    send a position to another process without pickling the agents."""
+    board = game.copy()
+    board._set_players(player_1, player_2)
+    return board
+
+
+def helper_player(index, options):
+    """Return the agent of the worker `index` (from 1) of a parallel search:
+    an `AlphaBetaPlayer` with the given options that breaks the ties of its
+    move ordering at random, from a generator seeded with the index, and
+    searches one ply deeper at every iteration if the index is odd."""
+    random.seed(index)
+    player = AlphaBetaPlayer(**options)
+    player.shuffle_ties = True
+    player.depth_offset = index % 2
+    return player
+
+
+def _worker(index, table_name, table_size, options, jobs, results):
+    """Search the positions received from `jobs` until their deadline and
+    put (search id, completed depth, move) on `results`."""
+    table = SharedTranspositionTable(table_size, table_name)
+    player = helper_player(index, options)
+    player.tt = table
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        search_id, game, deadline, generation = job
+        table.generation = generation
+        if game.move_count % 2:
+            game = with_players(game, "Opponent", player)
+        else:
+            game = with_players(game, player, "Opponent")
+        move = player.get_move(
+            game, lambda: 1000. * (deadline - timeit.default_timer()))
+        results.put((search_id, player._completed_depth, move))
+    table.close()
+
+
+class LazySMPPlayer(AlphaBetaPlayer):
+    """Alpha-beta agent that searches in parallel with Lazy SMP.
+
+    Parameters
+    ----------
+    workers : int (optional)
+        Number of worker processes searching alongside the main process.
+
+    tt_size : int (optional)
+        Number of slots of the shared transposition table.
+
+    The remaining parameters are described in `AlphaBetaPlayer`; the workers
+    search with the same heuristic and search options, but only the main
+    process uses the opening book and endgame solver.
+    """
+
+    def __init__(self, search_depth=3, score_fn=custom_score, timeout=10.,
+                 workers=1, tt_size=2**16, **options):
+        super().__init__(search_depth, score_fn, timeout, **options)
+        self.tt = SharedTranspositionTable(tt_size)
+        self.workers = workers
+        self._worker_options = dict(
+            search_depth=search_depth, score_fn=score_fn, timeout=timeout,
+            **{k: v for k, v in options.items()
+               if k not in ("collect_stats", "opening_book", "endgame_solver")})
+        self._processes = []
+        self._jobs = []
+        self._results = None
+        self._search_id = 0
+
+    def start(self):
+        """Start the worker processes (done by the first `get_move`). """
+        self._results = multiprocessing.Queue()
+        for index in range(1, self.workers + 1):
+            jobs = multiprocessing.Queue()
+            process = multiprocessing.Process(
+                target=_worker, args=(index, self.tt.name, self.tt.size,
+                                      self._worker_options, jobs,
+                                      self._results), daemon=True)
+            process.start()
+            self._jobs.append(jobs)
+            self._processes.append(process)
+
+    def close(self):
+        """Stop the worker processes and release the shared table. """
+        for jobs in self._jobs:
+            jobs.put(None)
+        for process in self._processes:
+            process.join()
+        self._jobs, self._processes = [], []
+        self.tt.close()
+
+    def get_move(self, game, time_left):
+        """Search for the best move in parallel with the worker processes and
+        return the move of the deepest iteration completed by any of them.
+
+        Parameters
+        ----------
+        game : `isolation.Board`
+            An instance of `isolation.Board` encoding the current state of the
+            game (e.g., player locations and blocked cells).
+
+        time_left : callable
+            A function that returns the number of milliseconds left in the
+            current turn. Returning with any less than 0 ms remaining forfeits
+            the game.
+
+        Returns
+        -------
+        (int, int)
+            Board coordinates corresponding to a legal move; may return
+            (-1, -1) if there are no available legal moves.
+        """
+        if not self._processes and self.workers:
+            self.start()
+        self._search_id += 1
+        deadline = (timeit.default_timer() +
+                    (time_left() - WORKER_MARGIN) / 1000.)
+        board = with_players(game, "Player1", "Player2")
+        for jobs in self._jobs:
+            jobs.put((self._search_id, board, deadline, self.tt.generation + 1))
+
+        best_move = super().get_move(game, time_left)
+        best_depth = self._completed_depth
+        if best_depth is None:
+            return best_move
+
+        pending = len(self._jobs)
+        while pending:
+            timeout = (time_left() - self.TIMER_THRESHOLD / 2) / 1000.
+            if timeout <= 0:
+                break
+            try:
+                search_id, depth, move = self._results.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if search_id != self._search_id:
+                continue
+            pending -= 1
+            if depth is not None and depth > best_depth and move != (-1, -1):
+                best_depth, best_move = depth, move
+        return best_move
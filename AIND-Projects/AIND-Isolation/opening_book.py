@@ -0,0 +1,201 @@
+"""Opening book for Isolation built by deep offline searches.
+
+The book maps every position up to a configurable number of plies (reduced
+by the symmetries of the board, see `Board.canonical`) to the best move
+found by a fixed-depth alpha-beta search, so that agents can answer instantly
+in the openings that repeat in every tournament. Build a book with:
+
+    python opening_book.py --plies 3 --depth 7 --output opening_book.bin
+
+Books are stored in a compact binary file: a header (magic bytes, format
+version, board width and height, number of entries) followed by one
+(64-bit canonical Zobrist hash, move cell index) record per position.
+"""
+import argparse
+import multiprocessing
+import struct
+import timeit
+
+from isolation import Board
+
+MAGIC = b"ISOB"
+VERSION = 1
+_HEADER = struct.Struct("<4sBBBI")
+_ENTRY = struct.Struct("<QB")
+
+
+class OpeningBook:
+    """Table of best moves for canonical positions of a board size.
+
+    Parameters
+    ----------
+    width, height : int (optional)
+        Dimensions of the board the book applies to.
+    """
+
+    def __init__(self, width=7, height=7):
+        self.width = width
+        self.height = height
+        self.moves = {}
+
+    def __len__(self):
+        return len(self.moves)
+
+    def add(self, game, move):
+        """Store `move` as the best move of the active player in `game`. """
+        key, perm = game.canonical()
+        self.moves[key] = perm[move[0] + move[1] * game.height]
+
+    def lookup(self, game):
+        """Return the book move of the active player in `game`, or None if
+        the position is not in the book."""
+        if (game.width, game.height) != (self.width, self.height):
+            return None
+        key, perm = game.canonical()
+        idx = self.moves.get(key)
+        if idx is None:
+            return None
+        idx = perm.index(idx)
+        return (idx % game.height, idx // game.height)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, self.width, self.height,
+                                 len(self.moves)))
+            for key in sorted(self.moves):
+                f.write(_ENTRY.pack(key, self.moves[key]))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, width, height, count = _HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{} is not an opening book file.".format(path))
+        book = cls(width, height)
+        book.moves = dict(_ENTRY.iter_unpack(data[_HEADER.size:]))
+        if len(book.moves) != count:
+            raise ValueError("Opening book {} is truncated.".format(path))
+        return book
+
+
+def replay(moves, width, height, player_1="Player1", player_2="Player2"):
+    """Return a new board with the list of moves applied. """
+    game = Board(player_1, player_2, width, height)
+    for move in moves:
+        game.apply_move(move)
+    return game
+
+
+def book_positions(max_ply, min_ply, width, height):
+    """Return one move list for every canonical position with `min_ply` to
+    `max_ply` moves played in which the player to move has a legal move."""
+    positions = []
+    frontier = [[]]
+    for ply in range(max_ply + 1):
+        if ply >= min_ply:
+            positions.extend(frontier)
+        if ply == max_ply:
+            break
+        seen = set()
+        next_frontier = []
+        for moves in frontier:
+            game = replay(moves, width, height)
+            for move in game.get_legal_moves(shuffle=False):
+                child = game.forecast_move(move)
+                key, _ = child.canonical()
+                if key not in seen and child.get_legal_moves(shuffle=False):
+                    seen.add(key)
+                    next_frontier.append(moves + [move])
+        frontier = next_frontier
+    return positions
+
+
+def _search_position(args):
+    """Return the best move of the player to move after a list of moves,
+    found by iterative deepening alpha-beta search to a fixed depth."""
+    # Imported here so that game_agent can import this module
+    from game_agent import AlphaBetaPlayer
+
+    moves, depth, score_fn, width, height = args
+    players = [AlphaBetaPlayer(search_depth=depth, score_fn=score_fn,
+                               in_place=True, tt_size=2**16,
+                               move_ordering=True) for _ in range(2)]
+    game = replay(moves, width, height, *players)
+    player = game.active_player
+    player.time_left = lambda: float("inf")
+    best_move = (-1, -1)
+    for d in range(1, depth + 1):
+        move = player.alphabeta(game, d)
+        if move == (-1, -1):
+            break
+        best_move = move
+    return best_move
+
+
+def build_book(max_ply=3, depth=7, min_ply=2, score_fn=None, width=7,
+               height=7, processes=1):
+    """Build an opening book by searching every canonical position with
+    `min_ply` to `max_ply` moves played.
+
+    Parameters
+    ----------
+    max_ply, min_ply : int (optional)
+        Range of the number of moves played in the book positions. Tournament
+        games start with two random moves, so agents first need the book at
+        the second ply.
+
+    depth : int (optional)
+        Search depth used to choose the move of every position.
+
+    score_fn : callable (optional)
+        Heuristic used by the searches (`game_agent.custom_score` if None).
+
+    width, height : int (optional)
+        Dimensions of the board.
+
+    processes : int (optional)
+        Number of worker processes searching positions in parallel.
+    """
+    if score_fn is None:
+        from game_agent import custom_score
+        score_fn = custom_score
+    positions = book_positions(max_ply, min_ply, width, height)
+    jobs = [(moves, depth, score_fn, width, height) for moves in positions]
+    if processes == 1:
+        results = list(map(_search_position, jobs))
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(_search_position, jobs, chunksize=8)
+
+    book = OpeningBook(width, height)
+    for moves, move in zip(positions, results):
+        if move != (-1, -1):
+            book.add(replay(moves, width, height), move)
+    return book
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--plies", type=int, default=3,
+                        help="maximum number of moves played in book positions")
+    parser.add_argument("--min-plies", type=int, default=2,
+                        help="minimum number of moves played in book positions")
+    parser.add_argument("--depth", type=int, default=7,
+                        help="search depth used for every book position")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="number of worker processes (0 for all cores)")
+    parser.add_argument("--output", default="opening_book.bin",
+                        help="path of the book file to write")
+    args = parser.parse_args()
+
+    start = timeit.default_timer()
+    book = build_book(args.plies, args.depth, args.min_plies,
+                      processes=args.processes or None)
+    book.save(args.output)
+    print("Saved {} positions to {} in {:.1f}s".format(
+        len(book), args.output, timeit.default_timer() - start))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Pondering: searching on the opponent's time.
+
+After choosing its move, `PonderingPlayer` predicts the reply of the opponent
+(see `AlphaBetaPlayer.expected_reply`) and searches the position it would
+lead to in a background process until its next turn. The two searches share
+a transposition table in shared memory (`lazy_smp.SharedTranspositionTable`),
+so when the opponent plays the predicted move (a ponder hit), the iterations
+of the next search that the background process completed are answered by
+the table at the root, and the search goes deeper in the same time. After a
+ponder miss, the table entries of the pondered position are simply unused.
+
+A background thread would be simpler, but all the agents of `Board.play` run
+in the same process, so it would take its time from the opponent's search by
+holding the GIL. The pondering process only searches while the opponent
+thinks, but it needs a core of its own not to slow the opponent down (it
+shares the core of its parent with the pinned workers of `tournament.py`).
+"""
+import multiprocessing
+import queue
+
+from game_agent import AlphaBetaPlayer, custom_score
+from lazy_smp import SharedTranspositionTable, with_players
+
+
+def _ponder_worker(table_name, table_size, options, jobs, stop, done):
+    """Search the positions received from `jobs` until `stop` is set and put
+    (job id, completed depth) on `done`."""
+    table = SharedTranspositionTable(table_size, table_name)
+    player = AlphaBetaPlayer(**options)
+    player.tt = table
+    time_left = lambda: -1. if stop.is_set() else float("inf")
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        job_id, game, generation = job
+        table.generation = generation
+        if game.move_count % 2:
+            game = with_players(game, "Opponent", player)
+        else:
+            game = with_players(game, player, "Opponent")
+        player.get_move(game, time_left)
+        done.put((job_id, player._completed_depth))
+    table.close()
+
+
+class PonderingPlayer(AlphaBetaPlayer):
+    """Alpha-beta agent that searches the predicted position of its next turn
+    while the opponent is thinking.
+
+    Parameters
+    ----------
+    tt_size : int (optional)
+        Number of slots of the transposition table shared with the pondering
+        process.
+
+    The remaining parameters are described in `AlphaBetaPlayer`; the
+    pondering process uses the same heuristic and search options, except the
+    opening book, endgame solver, amortised timer (it checks for the end of
+    the opponent's turn at every node) and time manager (it deepens until
+    stopped).
+
+    Attributes
+    ----------
+    ponder_hits, ponder_misses : int
+        The number of turns where the opponent played the predicted reply,
+        and where it played another move.
+
+    ponder_depth : int
+        The depth completed by the last pondering search that reported.
+    """
+
+    def __init__(self, search_depth=3, score_fn=custom_score, timeout=10.,
+                 tt_size=2**16, **options):
+        super().__init__(search_depth, score_fn, timeout, **options)
+        self.tt = SharedTranspositionTable(tt_size)
+        self._ponder_options = dict(
+            search_depth=search_depth, score_fn=score_fn, timeout=timeout,
+            **{k: v for k, v in options.items()
+               if k not in ("collect_stats", "opening_book", "endgame_solver",
+                            "amortised_timer", "time_manager")})
+        self._process = None
+        self._jobs = self._stop = self._done = None
+        # Id of the last pondering job, and whether its search may still be
+        # running (its result has not been received)
+        self._job_id = 0
+        self._running = False
+        self._pondered = None
+        self.ponder_hits = self.ponder_misses = 0
+        self.ponder_depth = 0
+
+    def start(self):
+        """Start the pondering process (done by the first `get_move`). """
+        self._jobs = multiprocessing.Queue()
+        self._done = multiprocessing.Queue()
+        self._stop = multiprocessing.Event()
+        self._process = multiprocessing.Process(
+            target=_ponder_worker, args=(self.tt.name, self.tt.size,
+                                         self._ponder_options, self._jobs,
+                                         self._stop, self._done), daemon=True)
+        self._process.start()
+
+    def close(self):
+        """Stop the pondering process and release the shared table. """
+        if self._process is not None:
+            self._stop.set()
+            self._jobs.put(None)
+            self._process.join()
+            self._process = None
+        self.tt.close()
+
+    def get_move(self, game, time_left):
+        """Stop pondering, search for the best move like `AlphaBetaPlayer`,
+        then start pondering the position after the expected reply.
+
+        Parameters
+        ----------
+        game : `isolation.Board`
+            An instance of `isolation.Board` encoding the current state of the
+            game (e.g., player locations and blocked cells).
+
+        time_left : callable
+            A function that returns the number of milliseconds left in the
+            current turn. Returning with any less than 0 ms remaining forfeits
+            the game.
+
+        Returns
+        -------
+        (int, int)
+            Board coordinates corresponding to a legal move; may return
+            (-1, -1) if there are no available legal moves.
+        """
+        if self._process is None:
+            self.start()
+        self.__stop_pondering(game, time_left)
+        move = super().get_move(game, time_left)
+        if move != (-1, -1):
+            self.__ponder(game, move)
+        return move
+
+    def __stop_pondering(self, game, time_left):
+        """Stop the pondering search and count a hit if it searched the
+        current position."""
+        if self._pondered is None:
+            return
+        self._stop.set()
+        self.__wait(lambda: (time_left() - self.TIMER_THRESHOLD) / 2000.)
+        if self._pondered == (game.hash(), game.move_count):
+            self.ponder_hits += 1
+        else:
+            self.ponder_misses += 1
+        self._pondered = None
+
+    def __wait(self, timeout):
+        """Wait for the result of the last pondering job (at most `timeout()`
+        seconds for each result received), discarding the results of earlier
+        jobs."""
+        while self._running:
+            try:
+                job_id, depth = self._done.get(timeout=max(timeout(), 0.))
+            except queue.Empty:
+                return
+            self._running = job_id != self._job_id
+            if not self._running:
+                self.ponder_depth = depth
+
+    def __ponder(self, game, move):
+        """Start pondering the position after `move` and the expected reply,
+        unless the previous pondering search has not stopped yet (clearing
+        the stop event would let it run on).
+        """
+        self.__wait(lambda: 0.)
+        if self._running:
+            return
+        reply = self.expected_reply(game, move)
+        if reply is None:
+            return
+        board = with_players(game, "Player1", "Player2")
+        board.apply_move(move)
+        board.apply_move(reply)
+        if not board.get_legal_moves():
+            return
+        self._stop.clear()
+        self._job_id += 1
+        self._jobs.put((self._job_id, board, self.tt.generation + 1))
+        self._running = True
+        self._pondered = (board.hash(), board.move_count)
@@ -0,0 +1,62 @@
+"""Inspect and replay the games of a binary game record file written by
+`tournament.py --record`.
+
+Without options, a one-line summary of every game is printed:
+
+    python replay.py games.bin
+
+With --game, the moves of one game are listed with their timing, and with
+--ply the position after that many moves is reconstructed and printed:
+
+    python replay.py games.bin --game 12 --ply 9
+"""
+import argparse
+
+from isolation.records import read_records
+
+
+def summary(index, record):
+    """Return the one-line summary of a game record. """
+    players = list(record.players)
+    players[record.winner] += " (won)"
+    return "{:>6}  {:<24} {:<24} {:>5} moves  {}".format(
+        index, players[0], players[1], len(record.moves), record.termination)
+
+
+def print_game(record, ply=None):
+    """Print the moves of a game, and the position after `ply` moves. """
+    for i, (move, time) in enumerate(zip(record.moves, record.times)):
+        print("{:>4}. {:<24} {:<8} {}".format(
+            i + 1, record.players[i % 2], str(move),
+            "-" if time is None else "{:.1f} ms".format(time)))
+    if ply is not None:
+        game = record.position(ply)
+        print("\nPosition after {} moves ({} to move):".format(
+            min(ply, len(record.moves)),
+            record.players[game.move_count % 2]))
+        print(game.to_string())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("path", help="game record file")
+    parser.add_argument("--game", type=int,
+                        help="index of the game to replay")
+    parser.add_argument("--ply", type=int,
+                        help="print the position after this many moves of "
+                             "the replayed game")
+    args = parser.parse_args()
+
+    if args.game is None:
+        for index, record in enumerate(read_records(args.path)):
+            print(summary(index, record))
+        return
+    for record in read_records(args.path, args.game, args.game + 1):
+        print(summary(args.game, record) + "\n")
+        print_game(record, args.ply)
+        return
+    parser.error("there is no game {} in {}".format(args.game, args.path))
+
+
+if __name__ == "__main__":
+    main()
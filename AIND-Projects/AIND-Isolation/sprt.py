@@ -0,0 +1,107 @@
+"""Statistics used by tournament.py to compare two agents with as few games as
+the data needs: Elo rating differences with confidence intervals, and a
+sequential probability ratio test (SPRT) that stops a pairing as soon as one
+hypothesis about the Elo difference can be accepted.
+
+Isolation games cannot be drawn, so every game is a Bernoulli trial whose
+success probability is the expected score of the candidate agent under the
+logistic Elo model.
+"""
+import math
+
+# Two-sided standard normal quantiles for common confidence levels
+_Z_SCORES = {0.90: 1.6449, 0.95: 1.9600, 0.99: 2.5758}
+
+
+def expected_score(elo_diff):
+    """Return the expected score of a player rated `elo_diff` points above
+    its opponent."""
+    return 1. / (1. + 10 ** (-elo_diff / 400.))
+
+
+def elo_diff(score):
+    """Return the Elo difference corresponding to an expected score in
+    [0, 1] (+/-inf for a score of exactly 1 or 0)."""
+    if score <= 0.:
+        return float("-inf")
+    if score >= 1.:
+        return float("inf")
+    return -400. * math.log10(1. / score - 1.)
+
+
+def elo_interval(wins, losses, confidence=0.95):
+    """Estimate the Elo difference of a player with the given record.
+
+    Parameters
+    ----------
+    wins, losses : int
+        Number of games won and lost against the opponent.
+
+    confidence : float (optional)
+        Confidence level of the interval; one of 0.90, 0.95 or 0.99.
+
+    Returns
+    -------
+    (float, float, float)
+        The estimated Elo difference and the lower and upper bounds of its
+        confidence interval (normal approximation of the score).
+    """
+    games = wins + losses
+    if not games:
+        return 0., float("-inf"), float("inf")
+    score = wins / games
+    margin = _Z_SCORES[confidence] * math.sqrt(score * (1. - score) / games)
+    return elo_diff(score), elo_diff(score - margin), elo_diff(score + margin)
+
+
+class SPRT:
+    """Sequential probability ratio test of H0: the Elo difference is `elo0`
+    against H1: the Elo difference is `elo1`.
+
+    Parameters
+    ----------
+    elo0, elo1 : float
+        The Elo differences of the null and alternative hypotheses, with
+        elo0 < elo1.
+
+    alpha : float (optional)
+        Maximum probability of accepting H1 when H0 is true.
+
+    beta : float (optional)
+        Maximum probability of accepting H0 when H1 is true.
+    """
+    H0, H1 = "H0", "H1"
+
+    def __init__(self, elo0, elo1, alpha=0.05, beta=0.05):
+        if not elo0 < elo1:
+            raise ValueError("SPRT requires elo0 < elo1.")
+        self.elo0 = elo0
+        self.elo1 = elo1
+        self.wins = 0
+        self.losses = 0
+        self.lower = math.log(beta / (1. - alpha))
+        self.upper = math.log((1. - beta) / alpha)
+        p0 = expected_score(elo0)
+        p1 = expected_score(elo1)
+        self._win_llr = math.log(p1 / p0)
+        self._loss_llr = math.log((1. - p1) / (1. - p0))
+
+    def update(self, wins, losses):
+        """Add the results of new games to the test. """
+        self.wins += wins
+        self.losses += losses
+
+    def llr(self):
+        """Return the log-likelihood ratio of H1 over H0 for the games so far.
+        """
+        return self.wins * self._win_llr + self.losses * self._loss_llr
+
+    def status(self):
+        """Return SPRT.H1 or SPRT.H0 once the corresponding hypothesis is
+        accepted, or None while the test needs more games."""
+        llr = self.llr()
+        if llr >= self.upper:
+            return self.H1
+        if llr <= self.lower:
+            return self.H0
+        return None
@@ -0,0 +1,270 @@
+"""Retrograde-analysis solver and tablebase for small Isolation boards.
+
+Every move blocks one more cell, so the positions of a game are layered by
+move count and can be solved exactly by enumerating all reachable positions
+layer by layer from the empty board, then assigning values from the last
+layer back to the first. A position is valued by its distance to the end:
+the number of plies left with perfect play, where the winner ends the game as
+soon as possible and the loser as late as possible. The player to move wins
+if and only if the distance is odd (the player to move at the end loses).
+
+Solved boards are stored in a tablebase file -- a header followed by an open
+addressing hash table of (position key, distance) records -- which is memory
+mapped and probed in constant time. Build one with:
+
+    python tablebase.py --width 4 --height 5 --output tablebase_4x5.bin
+
+Pure Python enumeration handles boards of up to about 20 cells (the 4x5
+board has 1.9 million positions and solves in about 15 seconds); the 5x5
+board already has over 18 million positions half way through the game and is
+out of reach.
+"""
+import argparse
+import random
+import struct
+import timeit
+
+import numpy as np
+
+from isolation.bitboard import knight_masks
+
+MAGIC = b"ISTB"
+VERSION = 1
+_HEADER = struct.Struct("<4sBBBxQQ")
+_ENTRY = np.dtype([("key", "<u8"), ("distance", "u1")])
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+_MASK_64 = (1 << 64) - 1
+
+
+def _layout(width, height):
+    """Return (cells, bits): the number of cells and the number of bits of a
+    location field (wide enough for the NOT_MOVED sentinel index `cells`)."""
+    cells = width * height
+    return cells, cells.bit_length()
+
+
+def position_key(game):
+    """Return the tablebase key of a position: the blocked cell bitmask, the
+    cell index of the player to move and that of its opponent (the number of
+    cells for a player that has not moved yet)."""
+    cells, bits = _layout(game.width, game.height)
+    blocked = (1 << cells) - 1
+    for r, c in game.get_blank_spaces():
+        blocked ^= 1 << (r + c * game.height)
+    locs = []
+    for player in (game.active_player, game.inactive_player):
+        loc = game.get_player_location(player)
+        locs.append(cells if loc is None else loc[0] + loc[1] * game.height)
+    return blocked | locs[0] << cells | locs[1] << (cells + bits)
+
+
+def _moves(blocked, loc, masks, full, cells):
+    """Return the bitmask of the cells a player on `loc` can move to. """
+    if loc == cells:
+        return ~blocked & full
+    return masks[loc] & ~blocked
+
+
+def best_distance(child_distances):
+    """Return the distance of a position from the distances of its children
+    (from the opponent's point of view): win as fast as possible, or lose as
+    slowly as possible."""
+    wins = [d for d in child_distances if d % 2 == 0]
+    if wins:
+        return 1 + min(wins)
+    if child_distances:
+        return 1 + max(child_distances)
+    return 0
+
+
+def solve(width, height):
+    """Solve every position reachable on a board of the given size.
+
+    Returns
+    -------
+    (list<int>, list<int>)
+        The keys of the positions (see `position_key`) and their distances
+        to the end of the game.
+    """
+    cells, bits = _layout(width, height)
+    masks = knight_masks(width, height)
+    full = (1 << cells) - 1
+
+    # Forward: layers of (blocked, mover, opponent) positions by move count
+    layers = [[(0, cells, cells)]]
+    while layers[-1]:
+        successors = set()
+        for blocked, me, opp in layers[-1]:
+            moves = _moves(blocked, me, masks, full, cells)
+            while moves:
+                low = moves & -moves
+                moves ^= low
+                successors.add((blocked | low, opp, low.bit_length() - 1))
+        layers.append(list(successors))
+
+    # Backward: value each layer from the distances of the next one
+    keys, distances = [], []
+    next_distances = {}
+    for layer in reversed(layers[:-1]):
+        layer_distances = {}
+        for blocked, me, opp in layer:
+            child_distances = []
+            moves = _moves(blocked, me, masks, full, cells)
+            while moves:
+                low = moves & -moves
+                moves ^= low
+                child = ((blocked | low) | opp << cells |
+                         (low.bit_length() - 1) << (cells + bits))
+                child_distances.append(next_distances[child])
+            key = blocked | me << cells | opp << (cells + bits)
+            layer_distances[key] = best_distance(child_distances)
+        keys.extend(layer_distances)
+        distances.extend(layer_distances.values())
+        next_distances = layer_distances
+    return keys, distances
+
+
+def _slot(key, shift):
+    return ((key * _HASH_MULTIPLIER) & _MASK_64) >> shift
+
+
+def write_tablebase(path, width, height, keys, distances):
+    """Write solved positions to a tablebase file. """
+    num_slots = 1 << max(1, (2 * len(keys) - 1).bit_length())
+    shift = 64 - (num_slots.bit_length() - 1)
+    slot_keys = [0] * num_slots
+    slot_distances = bytearray(num_slots)
+    for key, distance in zip(keys, distances):
+        slot = _slot(key, shift)
+        while slot_keys[slot]:
+            slot = (slot + 1) & (num_slots - 1)
+        slot_keys[slot] = key
+        slot_distances[slot] = distance
+    table = np.zeros(num_slots, dtype=_ENTRY)
+    table["key"] = slot_keys
+    table["distance"] = np.frombuffer(bytes(slot_distances), dtype=np.uint8)
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, width, height, len(keys),
+                             num_slots))
+        table.tofile(f)
+
+
+def build(width, height, path):
+    """Solve a board size and write its tablebase to `path`; return the
+    number of positions."""
+    keys, distances = solve(width, height)
+    write_tablebase(path, width, height, keys, distances)
+    return len(keys)
+
+
+class Tablebase:
+    """Memory-mapped tablebase of a board size.
+
+    Parameters
+    ----------
+    path : str
+        Path of a file written by `build`.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            header = f.read(_HEADER.size)
+        magic, version, self.width, self.height, self.count, num_slots = \
+            _HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{} is not a tablebase file.".format(path))
+        self._table = np.memmap(path, dtype=_ENTRY, mode="r",
+                                offset=_HEADER.size, shape=(num_slots,))
+        self._keys = self._table["key"]
+        self._distances = self._table["distance"]
+        self._mask = num_slots - 1
+        self._shift = 64 - (num_slots.bit_length() - 1)
+
+    def __len__(self):
+        return self.count
+
+    def probe(self, key):
+        """Return the distance stored for a position key, or None. """
+        slot = _slot(key, self._shift)
+        while True:
+            stored = int(self._keys[slot])
+            if stored == key:
+                return int(self._distances[slot])
+            if not stored:
+                return None
+            slot = (slot + 1) & self._mask
+
+    def lookup(self, game):
+        """Return the distance to the end of a position (odd if the player to
+        move wins), or None if the position is not in the tablebase."""
+        if (game.width, game.height) != (self.width, self.height):
+            return None
+        return self.probe(position_key(game))
+
+    def best_move(self, game):
+        """Return the perfect move of the player to move (winning as fast or
+        losing as slowly as possible), or None if the position is not in the
+        tablebase or has no legal moves."""
+        if (game.width, game.height) != (self.width, self.height):
+            return None
+        cells, bits = _layout(self.width, self.height)
+        key = position_key(game)
+        blocked = key & ((1 << cells) - 1)
+        opp = key >> (cells + bits)
+        best, best_move = None, None
+        for move in game.get_legal_moves(shuffle=False):
+            idx = move[0] + move[1] * game.height
+            child = (blocked | 1 << idx) | opp << cells | idx << (cells + bits)
+            distance = self.probe(child)
+            if distance is None:
+                return None
+            # Prefer wins (even child distances), then the fastest win or the
+            # slowest loss
+            rank = (distance % 2 == 0, -distance if distance % 2 == 0 else distance)
+            if best is None or rank > best:
+                best, best_move = rank, move
+        return best_move
+
+
+class TablebasePlayer:
+    """Player that plays perfectly from a tablebase, and randomly in
+    positions that are not in it (e.g., other board sizes).
+
+    Parameters
+    ----------
+    tablebase : str or `Tablebase`
+        The tablebase, or the path of a tablebase file.
+    """
+
+    def __init__(self, tablebase):
+        if isinstance(tablebase, str):
+            tablebase = Tablebase(tablebase)
+        self.tablebase = tablebase
+
+    def get_move(self, game, time_left):
+        move = self.tablebase.best_move(game)
+        if move is not None:
+            return move
+        legal_moves = game.get_legal_moves()
+        if not legal_moves:
+            return (-1, -1)
+        return random.choice(legal_moves)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--width", type=int, default=4)
+    parser.add_argument("--height", type=int, default=4)
+    parser.add_argument("--output", help="path of the tablebase file "
+                        "(default: tablebase_<width>x<height>.bin)")
+    args = parser.parse_args()
+
+    path = args.output or "tablebase_{}x{}.bin".format(args.width, args.height)
+    start = timeit.default_timer()
+    count = build(args.width, args.height, path)
+    print("Solved {} positions of the {}x{} board in {:.1f}s; saved to {}".format(
+        count, args.width, args.height, timeit.default_timer() - start, path))
+
+
+if __name__ == "__main__":
+    main()
@@ -11,20 +11,28 @@ players, and the players play each match twice -- once as the first player and
 once as the second player.  Randomizing the openings and switching the player
 order corrects for imbalances due to both starting position and initiative.
 """
+import argparse
 import itertools
+import json
+import multiprocessing
+import os
 import random
 import warnings
 
 from collections import namedtuple
 
 from isolation import Board
+from isolation.records import GameRecord, RecordWriter
+from sprt import SPRT, elo_interval
 from sample_players import (RandomPlayer, open_move_score,
                             improved_score, center_score)
-from game_agent import (MinimaxPlayer, AlphaBetaPlayer, custom_score,
-                        custom_score_2, custom_score_3)
+from game_agent import (PARAMS, MinimaxPlayer, AlphaBetaPlayer, SearchStats,
+                        custom_score, custom_score_2, custom_score_3)
+from competition_agent import CustomPlayer
 
 NUM_MATCHES = 5  # number of matches against each opponent
 TIME_LIMIT = 150  # number of milliseconds before timeout
+MAX_SPRT_MATCHES = 500  # maximum number of matches per pairing in SPRT mode
 
 DESCRIPTION = """
 This script evaluates the performance of the custom_score evaluation
@@ -36,32 +44,69 @@ game_agent.py.
 
 Agent = namedtuple("Agent", ["player", "name"])
 
+# Picklable description of an agent (player class, constructor keyword
+# arguments and display name) used to rebuild agents in worker processes
+AgentSpec = namedtuple("AgentSpec", ["cls", "kwargs", "name"])
 
-def play_round(cpu_agent, test_agents, win_counts, num_matches):
+
+def build_agent(spec):
+    """Construct the Agent described by an AgentSpec. """
+    return Agent(spec.cls(**spec.kwargs), spec.name)
+
+
+def random_opening():
+    """Return the two random moves (a move and a response) used to start
+    every game of a fair match."""
+    game = Board("Player1", "Player2")
+    opening = []
+    for _ in range(2):
+        move = random.choice(game.get_legal_moves())
+        game.apply_move(move)
+        opening.append(move)
+    return opening
+
+
+def play_game(game, names, opening, time_limit=TIME_LIMIT):
+    """Play a game from the given opening moves and return the results of
+    `Board.play` followed by the GameRecord of the game."""
+    for move in opening:
+        game.apply_move(move)
+    times = []
+    winner, history, termination = game.play(time_limit=time_limit,
+                                             move_times=times)
+    record = GameRecord(game.width, game.height, names,
+                        list(opening) + [tuple(move) for move in history],
+                        termination, [None] * len(opening) + times)
+    return winner, history, termination, record
+
+
+def play_round(cpu_agent, test_agents, win_counts, num_matches, writer=None):
     """Compare the test agents to the cpu agent in "fair" matches.
 
     "Fair" matches use random starting locations and force the agents to
     play as both first and second player to control for advantages resulting
     from choosing better opening moves or having first initiative to move.
+    The record of every game is appended to `writer` if given.
     """
     timeout_count = 0
     forfeit_count = 0
     for _ in range(num_matches):
 
-        games = sum([[Board(cpu_agent.player, agent.player),
-                      Board(agent.player, cpu_agent.player)]
+        games = sum([[(Board(cpu_agent.player, agent.player),
+                       (cpu_agent.name, agent.name)),
+                      (Board(agent.player, cpu_agent.player),
+                       (agent.name, cpu_agent.name))]
                     for agent in test_agents], [])
 
         # initialize all games with a random move and response
-        for _ in range(2):
-            move = random.choice(games[0].get_legal_moves())
-            for game in games:
-                game.apply_move(move)
+        opening = random_opening()
 
         # play all games and tally the results
-        for game in games:
-            winner, _, termination = game.play(time_limit=TIME_LIMIT)
+        for game, names in games:
+            winner, _, termination, record = play_game(game, names, opening)
             win_counts[winner] += 1
+            if writer is not None:
+                writer.write(record)
 
             if termination == "timeout":
                 timeout_count += 1
@@ -77,41 +122,26 @@ def update(total_wins, wins):
     return total_wins
 
 
-def play_matches(cpu_agents, test_agents, num_matches):
-    """Play matches between the test agent and each cpu_agent individually. """
-    total_wins = {agent.player: 0 for agent in test_agents}
-    total_timeouts = 0.
-    total_forfeits = 0.
-    total_matches = 2 * num_matches * len(cpu_agents)
-
+def print_header(test_agents):
     print("\n{:^9}{:^13}".format("Match #", "Opponent") + ''.join(['{:^13}'.format(x[1].name) for x in enumerate(test_agents)]))
     print("{:^9}{:^13} ".format("", "") +  ' '.join(['{:^5}| {:^5}'.format("Won", "Lost") for x in enumerate(test_agents)]))
 
-    for idx, agent in enumerate(cpu_agents):
-        wins = {key: 0 for (key, value) in test_agents}
-        wins[agent.player] = 0
 
-        print("{!s:^9}{:^13}".format(idx + 1, agent.name), end="", flush=True)
+def print_round(round_totals):
+    print(' ' + ' '.join([
+        '{:^5}| {:^5}'.format(
+            round_totals[i],round_totals[i+1]
+        ) for i in range(0, len(round_totals), 2)
+    ]))
 
-        counts = play_round(agent, test_agents, wins, num_matches)
-        total_timeouts += counts[0]
-        total_forfeits += counts[1]
-        total_wins = update(total_wins, wins)
-        _total = 2 * num_matches
-        round_totals = sum([[wins[agent.player], _total - wins[agent.player]]
-                            for agent in test_agents], [])
-        print(' ' + ' '.join([
-            '{:^5}| {:^5}'.format(
-                round_totals[i],round_totals[i+1]
-            ) for i in range(0, len(round_totals), 2)
-        ]))
 
+def print_summary(win_rates, total_timeouts, total_forfeits):
     print("-" * 74)
     print('{:^9}{:^13}'.format("", "Win Rate:") +
         ''.join([
             '{:^13}'.format(
-                "{:.1f}%".format(100 * total_wins[x[1].player] / total_matches)
-            ) for x in enumerate(test_agents)
+                "{:.1f}%".format(100 * win_rate)
+            ) for win_rate in win_rates
     ]))
 
     if total_timeouts:
@@ -124,33 +154,359 @@ def play_matches(cpu_agents, test_agents, num_matches):
                "legal moves available to play.\n").format(total_forfeits))
 
 
+def play_matches(cpu_agents, test_agents, num_matches, writer=None):
+    """Play matches between the test agent and each cpu_agent individually,
+    appending the record of every game to `writer` if given."""
+    total_wins = {agent.player: 0 for agent in test_agents}
+    total_timeouts = 0.
+    total_forfeits = 0.
+    total_matches = 2 * num_matches * len(cpu_agents)
+
+    print_header(test_agents)
+
+    for idx, agent in enumerate(cpu_agents):
+        wins = {key: 0 for (key, value) in test_agents}
+        wins[agent.player] = 0
+
+        print("{!s:^9}{:^13}".format(idx + 1, agent.name), end="", flush=True)
+
+        counts = play_round(agent, test_agents, wins, num_matches, writer)
+        total_timeouts += counts[0]
+        total_forfeits += counts[1]
+        total_wins = update(total_wins, wins)
+        _total = 2 * num_matches
+        round_totals = sum([[wins[agent.player], _total - wins[agent.player]]
+                            for agent in test_agents], [])
+        print_round(round_totals)
+
+    print_summary([total_wins[agent.player] / total_matches
+                   for agent in test_agents], total_timeouts, total_forfeits)
+    return {agent.name: agent.player.stats for agent in test_agents
+            if getattr(agent.player, "stats", None) is not None}
+
+
+# Agents rebuilt from their specs once per worker process by _init_worker
+_worker_agents = None
+
+
+def _init_worker(cpu_specs, test_specs, cores, params):
+    """Pool initializer: pin the worker to a single core (where supported)
+    so that agents in different workers do not compete for CPU time within
+    their per-move time limit, set the heuristic weights of the main process
+    (see `game_agent.PARAMS`), then build the agents of the tournament."""
+    global _worker_agents
+    core = cores.get()
+    if core is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {core})
+    for name, weights in params.items():
+        PARAMS[name].update(weights)
+    _worker_agents = ([build_agent(spec) for spec in cpu_specs],
+                      [build_agent(spec) for spec in test_specs])
+
+
+def _play_game(job):
+    """Play a single game in a worker process and return the tuple
+    (cpu index, test index, whether the test agent won, termination, search
+    statistics of the test agent or None if it does not collect them, game
+    record)."""
+    cpu_idx, test_idx, cpu_first, opening = job
+    cpu_agent = _worker_agents[0][cpu_idx]
+    test_agent = _worker_agents[1][test_idx]
+    stats = getattr(test_agent.player, "stats", None)
+    if stats is not None:
+        stats.games = []
+    if cpu_first:
+        game = Board(cpu_agent.player, test_agent.player)
+        names = (cpu_agent.name, test_agent.name)
+    else:
+        game = Board(test_agent.player, cpu_agent.player)
+        names = (test_agent.name, cpu_agent.name)
+    winner, _, termination, record = play_game(game, names, opening)
+    return (cpu_idx, test_idx, winner is test_agent.player, termination,
+            stats.games if stats is not None else None, record)
+
+
+def usable_cores():
+    """Return the list of CPU cores this process may run on. """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def worker_pool(cpu_specs, test_specs, processes=None):
+    """Return a multiprocessing pool whose workers play games between the
+    agents described by `cpu_specs` and `test_specs` (see `_play_game`).
+
+    Workers are pinned to distinct cores when there are enough of them; the
+    number of processes defaults to the number of usable cores.
+    """
+    cores = usable_cores()
+    processes = processes or len(cores)
+    if processes > len(cores):
+        warnings.warn("Running {} worker processes on {} cores; agents will "
+                      "compete for CPU time and may time out.".format(
+                          processes, len(cores)))
+
+    core_queue = multiprocessing.Queue()
+    for i in range(processes):
+        core_queue.put(cores[i] if processes <= len(cores) else None)
+    return multiprocessing.Pool(processes, _init_worker,
+                                (cpu_specs, test_specs, core_queue, PARAMS))
+
+
+def play_matches_parallel(cpu_specs, test_specs, num_matches, processes=None,
+                          writer=None):
+    """Play the same matches as `play_matches`, distributing the games over a
+    pool of worker processes.
+
+    Every game of a fair match is independent, so each one is submitted to
+    the pool as a separate job with its (shared) random opening. Results are
+    tallied into the same win/timeout/forfeit tables as `play_matches`.
+
+    Parameters
+    ----------
+    cpu_specs, test_specs : list<AgentSpec>
+        Picklable descriptions of the agents, rebuilt in every worker.
+
+    num_matches : int
+        Number of fair matches (two games each) against each cpu agent.
+
+    processes : int (optional)
+        Number of worker processes; defaults to the number of usable cores.
+
+    writer : `isolation.records.RecordWriter` (optional)
+        If given, the record of every game is appended to it (by the main
+        process, as the results arrive).
+    """
+    jobs = []
+    for cpu_idx in range(len(cpu_specs)):
+        for _ in range(num_matches):
+            opening = random_opening()
+            for test_idx in range(len(test_specs)):
+                jobs.append((cpu_idx, test_idx, True, opening))
+                jobs.append((cpu_idx, test_idx, False, opening))
+
+    wins = [[0] * len(test_specs) for _ in cpu_specs]
+    total_timeouts = 0
+    total_forfeits = 0
+    stats = {}
+    with worker_pool(cpu_specs, test_specs, processes) as pool:
+        for cpu_idx, test_idx, won, termination, games, record in pool.imap_unordered(_play_game, jobs):
+            wins[cpu_idx][test_idx] += won
+            if writer is not None:
+                writer.write(record)
+            if games is not None:
+                stats.setdefault(test_specs[test_idx].name, SearchStats()).merge(games)
+            if termination == "timeout":
+                total_timeouts += 1
+            elif termination == "forfeit":
+                total_forfeits += 1
+
+    _total = 2 * num_matches
+    print_header(test_specs)
+    for idx, spec in enumerate(cpu_specs):
+        print("{!s:^9}{:^13}".format(idx + 1, spec.name), end="")
+        print_round(sum([[w, _total - w] for w in wins[idx]], []))
+
+    total_matches = _total * len(cpu_specs)
+    print_summary([sum(row[i] for row in wins) / total_matches
+                   for i in range(len(test_specs))],
+                  total_timeouts, total_forfeits)
+    return stats
+
+
+def play_sprt(baseline, candidates, elo0=0., elo1=50., alpha=0.05,
+              beta=0.05, max_matches=MAX_SPRT_MATCHES, processes=1,
+              writer=None):
+    """Compare each candidate agent to a baseline agent with a sequential
+    probability ratio test instead of a fixed number of matches.
+
+    Fair matches (two games from the same random opening, one with each
+    agent moving first) are played in batches of `processes` matches until
+    the SPRT accepts either H0 (the candidate is `elo0` Elo stronger than the
+    baseline) or H1 (it is `elo1` Elo stronger), or `max_matches` have been
+    played. The Elo difference and its 95% confidence interval are reported
+    for every pairing.
+
+    Parameters
+    ----------
+    baseline : AgentSpec
+        The reference agent (e.g., AB_Improved).
+
+    candidates : list<AgentSpec>
+        The agents to compare against the baseline.
+
+    elo0, elo1, alpha, beta : float (optional)
+        Hypotheses and error rates of the test (see `sprt.SPRT`).
+
+    max_matches : int (optional)
+        Maximum number of fair matches per pairing.
+
+    processes : int (optional)
+        Number of worker processes playing matches in parallel.
+
+    writer : `isolation.records.RecordWriter` (optional)
+        If given, the record of every game is appended to it.
+    """
+    print("\n{:^13}{:^8}{:^12}{:^24}{:^9}{:^10}".format(
+        "Candidate", "Games", "Won | Lost", "Elo (95% CI)", "LLR", "Result"))
+    batch_size = processes or len(usable_cores())
+    stats = {}
+    with worker_pool([baseline], candidates, batch_size) as pool:
+        for test_idx, spec in enumerate(candidates):
+            test = SPRT(elo0, elo1, alpha, beta)
+            timeouts = matches = 0
+            while test.status() is None and matches < max_matches:
+                jobs = []
+                for _ in range(min(batch_size, max_matches - matches)):
+                    opening = random_opening()
+                    jobs.append((0, test_idx, True, opening))
+                    jobs.append((0, test_idx, False, opening))
+                results = pool.map(_play_game, jobs)
+                wins = sum(won for _, _, won, *_ in results)
+                test.update(wins, len(results) - wins)
+                timeouts += sum(t == "timeout" for _, _, _, t, *_ in results)
+                matches += len(jobs) // 2
+                for *_, games, record in results:
+                    if games is not None:
+                        stats.setdefault(spec.name, SearchStats()).merge(games)
+                    if writer is not None:
+                        writer.write(record)
+
+            elo, low, high = elo_interval(test.wins, test.losses)
+            result = {SPRT.H1: "H1", SPRT.H0: "H0"}.get(test.status(), "--")
+            print("{:^13}{:^8}{:^12}{:^24}{:^9.2f}{:^10}".format(
+                spec.name, test.wins + test.losses,
+                "{} | {}".format(test.wins, test.losses),
+                "{:+.0f} ({:+.0f}, {:+.0f})".format(elo, low, high),
+                test.llr(), result))
+            if timeouts:
+                print("  ({} games ended by timeout)".format(timeouts))
+
+    print("\nH0: Elo difference = {:+.0f}, H1: Elo difference = {:+.0f} "
+          "(alpha = {}, beta = {}); '--' means undecided after {} matches."
+          .format(elo0, elo1, alpha, beta, max_matches))
+    return stats
+
+
+def print_stats(stats):
+    """Print a summary of the search statistics collected by each agent. """
+    print("\n{:^13}{:^8}{:^12}{:^12}{:^8}{:^20}{:^12}".format(
+        "Agent", "Moves", "Depth", "Nodes/s", "EBF", "Time left (ms)",
+        "Interrupted"))
+    print("{:^13}{:^8}{:^12}{:^12}{:^8}{:^20}{:^12}".format(
+        "", "", "mean | max", "", "", "mean | min", ""))
+    for name, agent_stats in stats.items():
+        summary = agent_stats.summary()
+        if not summary["moves"]:
+            continue
+        print("{:^13}{:^8}{:^12}{:^12.0f}{:^8.2f}{:^20}{:^12}".format(
+            name, summary["moves"],
+            "{:.1f} | {}".format(summary["mean_depth"], summary["max_depth"]),
+            summary["nodes_per_second"], summary["mean_branching_factor"],
+            "{:.1f} | {:.1f}".format(summary["mean_time_left"],
+                                     summary["min_time_left"]),
+            summary["timed_out"]))
+
+
+def dump_stats(stats, path):
+    """Save the summary and per-game move records of each agent as JSON. """
+    with open(path, "w") as f:
+        json.dump({name: {"summary": agent_stats.summary(),
+                          "games": agent_stats.games}
+                   for name, agent_stats in stats.items()}, f, indent=2)
+
+
 def main():
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("-p", "--processes", type=int, default=1,
+                        help="number of worker processes playing games in "
+                             "parallel (0 to use every available core)")
+    parser.add_argument("--sprt", action="store_true",
+                        help="compare each AB_Custom agent to AB_Improved "
+                             "with a sequential probability ratio test "
+                             "instead of a fixed number of matches")
+    parser.add_argument("--elo0", type=float, default=0.,
+                        help="Elo difference of the SPRT null hypothesis")
+    parser.add_argument("--elo1", type=float, default=50.,
+                        help="Elo difference of the SPRT alternative hypothesis")
+    parser.add_argument("--stats", action="store_true",
+                        help="collect and print the search statistics "
+                             "(depth, nodes/s, branching factor, time left) "
+                             "of the test agents")
+    parser.add_argument("--stats-json", metavar="PATH",
+                        help="also save the search statistics to a JSON file")
+    parser.add_argument("--mcts", action="store_true",
+                        help="add the MCTS agent of competition_agent.py to "
+                             "the test agents")
+    parser.add_argument("--time-manager", action="store_true",
+                        help="stop the iterative deepening of the test "
+                             "agents when the next iteration cannot finish "
+                             "in time (see game_agent.TimeManager)")
+    parser.add_argument("--record", metavar="PATH",
+                        help="append the record of every game to a binary "
+                             "game record file (see replay.py)")
+    args = parser.parse_args()
+
+    # Tuned heuristic weights are injected here: game_agent cannot read files
+    from tuning import PARAMS_FILE, load_params
+    if os.path.exists(PARAMS_FILE):
+        load_params()
 
     # Define two agents to compare -- these agents will play from the same
     # starting position against the same adversaries in the tournament
     test_agents = [
-        Agent(AlphaBetaPlayer(score_fn=improved_score), "AB_Improved"),
-        Agent(AlphaBetaPlayer(score_fn=custom_score), "AB_Custom"),
-        Agent(AlphaBetaPlayer(score_fn=custom_score_2), "AB_Custom_2"),
-        Agent(AlphaBetaPlayer(score_fn=custom_score_3), "AB_Custom_3")
+        AgentSpec(AlphaBetaPlayer, {"score_fn": improved_score}, "AB_Improved"),
+        AgentSpec(AlphaBetaPlayer, {"score_fn": custom_score}, "AB_Custom"),
+        AgentSpec(AlphaBetaPlayer, {"score_fn": custom_score_2}, "AB_Custom_2"),
+        AgentSpec(AlphaBetaPlayer, {"score_fn": custom_score_3}, "AB_Custom_3")
     ]
+    if args.mcts:
+        # Same safety margin as the alpha-beta agents
+        test_agents.append(AgentSpec(CustomPlayer, {"timeout": 10.}, "MCTS"))
 
     # Define a collection of agents to compete against the test agents
     cpu_agents = [
-        Agent(RandomPlayer(), "Random"),
-        Agent(MinimaxPlayer(score_fn=open_move_score), "MM_Open"),
-        Agent(MinimaxPlayer(score_fn=center_score), "MM_Center"),
-        Agent(MinimaxPlayer(score_fn=improved_score), "MM_Improved"),
-        Agent(AlphaBetaPlayer(score_fn=open_move_score), "AB_Open"),
-        Agent(AlphaBetaPlayer(score_fn=center_score), "AB_Center"),
-        Agent(AlphaBetaPlayer(score_fn=improved_score), "AB_Improved")
+        AgentSpec(RandomPlayer, {}, "Random"),
+        AgentSpec(MinimaxPlayer, {"score_fn": open_move_score}, "MM_Open"),
+        AgentSpec(MinimaxPlayer, {"score_fn": center_score}, "MM_Center"),
+        AgentSpec(MinimaxPlayer, {"score_fn": improved_score}, "MM_Improved"),
+        AgentSpec(AlphaBetaPlayer, {"score_fn": open_move_score}, "AB_Open"),
+        AgentSpec(AlphaBetaPlayer, {"score_fn": center_score}, "AB_Center"),
+        AgentSpec(AlphaBetaPlayer, {"score_fn": improved_score}, "AB_Improved")
     ]
 
+    if args.stats or args.stats_json:
+        for spec in test_agents:
+            spec.kwargs["collect_stats"] = True
+    if args.time_manager:
+        for spec in test_agents:
+            if issubclass(spec.cls, AlphaBetaPlayer):
+                spec.kwargs["time_manager"] = True
+
     print(DESCRIPTION)
     print("{:^74}".format("*************************"))
     print("{:^74}".format("Playing Matches"))
     print("{:^74}".format("*************************"))
-    play_matches(cpu_agents, test_agents, NUM_MATCHES)
+    writer = RecordWriter(args.record) if args.record else None
+    if args.sprt:
+        stats = play_sprt(test_agents[0], test_agents[1:], args.elo0,
+                          args.elo1, processes=args.processes or None,
+                          writer=writer)
+    elif args.processes == 1:
+        stats = play_matches([build_agent(spec) for spec in cpu_agents],
+                             [build_agent(spec) for spec in test_agents],
+                             NUM_MATCHES, writer)
+    else:
+        stats = play_matches_parallel(cpu_agents, test_agents, NUM_MATCHES,
+                                      args.processes or None, writer)
+    if writer is not None:
+        writer.close()
+
+    if args.stats or args.stats_json:
+        print_stats(stats)
+    if args.stats_json:
+        dump_stats(stats, args.stats_json)
 
 
 if __name__ == "__main__":
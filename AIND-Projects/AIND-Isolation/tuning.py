@@ -0,0 +1,361 @@
+"""Tune the weights of the parameterised heuristics of `game_agent` (see
+`game_agent.PARAMS`).
+
+Two methods are provided:
+
+- SPSA (simultaneous perturbation stochastic approximation): every iteration
+  perturbs all the weights at once in a random direction, plays a batch of
+  short fixed-depth self-play games between agents using the two perturbed
+  weight sets in parallel worker processes, and moves the weights towards
+  the better set in proportion to its score.
+
+- Texel tuning: the weights are fitted by local search to minimise the mean
+  squared error between the results of games and a logistic function of the
+  heuristic values of their positions, read from game record files (see
+  `isolation.records`, e.g., written by `tournament.py --record` or by the
+  SPSA self-play games with --record).
+
+Both methods work on weights in units of their starting magnitude (1 for a
+weight starting at 0), so every weight is tuned on the same scale, and
+non-zero weights keep their sign. The tuned weights are saved to PARAMS_FILE
+(or --output); `game_agent` cannot read files, so `tournament.py` and this
+script load them into `game_agent.PARAMS` with `load_params`:
+
+    python tuning.py spsa --heuristic custom_score_3 --iterations 200 -p 0
+    python tuning.py texel --heuristic custom_score_2 games.bin
+"""
+import argparse
+import functools
+import json
+import math
+import multiprocessing
+import os
+import random
+
+import game_agent
+
+from isolation import Board
+from isolation.records import RecordWriter, read_records
+from tournament import play_game, random_opening, usable_cores
+
+# Heuristics with tunable weights
+TUNABLE = {
+    "custom_score_2": game_agent.custom_score_2,
+    "custom_score_3": game_agent.custom_score_3,
+}
+
+# Bounds of the weights relative to their starting values
+MIN_RATIO, MAX_RATIO = 0.1, 10.
+
+PARAMS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "heuristic_params.json")
+
+
+def load_params(path=PARAMS_FILE):
+    """Update `game_agent.PARAMS` with the weights saved in a JSON parameter
+    file. Unknown heuristics and weights are ignored."""
+    with open(path) as f:
+        saved = json.load(f)
+    for name, weights in saved.items():
+        if name in game_agent.PARAMS:
+            current = game_agent.PARAMS[name]
+            current.update((k, float(v)) for k, v in weights.items()
+                           if k in current)
+
+
+def save_params(params, path=PARAMS_FILE):
+    """Save heuristic weights (a dict like `game_agent.PARAMS`) to a JSON
+    parameter file, keeping the weights of the other heuristics already in
+    the file."""
+    saved = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            saved = json.load(f)
+    for name, weights in params.items():
+        saved.setdefault(name, {}).update(weights)
+    with open(path, "w") as f:
+        json.dump(saved, f, indent=2, sort_keys=True)
+
+
+def weight_scales(initial):
+    """Return the (unit, lower bound, upper bound) of every weight, in the
+    units the weights are tuned in: the magnitude of the starting weight,
+    bounded between MIN_RATIO and MAX_RATIO times it, or 1 for a weight
+    starting at 0, bounded between -MAX_RATIO and MAX_RATIO."""
+    scales = {}
+    for name, weight in initial.items():
+        if weight:
+            bounds = sorted((MIN_RATIO * weight, MAX_RATIO * weight))
+            scales[name] = (abs(weight), bounds[0], bounds[1])
+        else:
+            scales[name] = (1., -MAX_RATIO, MAX_RATIO)
+    return scales
+
+
+class FixedDepthPlayer(game_agent.AlphaBetaPlayer):
+    """Alpha-beta agent that always searches to `search_depth` plies without
+    a time limit, so that self-play games are short and do not depend on the
+    load of the machine."""
+
+    def get_move(self, game, time_left):
+        self.time_left = lambda: float("inf")
+        move = self.alphabeta(game, self.search_depth)
+        if move == (-1, -1):
+            # Every move loses within the search depth: play on, like
+            # AlphaBetaPlayer, so that the game ends without legal moves
+            legal_moves = game.get_legal_moves(shuffle=False)
+            if legal_moves:
+                move = legal_moves[0]
+        return move
+
+
+def _self_play(job):
+    """Play one self-play game in a worker process and return its record. """
+    heuristic, weights, names, opening, depth = job
+    players = [FixedDepthPlayer(depth, functools.partial(TUNABLE[heuristic],
+                                                         params=params))
+               for params in weights]
+    return play_game(Board(*players), names, opening, float("inf"))[3]
+
+
+def match(pool, heuristic, plus, minus, pairs, depth=3):
+    """Play `pairs` fair pairs of self-play games (one game with each agent
+    moving first from the same random opening) between agents using the
+    weights `plus` and `minus`.
+
+    Returns
+    -------
+    (float, list<GameRecord>)
+        The score of `plus` between -1 (every game lost) and 1 (every game
+        won), and the records of the games.
+    """
+    jobs = []
+    for _ in range(pairs):
+        opening = random_opening()
+        jobs.append((heuristic, (plus, minus), ("plus", "minus"), opening, depth))
+        jobs.append((heuristic, (minus, plus), ("minus", "plus"), opening, depth))
+    records = pool.map(_self_play, jobs)
+    wins = sum(r.players[r.winner] == "plus" for r in records)
+    return (2 * wins - len(records)) / len(records), records
+
+
+def spsa(heuristic, iterations=100, pairs=8, depth=3, a=0.1, c=0.2,
+         processes=None, writer=None, verbose=False):
+    """Tune the weights of a heuristic with SPSA over self-play games.
+
+    Parameters
+    ----------
+    heuristic : str
+        Name of the heuristic (a key of `TUNABLE`); tuning starts from its
+        weights in `game_agent.PARAMS`.
+
+    iterations : int (optional)
+        Number of SPSA iterations.
+
+    pairs : int (optional)
+        Number of fair pairs of games played in every iteration.
+
+    depth : int (optional)
+        Search depth of the self-play agents.
+
+    a, c : float (optional)
+        Initial step size and perturbation size, in units of the starting
+        weights (see `weight_scales`); they decay as a / (k + 1 + iterations / 10)^0.602 and
+        c / (k + 1)^0.101 at iteration k.
+
+    processes : int (optional)
+        Number of worker processes playing games in parallel; defaults to
+        the number of usable cores.
+
+    writer : `isolation.records.RecordWriter` (optional)
+        If given, the record of every self-play game is appended to it.
+
+    Returns
+    -------
+    dict
+        The tuned weights.
+    """
+    initial = dict(game_agent.PARAMS[heuristic])
+    scales = weight_scales(initial)
+    names = sorted(initial)
+    units = [scales[name][0] for name in names]
+    lower = [scales[name][1] / scales[name][0] for name in names]
+    upper = [scales[name][2] / scales[name][0] for name in names]
+    ratios = [initial[name] / unit for name, unit in zip(names, units)]
+
+    def weights(ratios):
+        return {name: unit * r for name, unit, r in zip(names, units, ratios)}
+
+    with multiprocessing.Pool(processes or len(usable_cores())) as pool:
+        for k in range(iterations):
+            a_k = a / (k + 1 + iterations / 10.) ** 0.602
+            c_k = c / (k + 1) ** 0.101
+            delta = [random.choice((-1, 1)) for _ in names]
+            score, records = match(
+                pool, heuristic,
+                weights([r + c_k * d for r, d in zip(ratios, delta)]),
+                weights([r - c_k * d for r, d in zip(ratios, delta)]),
+                pairs, depth)
+            # Gradient estimate: score / (2 c_k delta), with 1 / delta = delta
+            ratios = [min(max(r + a_k * score * d / (2 * c_k), lo), hi)
+                      for r, d, lo, hi in zip(ratios, delta, lower, upper)]
+            if writer is not None:
+                for record in records:
+                    writer.write(record)
+            if verbose:
+                print("{:>5}  score {:+.2f}  {}".format(
+                    k + 1, score, format_weights(weights(ratios))))
+    return weights(ratios)
+
+
+def load_positions(paths, min_ply=2, max_positions=None):
+    """Return the positions of the games of record files as a list of
+    (board, result) pairs, where result is 1 if the player to move won the
+    game and 0 otherwise. Positions before both players have moved are
+    skipped, and a random sample of `max_positions` is returned if given."""
+    positions = []
+    for path in paths:
+        for record in read_records(path):
+            game = record.position(0)
+            for ply, move in enumerate(record.moves):
+                if ply >= min_ply:
+                    positions.append((game.copy(), int(ply % 2 == record.winner)))
+                game.apply_move(move)
+    if max_positions is not None and len(positions) > max_positions:
+        positions = random.sample(positions, max_positions)
+    return positions
+
+
+def texel_error(positions, score_fn, params, scale):
+    """Return the mean squared error between the results of positions and
+    the logistic function of their heuristic values 1 / (1 + e^(-scale *
+    value))."""
+    total = 0.
+    for game, result in positions:
+        value = score_fn(game, game.active_player, params)
+        if value == float("inf"):
+            expected = 1.
+        elif value == float("-inf"):
+            expected = 0.
+        else:
+            expected = 1. / (1. + math.exp(-scale * value))
+        total += (result - expected) ** 2
+    return total / len(positions)
+
+
+def fit_scale(positions, score_fn, params):
+    """Return the scale of the logistic function that best fits the results
+    of positions for the given weights."""
+    scales = [0.01 * 1.25 ** i for i in range(40)]
+    return min(scales, key=lambda s: texel_error(positions, score_fn, params, s))
+
+
+def texel(heuristic, positions, scale=None, step=0.2, min_step=0.01,
+          verbose=False):
+    """Tune the weights of a heuristic by Texel-style local search.
+
+    Every weight is moved in turn by +step and -step units (see
+    `weight_scales`, within the bounds of the weight), keeping any change
+    that reduces the error of `texel_error`; the step is halved whenever no
+    weight can be improved, until it falls below `min_step`.
+
+    Parameters
+    ----------
+    heuristic : str
+        Name of the heuristic (a key of `TUNABLE`); tuning starts from its
+        weights in `game_agent.PARAMS`.
+
+    positions : list<(Board, int)>
+        The positions and results to fit (see `load_positions`).
+
+    scale : float (optional)
+        The scale of the logistic function; fitted to the starting weights
+        with `fit_scale` if None.
+
+    Returns
+    -------
+    (dict, float)
+        The tuned weights and their error.
+    """
+    score_fn = TUNABLE[heuristic]
+    params = dict(game_agent.PARAMS[heuristic])
+    scales = weight_scales(params)
+    if scale is None:
+        scale = fit_scale(positions, score_fn, params)
+    best = texel_error(positions, score_fn, params, scale)
+    while step >= min_step:
+        improved = False
+        for name in sorted(params):
+            for sign in (1, -1):
+                unit, lower, upper = scales[name]
+                trial = dict(params)
+                trial[name] += sign * step * unit
+                if not lower <= trial[name] <= upper:
+                    continue
+                error = texel_error(positions, score_fn, trial, scale)
+                if error < best:
+                    params, best, improved = trial, error, True
+                    break
+        if not improved:
+            step /= 2
+        if verbose:
+            print("error {:.5f}  {}".format(best, format_weights(params)))
+    return params, best
+
+
+def format_weights(weights):
+    return "  ".join("{} {:.3f}".format(k, v) for k, v in sorted(weights.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    subparsers = parser.add_subparsers(dest="method", required=True)
+    spsa_parser = subparsers.add_parser("spsa", help="tune by SPSA self-play")
+    spsa_parser.add_argument("--iterations", type=int, default=100)
+    spsa_parser.add_argument("--pairs", type=int, default=8,
+                             help="fair pairs of games per iteration")
+    spsa_parser.add_argument("--depth", type=int, default=3,
+                             help="search depth of the self-play agents")
+    spsa_parser.add_argument("-p", "--processes", type=int, default=0,
+                             help="number of worker processes (0 to use "
+                                  "every available core)")
+    spsa_parser.add_argument("--record", metavar="PATH",
+                             help="append the self-play games to a game "
+                                  "record file")
+    texel_parser = subparsers.add_parser(
+        "texel", help="tune by regression over recorded positions")
+    texel_parser.add_argument("records", nargs="+", help="game record files")
+    texel_parser.add_argument("--max-positions", type=int, default=100000,
+                              help="number of positions sampled from the "
+                                   "records")
+    for subparser in (spsa_parser, texel_parser):
+        subparser.add_argument("--heuristic", choices=sorted(TUNABLE),
+                               default="custom_score_3")
+        subparser.add_argument("--output", default=PARAMS_FILE,
+                               help="parameter file to save the tuned "
+                                    "weights to")
+    args = parser.parse_args()
+
+    if os.path.exists(PARAMS_FILE):
+        load_params()
+    print("Starting weights: " +
+          format_weights(game_agent.PARAMS[args.heuristic]))
+    if args.method == "spsa":
+        writer = RecordWriter(args.record) if args.record else None
+        weights = spsa(args.heuristic, args.iterations, args.pairs, args.depth,
+                       processes=args.processes or None, writer=writer,
+                       verbose=True)
+        if writer is not None:
+            writer.close()
+    else:
+        positions = load_positions(args.records,
+                                   max_positions=args.max_positions)
+        print("Fitting {} positions".format(len(positions)))
+        weights, _ = texel(args.heuristic, positions, verbose=True)
+    save_params({args.heuristic: weights}, args.output)
+    print("Tuned weights saved to {}: {}".format(args.output,
+                                                  format_weights(weights)))
+
+
+if __name__ == "__main__":
+    main()